@@ -0,0 +1,343 @@
+import hashlib
+
+from charts import CHART_RENDERER, hidden_obligations_chart, key_clauses_chart, risk_level_chart
+from fingerprint import compare_chunks
+from instrumentation import Trace, use_trace
+from chunking import iter_text_chunks
+from clause_scanner import StreamingDetector
+from legal_analysis import (
+    CHUNK_CONTENT_DEFINED, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, STREAMING_PAGE_THRESHOLD, SUMMARY_MAX_CONCURRENCY,
+    calculate_overall_risk_score, detect_hidden_obligations, detect_key_clauses, detect_risks, extract_text_from_pdf,
+    get_model, observe_pages, scan, split_text_into_chunks,
+)
+from llm_cache import cacheable_answer, model_name_of, track_answers
+from pdf_extraction import PageSpool, open_pdf, page_text
+from summary_engine import (
+    DOCUMENT_SUMMARY_NODE, MERGE_PROMPT, SUMMARY_PROMPT, summarize_bundle, summarize_document,
+)
+
+
+# Function to hash the bytes of an uploaded document
+def hash_upload(pdf_bytes):
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+# Per-document analysis state: every artifact is computed on first access and then reused.
+# PDFs of STREAMING_PAGE_THRESHOLD pages or more are never held as one string: a single pass over the pages
+# runs the detectors and spools the page texts to a temporary file, which later passes (summary, chatbot index,
+# page preview) read back page by page.
+class DocumentAnalysis:
+    def __init__(self, name, pdf_bytes, cache=None, model_getter=get_model, fingerprints=None):
+        self.name = name
+        self.pdf_bytes = pdf_bytes
+        self.document_id = hash_upload(pdf_bytes)
+        self.cache = cache
+        self.model_getter = model_getter
+        self.fingerprints = fingerprints
+        # Stage timings of everything computed for this document (see instrumentation.py)
+        self.trace = Trace(name)
+        self._artifacts = {}
+        # Last summary that had errors: shown until summarize() is called again, never memoized
+        self._incomplete_summary = None
+
+    # Function to compute an artifact once and memoize it
+    def _memo(self, key, compute):
+        if key not in self._artifacts:
+            with use_trace(self.trace):
+                self._artifacts[key] = compute()
+        return self._artifacts[key]
+
+    # Function to report which artifacts have been computed so far
+    def computed(self):
+        return sorted(self._artifacts)
+
+    @property
+    def reader(self):
+        return self._memo("reader", lambda: open_pdf(self.pdf_bytes))
+
+    @property
+    def page_count(self):
+        return self._memo("page_count", lambda: len(self.reader.pages))
+
+    @property
+    def streaming(self):
+        return self.page_count >= STREAMING_PAGE_THRESHOLD
+
+    # Function to get the text of one page (1-based) for the preview
+    def page_text(self, number):
+        if self.streaming:
+            return self.spool.page(number)
+        with use_trace(self.trace):
+            return page_text(self.reader.pages[number - 1])
+
+    # Extracted pages of a streamed document; the pass that fills the spool also runs the detectors
+    @property
+    def spool(self):
+        def compute():
+            spool = PageSpool()
+            detector = StreamingDetector()
+            digest = hashlib.sha256()
+            for _ in observe_pages(self.pdf_bytes, detector, digest, spool):
+                pass
+            self._artifacts["detector"] = detector
+            self._artifacts["text_hash"] = digest.hexdigest()
+            return spool
+        return self._memo("spool", compute)
+
+    # Function to re-chunk a streamed document from its spool
+    def iter_chunks(self):
+        return iter_text_chunks(self.spool.texts(), CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS,
+                                content_defined=CHUNK_CONTENT_DEFINED)
+
+    @property
+    def detector(self):
+        self.spool
+        return self._artifacts["detector"]
+
+    # Whole text of the document (for a streamed document this reads every page back into memory)
+    @property
+    def text(self):
+        if self.streaming:
+            return "".join(self.spool.texts())
+        if "text" not in self._artifacts:
+            # An upload seen before (same bytes) skips extraction
+            known = self.fingerprints.lookup(self.document_id) if self.fingerprints is not None else None
+            if known is not None:
+                self._artifacts["text"], self._artifacts["signature"] = known
+            else:
+                with use_trace(self.trace):
+                    self._artifacts["text"] = extract_text_from_pdf(self.pdf_bytes)
+                if self.fingerprints is not None:
+                    self._artifacts["signature"] = self.fingerprints.record_document(
+                        self.document_id, self.name, self._artifacts["text"])
+        return self._artifacts["text"]
+
+    @property
+    def chunks(self):
+        def compute():
+            chunks = split_text_into_chunks(self.text, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS,
+                                            content_defined=CHUNK_CONTENT_DEFINED)
+            if self.fingerprints is not None:
+                self.fingerprints.record_chunks(self.document_id, chunks)
+            return chunks
+        return self._memo("chunks", compute)
+
+    # Closest earlier upload (upload_sha, name, similarity, chunk hashes), or None
+    @property
+    def previous_version(self):
+        def compute():
+            # Fingerprints are taken over the whole text; streamed documents are not compared
+            if self.fingerprints is None or self.streaming:
+                return None
+            self.text  # records the signature
+            return self.fingerprints.nearest(self.document_id, self._artifacts["signature"])
+        return self._memo("previous_version", compute)
+
+    # How many chunks are unchanged since the previous version (their summaries come from the LLM cache), or None
+    @property
+    def version_diff(self):
+        def compute():
+            previous = self.previous_version
+            if previous is None:
+                return None
+            return dict(compare_chunks(self.chunks, previous[3]), name=previous[1], similarity=previous[2])
+        return self._memo("version_diff", compute)
+
+    @property
+    def hits(self):
+        return self._memo("hits", lambda: scan(self.text))
+
+    # (final summary, chunk summaries, errors); a summary that had errors is reused here, and only an explicit
+    # summarize() (the Summary section, a bundle, a job) tries its failed chunks again
+    @property
+    def summary_result(self):
+        if "summary" in self._artifacts:
+            return self._artifacts["summary"]
+        if self._incomplete_summary is not None:
+            return self._incomplete_summary
+        return self.summarize()
+
+    # Cache key parts of the document's summary node: the PDF, how it is chunked and the prompts that summarize it
+    def summary_node(self):
+        return (self.document_id, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_CONTENT_DEFINED,
+                SUMMARY_PROMPT, MERGE_PROMPT)
+
+    # Function to summarize the document once; the callbacks see chunk summaries and the final tokens as they arrive.
+    # A document summarized before (same bytes) is answered from its cached summary node without being extracted.
+    def summarize(self, on_chunk_summary=None, on_token=None):
+        if "summary" not in self._artifacts:
+            try:
+                model = self.model_getter()
+                cached = None
+                if self.cache is not None:
+                    cached = self.cache.get(model_name_of(model), DOCUMENT_SUMMARY_NODE, *self.summary_node())
+                if cached is not None:
+                    if on_token is not None:
+                        on_token(cached)
+                    return self._memo("summary", lambda: (cached, [], []))
+                if not self.streaming and not self.chunks:
+                    return self._memo("summary", lambda: ("", [], []))
+                with use_trace(self.trace), track_answers() as answers:
+                    chunks = self.iter_chunks() if self.streaming else self.chunks
+                    result = summarize_document(model, chunks,
+                                                max_concurrency=SUMMARY_MAX_CONCURRENCY, cache=self.cache,
+                                                on_chunk_summary=on_chunk_summary, on_token=on_token)
+            except Exception as e:
+                result = ("", [], [e])
+            if result[2]:
+                # Not memoized: the next summarize() tries again, and the chunks that did succeed come from the cache
+                self._incomplete_summary = result
+                return result
+            # Only a summary of every chunk, all by the primary model, stands for the whole document
+            if self.cache is not None and result[0] and cacheable_answer(answers, model_name_of(model)):
+                self.cache.set(result[0], model_name_of(model), DOCUMENT_SUMMARY_NODE, *self.summary_node())
+            self._artifacts["summary"] = result
+            self._incomplete_summary = None
+        return self._artifacts["summary"]
+
+    @property
+    def summary(self):
+        return self.summary_result[0]
+
+    @property
+    def key_clauses(self):
+        if self.streaming:
+            return self._memo("key_clauses", lambda: self.detector.key_clauses())
+        return self._memo("key_clauses", lambda: detect_key_clauses(self.text, self.hits))
+
+    @property
+    def obligations(self):
+        if self.streaming:
+            return self._memo("obligations", lambda: self.detector.hidden_obligations())
+        return self._memo("obligations", lambda: detect_hidden_obligations(self.text, self.hits))
+
+    @property
+    def risks(self):
+        if "risks" in self._artifacts:
+            return self._artifacts["risks"]
+        summary = self.summary
+        with use_trace(self.trace):
+            risks = self.detector.risks(summary) if self.streaming else detect_risks(self.text, summary, self.hits)
+        # Risks also look at the summary, so keep them only once the summary itself is final
+        if "summary" in self._artifacts:
+            self._artifacts["risks"] = risks
+        return risks
+
+    # Risks found in the text alone, available without waiting for the summary
+    @property
+    def text_risks(self):
+        def compute():
+            return self.detector.risks("") if self.streaming else detect_risks(self.text, "", self.hits)
+        return self._memo("text_risks", compute)
+
+    @property
+    def overall_risk_score(self):
+        return calculate_overall_risk_score(self.risks)
+
+    # Artifacts that mean the text has been scanned (the clause hits, or the streaming detector, exist)
+    DETECTIONS = ("key_clauses", "obligations", "risks", "text_risks")
+
+    # Function to save the detections to the corpus store (see analysis_store.py) without waiting for the summary:
+    # risks found in the text are stored first and replaced by the final ones once the summary exists.
+    # Nothing is saved before a section has needed the detections, so this never extracts or scans the document
+    # by itself (the rest is cheap to derive from the scan once it exists).
+    def persist(self, store):
+        if not any(name in self._artifacts for name in self.DETECTIONS):
+            return
+        final = "summary" in self._artifacts
+        stored = self._artifacts.get("stored")
+        if stored == "final" or (stored == "text" and not final):
+            return
+        if final:
+            risks, summary = self.risks, self.summary
+        else:
+            risks, summary = self.text_risks, None
+        store.save(self.document_id, self.name, self.key_clauses, self.obligations, risks,
+                   calculate_overall_risk_score(risks), summary=summary, pages=self.page_count)
+        self._artifacts["stored"] = "final" if final else "text"
+
+    # PNG charts (also embedded in the report); rendered once per distinct set of counts, see charts.py
+    @property
+    def clause_chart(self):
+        return self._memo("clause_chart", lambda: key_clauses_chart(self.key_clauses, renderer="png"))
+
+    @property
+    def obligation_chart(self):
+        return self._memo("obligation_chart", lambda: hidden_obligations_chart(self.obligations, renderer="png"))
+
+    @property
+    def risk_chart(self):
+        risks = self.risks
+        with use_trace(self.trace):
+            return risk_level_chart(risks, renderer="png")
+
+    # Function to get a chart in the display format chosen by CHART_RENDERER (PNG bytes, SVG markup or a Vega spec)
+    def chart_view(self, name, renderer=CHART_RENDERER):
+        if renderer == "png":
+            return getattr(self, name + "_chart")
+        if name == "clause":
+            detected, render = self.key_clauses, key_clauses_chart
+        elif name == "obligation":
+            detected, render = self.obligations, hidden_obligations_chart
+        else:
+            detected, render = self.risks, risk_level_chart
+        with use_trace(self.trace):
+            return render(detected, renderer)
+
+    @property
+    def index(self):
+        def compute():
+            from retrieval import get_document_index, get_streamed_document_index
+            if self.streaming:
+                spool = self.spool
+                return get_streamed_document_index(self._artifacts["text_hash"], spool.texts())
+            return get_document_index(self.text)
+        return self._memo("index", compute)
+
+
+# Function to identify a bundle by its documents, in order
+def bundle_id_of(documents):
+    return hashlib.sha256("\n".join(document.document_id for document in documents).encode('utf-8')).hexdigest()
+
+
+# A contract bundle (a master agreement with its schedules and amendments) summarized as a tree: chunk summaries
+# merge into one summary per document, and the document summaries merge into the bundle summary. Every node is
+# cached, so after adding an amendment only that document and the merges above it are sent to the model.
+class BundleAnalysis:
+    def __init__(self, documents, cache=None, model_getter=get_model):
+        self.documents = list(documents)
+        self.bundle_id = bundle_id_of(self.documents)
+        self.cache = cache
+        self.model_getter = model_getter
+        # Timings of the bundle merges; each document keeps its own trace
+        self.trace = Trace("bundle")
+        self._result = None
+
+    # Function to summarize every document, one after the other, and then the bundle.
+    # on_document(index, summary, errors) is called as each document is done; on_token streams the bundle summary.
+    # Returns (bundle summary, document summaries, errors).
+    def summarize(self, on_document=None, on_token=None):
+        if self._result is not None:
+            return self._result
+        document_summaries = []
+        errors = []
+        for index, document in enumerate(self.documents):
+            summary, _, document_errors = document.summarize()
+            document_summaries.append(summary)
+            errors += document_errors
+            if on_document is not None:
+                on_document(index, summary, document_errors)
+        try:
+            with use_trace(self.trace):
+                summary = summarize_bundle(self.model_getter(),
+                                           [(document.name, text) for document, text in
+                                            zip(self.documents, document_summaries)],
+                                           max_concurrency=SUMMARY_MAX_CONCURRENCY, cache=self.cache,
+                                           on_token=on_token)
+        except Exception as e:
+            # Not memoized, so the next rerun tries again
+            return "", document_summaries, errors + [e]
+        result = (summary, document_summaries, errors)
+        if not errors:
+            self._result = result
+        return result
@@ -0,0 +1,218 @@
+import os
+import sqlite3
+import threading
+import time
+
+from instrumentation import timed
+
+DEFAULT_STORE_PATH = os.environ.get("ANALYSIS_STORE_PATH", os.path.join(".cache", "analysis_store.sqlite3"))
+DEFAULT_QUERY_LIMIT = 200
+# Documents looked up per statement when fetching the labels of query results
+LOOKUP_BATCH = 500
+
+# Kinds of rows in the findings table
+CLAUSE = "clause"
+OBLIGATION = "obligation"
+
+SCHEMA = [
+    # id is also the rowid of the document's full-text row
+    "CREATE TABLE IF NOT EXISTS documents ("
+    " id INTEGER PRIMARY KEY,"
+    " document_sha TEXT NOT NULL UNIQUE,"
+    " name TEXT,"
+    " pages INTEGER,"
+    " summary TEXT,"
+    " overall_risk_score INTEGER NOT NULL,"
+    " analyzed_at REAL NOT NULL)",
+    # In result order, so a query walks documents best-first and stops at its limit
+    "CREATE INDEX IF NOT EXISTS documents_by_score ON documents (overall_risk_score DESC, name)",
+    # One row per detected clause / obligation keyword
+    "CREATE TABLE IF NOT EXISTS findings ("
+    " document_sha TEXT NOT NULL,"
+    " kind TEXT NOT NULL,"
+    " category TEXT NOT NULL,"
+    " keyword TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS findings_by_category ON findings (kind, category, document_sha)",
+    "CREATE INDEX IF NOT EXISTS findings_by_document ON findings (document_sha, kind, category)",
+    "CREATE TABLE IF NOT EXISTS risks ("
+    " document_sha TEXT NOT NULL,"
+    " phrase TEXT NOT NULL,"
+    " risk_level TEXT NOT NULL,"
+    " summary TEXT,"
+    " context TEXT)",
+    "CREATE INDEX IF NOT EXISTS risks_by_document ON risks (document_sha, risk_level, phrase)",
+    # Full-text search over the name, the summary and the risk contexts of every document
+    "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5 (document_sha UNINDEXED, name, summary, contexts)",
+]
+
+
+# Function to turn free text into an FTS5 query that matches documents containing every word
+def fts_query(text):
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+# Analysis results (key clauses, obligations, risks, overall score) of every document analyzed so far,
+# keyed by the SHA-256 of the uploaded PDF, with indexes for corpus-wide filters
+class AnalysisStore:
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL lets the app and the batch workers write to the same store
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # With WAL a commit only needs to reach the log, not be synced to disk, to stay consistent
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    # Function to store (or replace) the analysis of a document; summary=None keeps a summary stored earlier
+    def save(self, document_sha, name, key_clauses, obligations, risks, overall_risk_score, summary=None,
+             pages=None):
+        findings = [(document_sha, CLAUSE, category, keyword)
+                    for category, keywords in key_clauses.items() for keyword in keywords]
+        findings += [(document_sha, OBLIGATION, category, keyword)
+                     for category, keywords in obligations.items() for keyword in keywords]
+        risk_rows = [(document_sha, risk["phrase"], risk["risk_level"], risk["summary"], risk["context"])
+                     for risk in risks]
+        with timed("store_save"), self._lock:
+            with self._conn:
+                previous = self._conn.execute("SELECT id, summary FROM documents WHERE document_sha = ?",
+                                              (document_sha,)).fetchone()
+                if summary is None and previous:
+                    summary = previous[1]
+                self._delete(document_sha, previous)
+                cursor = self._conn.execute(
+                    "INSERT INTO documents (document_sha, name, pages, summary, overall_risk_score, analyzed_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (document_sha, name, pages, summary, overall_risk_score, time.time()),
+                )
+                self._conn.executemany("INSERT INTO findings VALUES (?, ?, ?, ?)", findings)
+                self._conn.executemany("INSERT INTO risks VALUES (?, ?, ?, ?, ?)", risk_rows)
+                self._conn.execute(
+                    "INSERT INTO documents_fts (rowid, document_sha, name, summary, contexts) VALUES (?, ?, ?, ?, ?)",
+                    (cursor.lastrowid, document_sha, name, summary or "",
+                     "\n".join(risk["context"] for risk in risks)),
+                )
+
+    # Function to remove every row of a document; previous is its (id, summary) row in documents, if any
+    def _delete(self, document_sha, previous):
+        if previous:
+            self._conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (previous[0],))
+        for table in ("documents", "findings", "risks"):
+            self._conn.execute(f"DELETE FROM {table} WHERE document_sha = ?", (document_sha,))
+
+    # Function to find documents matching every given filter, highest risk score first.
+    # clauses / obligations: categories that must all be present; risk_phrase and risk_levels: a risk with that
+    # phrase and one of those levels; text: words that must all occur in the name, summary or risk contexts.
+    def query(self, clauses=(), obligations=(), risk_phrase=None, risk_levels=(), min_score=None, max_score=None,
+              text=None, limit=DEFAULT_QUERY_LIMIT):
+        conditions = []
+        parameters = []
+        for kind, categories in ((CLAUSE, clauses), (OBLIGATION, obligations)):
+            for category in categories:
+                conditions.append("EXISTS (SELECT 1 FROM findings f"
+                                  " WHERE f.document_sha = d.document_sha AND f.kind = ? AND f.category = ?)")
+                parameters += [kind, category]
+        if risk_phrase or risk_levels:
+            risk_conditions = []
+            if risk_levels:
+                risk_conditions.append("r.risk_level IN (%s)" % ",".join("?" * len(risk_levels)))
+                parameters += list(risk_levels)
+            if risk_phrase:
+                risk_conditions.append("r.phrase = ?")
+                parameters.append(risk_phrase)
+            conditions.append("EXISTS (SELECT 1 FROM risks r WHERE r.document_sha = d.document_sha AND %s)"
+                              % " AND ".join(risk_conditions))
+        if min_score is not None:
+            conditions.append("d.overall_risk_score >= ?")
+            parameters.append(min_score)
+        if max_score is not None:
+            conditions.append("d.overall_risk_score <= ?")
+            parameters.append(max_score)
+        if text and text.strip():
+            conditions.append("d.id IN (SELECT rowid FROM documents_fts WHERE documents_fts MATCH ?)")
+            parameters.append(fts_query(text))
+
+        sql = "SELECT d.document_sha, d.name, d.pages, d.overall_risk_score, d.analyzed_at FROM documents d"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY d.overall_risk_score DESC, d.name LIMIT ?"
+        parameters.append(limit)
+        with timed("store_query"), self._lock:
+            rows = self._conn.execute(sql, parameters).fetchall()
+            # Labels for the rows returned only, looked up by document in batches
+            clause_names = {}
+            risk_names = {}
+            shas = [row[0] for row in rows]
+            for start in range(0, len(shas), LOOKUP_BATCH):
+                batch = shas[start:start + LOOKUP_BATCH]
+                marks = ",".join("?" * len(batch))
+                for sha, category in self._conn.execute(
+                        f"SELECT DISTINCT document_sha, category FROM findings"
+                        f" WHERE document_sha IN ({marks}) AND kind = '{CLAUSE}'", batch):
+                    clause_names.setdefault(sha, []).append(category)
+                for sha, phrase, level in self._conn.execute(
+                        f"SELECT document_sha, phrase, risk_level FROM risks WHERE document_sha IN ({marks})", batch):
+                    risk_names.setdefault(sha, []).append(f"{phrase} ({level})")
+        return [{"document_sha": sha, "name": name, "pages": pages, "overall_risk_score": score,
+                 "analyzed_at": analyzed_at, "key_clauses": ", ".join(clause_names.get(sha, [])),
+                 "risks": ", ".join(risk_names.get(sha, []))}
+                for sha, name, pages, score, analyzed_at in rows]
+
+    # Function to get the stored analysis of one document, or None
+    def get(self, document_sha):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name, pages, summary, overall_risk_score, analyzed_at FROM documents WHERE document_sha = ?",
+                (document_sha,),
+            ).fetchone()
+            if row is None:
+                return None
+            findings = self._conn.execute("SELECT kind, category, keyword FROM findings WHERE document_sha = ?",
+                                          (document_sha,)).fetchall()
+            risks = self._conn.execute(
+                "SELECT phrase, risk_level, summary, context FROM risks WHERE document_sha = ?", (document_sha,)
+            ).fetchall()
+        grouped = {CLAUSE: {}, OBLIGATION: {}}
+        for kind, category, keyword in findings:
+            grouped[kind].setdefault(category, []).append(keyword)
+        name, pages, summary, score, analyzed_at = row
+        return {
+            "document_sha": document_sha, "name": name, "pages": pages, "summary": summary,
+            "key_clauses": grouped[CLAUSE], "hidden_obligations": grouped[OBLIGATION],
+            "risks": [{"phrase": phrase, "summary": risk_summary, "context": context, "risk_level": level}
+                      for phrase, level, risk_summary, context in risks],
+            "overall_risk_score": score, "analyzed_at": analyzed_at,
+        }
+
+    # Function to count documents per clause / obligation category and per risk level across the corpus
+    def facets(self):
+        with self._lock:
+            categories = self._conn.execute(
+                "SELECT kind, category, COUNT(DISTINCT document_sha) FROM findings GROUP BY kind, category"
+            ).fetchall()
+            levels = self._conn.execute(
+                "SELECT risk_level, COUNT(DISTINCT document_sha) FROM risks GROUP BY risk_level"
+            ).fetchall()
+        facets = {CLAUSE: {}, OBLIGATION: {}, "risk_level": dict(levels)}
+        for kind, category, count in categories:
+            facets[kind][category] = count
+        return facets
+
+    def delete(self, document_sha):
+        with self._lock, self._conn:
+            previous = self._conn.execute("SELECT id, summary FROM documents WHERE document_sha = ?",
+                                          (document_sha,)).fetchone()
+            self._delete(document_sha, previous)
+
+    def stats(self):
+        with self._lock:
+            documents, = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()
+        return {"documents": documents}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
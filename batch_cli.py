@@ -0,0 +1,154 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+logger = logging.getLogger("batch_cli")
+
+# Per-process state for the worker pool
+_worker_cache = None
+_worker_store = None
+
+
+# Function to list the PDFs below a directory, in a stable order
+def find_documents(input_dir, pattern_suffix=".pdf"):
+    documents = []
+    for root, _, files in os.walk(input_dir):
+        for name in files:
+            if name.lower().endswith(pattern_suffix):
+                documents.append(os.path.join(root, name))
+    return sorted(documents)
+
+
+# Function to map a document to its result file (mirrors the input directory layout)
+def result_path_for(document, input_dir, output_dir):
+    relative = os.path.relpath(document, input_dir)
+    return os.path.join(output_dir, os.path.splitext(relative)[0] + ".json")
+
+
+# Function to write a file atomically so a crash never leaves a half-written result behind
+def write_atomically(path, data, mode='w'):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + ".part"
+    with open(temp_path, mode) as output_file:
+        output_file.write(data)
+    os.replace(temp_path, path)
+
+
+def _init_worker(use_cache, use_store=False):
+    global _worker_cache, _worker_store
+    logging.basicConfig(level=logging.WARNING)
+    if use_cache:
+        from llm_cache import LLMCache
+        _worker_cache = LLMCache()
+    if use_store:
+        from analysis_store import AnalysisStore
+        _worker_store = AnalysisStore()
+
+
+# Function to analyze one document in a worker process and write its result file(s)
+def process_document(document, result_path, summarize, write_report, streaming=None):
+    from instrumentation import Trace, use_trace
+    from legal_analysis import analyze_document, generate_complete_report
+
+    start = time.perf_counter()
+    trace = Trace(document)
+    with use_trace(trace):
+        result = analyze_document(document, cache=_worker_cache, summarize=summarize, workers=1, streaming=streaming)
+        result["document"] = document
+
+        if write_report:
+            report = generate_complete_report(result["summary"], result["key_clauses"],
+                                              result["hidden_obligations"], result["risks"], [])
+            write_atomically(os.path.splitext(result_path)[0] + ".pdf", report.getvalue(), mode='wb')
+
+        if _worker_store is not None:
+            _worker_store.save(result["upload_sha256"], os.path.basename(document), result["key_clauses"],
+                               result["hidden_obligations"], result["risks"], result["overall_risk_score"],
+                               summary=result["summary"] or None, pages=result["pages"])
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    # Per-stage totals, e.g. {"pdf_extraction": {"count": 1, "seconds": 0.8}, "llm_call": {...}}
+    result["timings"] = trace.totals()
+
+    # The JSON file is written last: its presence marks the document as done
+    write_atomically(result_path, json.dumps(result, ensure_ascii=False, indent=2))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze every PDF contract in a directory without the UI")
+    parser.add_argument("input_dir", help="directory that is searched recursively for PDFs")
+    parser.add_argument("output_dir", help="directory for the per-document JSON results")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--jsonl", help="also append every result as one line to this JSONL file")
+    parser.add_argument("--no-summary", action="store_true", help="skip LLM summarization")
+    parser.add_argument("--reports", action="store_true", help="also write a PDF report next to each result")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the LLM completion cache")
+    parser.add_argument("--no-store", action="store_true",
+                        help="do not add the results to the searchable store of analyses")
+    parser.add_argument("--force", action="store_true", help="reprocess documents that already have a result")
+    parser.add_argument("--streaming", choices=["auto", "always", "never"], default="auto",
+                        help="process PDFs page by page with bounded memory (auto: only large ones)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    documents = find_documents(args.input_dir)
+    pending = []
+    for document in documents:
+        result_path = result_path_for(document, args.input_dir, args.output_dir)
+        if args.force or not os.path.exists(result_path):
+            pending.append((document, result_path))
+    logger.info("%d documents found, %d already done, %d to process",
+                len(documents), len(documents) - len(pending), len(pending))
+    if not pending:
+        return 0
+
+    streaming = {"auto": None, "always": True, "never": False}[args.streaming]
+    start = time.perf_counter()
+    done = 0
+    failed = 0
+    jsonl_file = None
+    if args.jsonl:
+        os.makedirs(os.path.dirname(os.path.abspath(args.jsonl)), exist_ok=True)
+        jsonl_file = open(args.jsonl, 'a', encoding='utf-8')
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_init_worker,
+                                 initargs=(not args.no_cache, not args.no_store)) as executor:
+            futures = {
+                executor.submit(process_document, document, result_path, not args.no_summary, args.reports,
+                                streaming): document
+                for document, result_path in pending
+            }
+            for future in as_completed(futures):
+                document = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed += 1
+                    logger.error("Failed to process %s: %s", document, e)
+                    continue
+                done += 1
+                if jsonl_file:
+                    jsonl_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    jsonl_file.flush()
+                elapsed = time.perf_counter() - start
+                logger.info("[%d/%d] %s (%.1fs, %.0f documents/hour)", done + failed, len(pending),
+                            document, result["seconds"], done / elapsed * 3600)
+    finally:
+        if jsonl_file:
+            jsonl_file.close()
+
+    elapsed = time.perf_counter() - start
+    logger.info("Processed %d documents (%d failed) in %.1fs: %.0f documents/hour",
+                done, failed, elapsed, done / elapsed * 3600 if elapsed else 0)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis_state import BundleAnalysis, DocumentAnalysis  # noqa: E402
+from fake_llm import FakeChatModel  # noqa: E402
+from llm_cache import LLMCache  # noqa: E402
+from sample_contracts import generate_contract_pdf  # noqa: E402
+from summary_engine import DOCUMENT_SUMMARY_NODE  # noqa: E402
+
+
+# Function to summarize a bundle as a new session would (fresh per-document state, shared cache);
+# returns (seconds, model calls)
+def summarize(files, cache, model):
+    calls = model.calls
+    start = time.perf_counter()
+    documents = [DocumentAnalysis(name, pdf_bytes, cache=cache, model_getter=lambda: model)
+                 for name, pdf_bytes in files]
+    summary, _, errors = BundleAnalysis(documents, cache=cache, model_getter=lambda: model).summarize()
+    if errors or not summary:
+        raise RuntimeError(f"bundle summary failed: {errors}")
+    return time.perf_counter() - start, model.calls - calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time bundle summaries: cold, unchanged, and with an amendment "
+                                                 "added, with and without the cached document nodes")
+    parser.add_argument("--master-pages", type=int, default=200)
+    parser.add_argument("--schedules", type=int, default=3)
+    parser.add_argument("--schedule-pages", type=int, default=20)
+    parser.add_argument("--amendments", type=int, default=2)
+    parser.add_argument("--amendment-pages", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model latency per call, seconds")
+    args = parser.parse_args()
+
+    files = [("master.pdf", generate_contract_pdf(args.master_pages, seed=1))]
+    files += [(f"schedule-{i + 1}.pdf", generate_contract_pdf(args.schedule_pages, seed=10 + i))
+              for i in range(args.schedules)]
+    files += [(f"amendment-{i + 1}.pdf", generate_contract_pdf(args.amendment_pages, seed=100 + i))
+              for i in range(args.amendments + 1)]
+    bundle, added = files[:-1], files[-1:]
+    pages = args.master_pages + args.schedules * args.schedule_pages + args.amendments * args.amendment_pages
+    print(f"bundle of {len(bundle)} documents, {pages} pages; fake model latency {args.latency:.2f}s per call")
+
+    model = FakeChatModel(latency=args.latency, tokens_per_second=0.0)
+    with tempfile.TemporaryDirectory() as directory:
+        cache = LLMCache(os.path.join(directory, "llm.sqlite3"))
+        runs = [("cold", bundle), ("unchanged", bundle), ("one amendment added", bundle + added)]
+        print(f"{'run':<48} {'seconds':>8} {'calls':>6}")
+        for name, documents in runs:
+            seconds, calls = summarize(documents, cache, model)
+            print(f"{name:<48} {seconds:>8.2f} {calls:>6}")
+        # Without the document nodes every file is extracted and chunked again, even when all its chunk
+        # summaries are cached
+        cache.invalidate(prompt_template=DOCUMENT_SUMMARY_NODE)
+        seconds, calls = summarize(bundle + added, cache, model)
+        print(f"{'again, chunk summaries cached, no document nodes':<48} {seconds:>8.2f} {calls:>6}")
+        cache.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import argparse
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from charts import chart_cache, hidden_obligations_chart, key_clauses_chart, risk_level_chart  # noqa: E402
+from clause_scanner import detect_hidden_obligations, detect_key_clauses, detect_risks, scan  # noqa: E402
+from sample_contracts import generate_contract  # noqa: E402
+
+
+# The pyplot chart the app rendered before charts.py (kept here as the baseline)
+def legacy_key_clauses_chart(detected_clauses):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(6, 3))
+    plt.bar(list(detected_clauses.keys()), [len(o) for o in detected_clauses.values()], color='skyblue')
+    plt.title('Detected Key Clauses', fontsize=10)
+    plt.xlabel('Clause Names', fontsize=8)
+    plt.ylabel('Occurrences', fontsize=8)
+    plt.xticks(rotation=45, fontsize=8)
+    plt.yticks(fontsize=8)
+    plt.tight_layout()
+    buf = io.BytesIO()
+    plt.savefig(buf, format='png', bbox_inches='tight')
+    plt.close()
+    return buf.getvalue()
+
+
+# Function to time a call, best of N, in milliseconds
+def best_ms(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chart rendering paths")
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    text = generate_contract(args.pages, seed=args.pages)
+    hits = scan(text)
+    clauses = detect_key_clauses(text, hits)
+    obligations = detect_hidden_obligations(text, hits)
+    risks = detect_risks(text, "", hits)
+
+    # Warm up the matplotlib imports so they are not counted against the first variant
+    legacy_key_clauses_chart(clauses)
+
+    def all_charts(renderer):
+        key_clauses_chart(clauses, renderer)
+        hidden_obligations_chart(obligations, renderer)
+        risk_level_chart(risks, renderer)
+
+    def uncached(renderer):
+        chart_cache.clear()
+        all_charts(renderer)
+
+    rows = [
+        ("pyplot (old, 1 chart)", best_ms(lambda: legacy_key_clauses_chart(clauses), args.repeat)),
+        ("Figure/Agg, 3 charts", best_ms(lambda: uncached("png"), args.repeat)),
+        ("cache hit, 3 charts", best_ms(lambda: all_charts("png"), args.repeat)),
+        ("SVG, 3 charts", best_ms(lambda: uncached("svg"), args.repeat)),
+        ("Vega spec, 3 charts", best_ms(lambda: all_charts("vega"), args.repeat)),
+    ]
+    print(f"{args.pages}-page document, best of {args.repeat}")
+    for name, ms in rows:
+        print(f"  {name:<24} {ms:>9.2f} ms")
+
+    # Render distinct charts from several threads at once; pyplot's global state would mix them up
+    chart_cache.clear()
+    variants = [{name: occurrences * (i + 1) for name, occurrences in clauses.items()} for i in range(args.threads)]
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        threaded = list(executor.map(lambda c: key_clauses_chart(c, "png"), variants))
+    chart_cache.clear()
+    serial = [key_clauses_chart(c, "png") for c in variants]
+    identical = threaded == serial
+    print(f"{args.threads} threads rendered the same PNGs as a serial run: {identical}")
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
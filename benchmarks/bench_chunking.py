@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import count_tokens, split_text_into_chunks  # noqa: E402
+from sample_contracts import generate_contract  # noqa: E402
+
+
+# The word-count chunker the app used before chunking.py (kept here as the baseline)
+def legacy_split_text_into_chunks(input_text, max_tokens=2000):
+    words = input_text.split()
+    chunks = []
+    current_chunk = []
+    current_token_count = 0
+
+    for word in words:
+        estimated_tokens = len(word.split())
+        if current_token_count + estimated_tokens > max_tokens:
+            chunks.append(" ".join(current_chunk))
+            current_chunk = [word]
+            current_token_count = estimated_tokens
+        else:
+            current_chunk.append(word)
+            current_token_count += estimated_tokens
+
+    if current_chunk:
+        chunks.append(" ".join(current_chunk))
+
+    return chunks
+
+
+# Function to measure chunk count, token fill and over-budget chunks for one chunker
+def measure(name, chunker, text, budget):
+    start = time.perf_counter()
+    chunks = chunker(text)
+    elapsed = time.perf_counter() - start
+    sizes = [count_tokens(chunk) for chunk in chunks]
+    over_budget = sum(1 for size in sizes if size > budget)
+    within = [min(size, budget) for size in sizes]
+    # Packing efficiency: share of the requested token budget that is actually used by chunks within budget
+    efficiency = sum(within) / (len(chunks) * budget) if chunks else 0.0
+    return {
+        "name": name,
+        "chunks": len(chunks),
+        "max_tokens": max(sizes) if sizes else 0,
+        "over_budget": over_budget,
+        "efficiency": efficiency,
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chunk count and packing efficiency of the chunkers")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--budget", type=int, default=2000)
+    parser.add_argument("--overlap", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} {'chunker':<10} {'chunks':>7} {'largest':>8} {'over':>5} {'fill':>7} {'ms':>9}")
+    for pages in args.pages:
+        text = generate_contract(pages, seed=pages)
+        results = [
+            measure("legacy", lambda t: legacy_split_text_into_chunks(t, args.budget), text, args.budget),
+            measure("sentence", lambda t: split_text_into_chunks(t, args.budget, args.overlap), text, args.budget),
+        ]
+        for r in results:
+            print(f"{pages:>6} {r['name']:<10} {r['chunks']:>7} {r['max_tokens']:>8} {r['over_budget']:>5} "
+                  f"{r['efficiency']:>6.1%} {r['seconds'] * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import split_text_into_chunks  # noqa: E402
+from fingerprint import FingerprintStore, compare_chunks, text_hash  # noqa: E402
+from llm_cache import LLMCache  # noqa: E402
+from sample_contracts import generate_contract_pages  # noqa: E402
+from summary_engine import summarize_document  # noqa: E402
+
+
+# Model stand-in that counts the prompts it is sent
+class CountingModel:
+    model_name = "counting-model"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        return f"summary {self.calls}: {len(prompt)} characters"
+
+
+# Function to make a redlined version: a sentence inserted on some pages and one rewritten on others
+def redline(pages, edited_pages, seed):
+    rng = random.Random(seed)
+    edited = list(pages)
+    for i, number in enumerate(rng.sample(range(len(pages)), edited_pages)):
+        sentences = edited[number].split(". ")
+        position = rng.randrange(len(sentences))
+        if i % 2 == 0:
+            sentences.insert(position, "Notwithstanding the foregoing, each party shall bear its own costs")
+        else:
+            sentences[position] = "The Supplier shall obtain the prior written approval of the Customer"
+        edited[number] = ". ".join(sentences)
+    return edited
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure chunk and summary reuse between contract versions")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--edited-pages", type=int, default=5)
+    parser.add_argument("--max-tokens", type=int, default=2000)
+    parser.add_argument("--overlap-tokens", type=int, default=100)
+    args = parser.parse_args()
+
+    original_pages = generate_contract_pages(args.pages, seed=args.pages)
+    original = "\n".join(original_pages) + "\n"
+    revised = "\n".join(redline(original_pages, args.edited_pages, seed=1)) + "\n"
+    print(f"{args.pages}-page contract, {args.edited_pages} pages edited")
+
+    for label, content_defined in (("greedy boundaries", False), ("content-defined boundaries", True)):
+        old_chunks = split_text_into_chunks(original, args.max_tokens, args.overlap_tokens,
+                                            content_defined=content_defined)
+        new_chunks = split_text_into_chunks(revised, args.max_tokens, args.overlap_tokens,
+                                            content_defined=content_defined)
+        diff = compare_chunks(new_chunks, [text_hash(chunk) for chunk in old_chunks])
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = LLMCache(os.path.join(directory, "llm.sqlite3"))
+            model = CountingModel()
+            summarize_document(model, old_chunks, cache=cache)
+            first_calls = model.calls
+            summarize_document(model, new_chunks, cache=cache)
+            cache.close()
+        print(f"  {label:<27} {diff['unchanged']:>4}/{diff['chunks']:<4} chunks unchanged "
+              f"({diff['reused_fraction']:.0%}), model calls: first version {first_calls}, "
+              f"second version {model.calls - first_calls}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = FingerprintStore(os.path.join(directory, "fingerprints.sqlite3"))
+        start = time.perf_counter()
+        store.record_document("v1", "original.pdf", original)
+        elapsed = time.perf_counter() - start
+        revised_signature = store.record_document("v2", "revised.pdf", revised)
+        unrelated = "\n".join(generate_contract_pages(args.pages, seed=args.pages + 1))
+        store.record_document("other", "unrelated.pdf", unrelated)
+        nearest = store.nearest("v2", revised_signature)
+        print(f"  MinHash signature of the original: {elapsed * 1000:.0f} ms")
+        if nearest:
+            print(f"  nearest earlier upload to the revision: {nearest[1]} ({nearest[2]:.1%} similar)")
+        else:
+            print("  no near duplicate found")
+        print(f"  exact duplicate lookup: {'hit' if store.lookup('v1') else 'miss'}")
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm_server import FakeLLMServer  # noqa: E402
+from llm_gateway import LLMGateway  # noqa: E402
+from run_suite import percentile  # noqa: E402
+
+
+# Function to send requests with bounded concurrency; returns (latencies of successful calls, number of failures)
+async def run_load(model, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one(i):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await model.ainvoke(f"Summarize clause {i}: the supplier shall indemnify the customer.")
+            except Exception:
+                failures += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare raw model calls with calls through the LLM gateway "
+                                                 "against a local fake API that injects 429s, 503s and stalls")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.10)
+    parser.add_argument("--server-error-rate", type=float, default=0.05)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=3.0)
+    parser.add_argument("--hedge-after", type=float, default=0.5)
+    args = parser.parse_args()
+
+    from langchain_groq import ChatGroq
+
+    server = FakeLLMServer(latency=0.05, rate_limit_rate=args.rate_limit_rate,
+                           server_error_rate=args.server_error_rate, slow_rate=args.slow_rate,
+                           slow_latency=args.slow_latency, seed=1).start()
+    healthy = FakeLLMServer(latency=0.05, seed=2).start()
+    down = FakeLLMServer(server_error_rate=1.0, seed=3).start()
+
+    def client(base_url, name="llama-3.1-8b-instant"):
+        return ChatGroq(model=name, api_key="test", base_url=base_url, max_retries=0, timeout=30)
+
+    # Rate limiting is off here: the point is how faults are absorbed, not the provider quota
+    gateway_settings = dict(timeout=10, max_retries=4, base_delay=0.05, requests_per_minute=0)
+    variants = [
+        ("raw client, no retries", client(server.base_url)),
+        ("gateway: retries", LLMGateway([client(server.base_url)], hedge_after=0, **gateway_settings)),
+        (f"gateway: retries + hedge {args.hedge_after}s",
+         LLMGateway([client(server.base_url)], hedge_after=args.hedge_after, **gateway_settings)),
+        ("gateway: primary down, fallback",
+         LLMGateway([client(down.base_url), client(healthy.base_url, "fallback-model")], hedge_after=0,
+                    **gateway_settings)),
+    ]
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}; faults: {args.rate_limit_rate:.0%} 429, "
+          f"{args.server_error_rate:.0%} 503, {args.slow_rate:.0%} stalled {args.slow_latency:.1f}s")
+    print(f"{'variant':<36} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'total s':>8}")
+    for name, model in variants:
+        start = time.perf_counter()
+        latencies, failures = asyncio.run(run_load(model, args.requests, args.concurrency))
+        total = time.perf_counter() - start
+        columns = [f"{percentile(latencies, q) * 1000:>8.0f}" for q in (0.5, 0.95, 0.99)] if latencies else ["-"] * 3
+        print(f"{name:<36} {failures / args.requests:>7.1%} {' '.join(columns)} {total:>8.1f}")
+
+    for fake in (server, healthy, down):
+        fake.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import argparse
+import ast
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be loaded just by importing the analysis code
+HEAVY_MODULES = ["matplotlib", "langchain_groq", "fpdf", "gspread", "oauth2client", "feedparser", "bs4",
+                 "numpy", "smtplib"]
+
+# The app whose startup imports are timed by default
+APP_MODULE = "summarization_app"
+
+# Default budget for importing the app's own modules, in milliseconds (cumulative, as reported by -X importtime)
+DEFAULT_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", "400"))
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+# Function to list the repository modules an app script imports at startup (its top-level imports; imports
+# inside functions are lazy and not counted). Streamlit itself is left out: its cost is the same for any app.
+def startup_modules(app=APP_MODULE):
+    with open(os.path.join(ROOT, app + ".py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            top = name.split(".")[0]
+            if top not in modules and os.path.exists(os.path.join(ROOT, top + ".py")):
+                modules.append(top)
+    return modules
+
+
+# Function to import modules, in order, in a fresh interpreter and return (cumulative microseconds of all of
+# them, per-module rows, loaded)
+def measure_import(modules):
+    code = f"import sys, {', '.join(modules)}; print(','.join(sorted(sys.modules)))"
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                               capture_output=True, text=True, check=True)
+    rows = []
+    total = 0
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match.group(1)), int(match.group(2)), match.group(3), match.group(4)
+        rows.append((cumulative_us, self_us, len(indent) // 2, name))
+        # A module already loaded by an earlier one has no row of its own, so it is not counted twice
+        if name in modules and len(indent) <= 1:
+            total += cumulative_us
+    loaded = set(completed.stdout.strip().split(","))
+    return total, rows, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if importing the modules the app loads at startup gets slow "
+                                                 "or heavy")
+    parser.add_argument("--module", action="append",
+                        help=f"time this module instead of what {APP_MODULE} imports at startup (repeatable)")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3, help="best of N cold imports")
+    parser.add_argument("--top", type=int, default=10, help="show the N slowest top-level imports")
+    args = parser.parse_args()
+
+    modules = args.module or startup_modules()
+    best = None
+    for _ in range(args.runs):
+        total, rows, loaded = measure_import(modules)
+        if best is None or total < best[0]:
+            best = (total, rows, loaded)
+    total, rows, loaded = best
+
+    print(f"import {', '.join(modules)}: {total / 1000:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    top_level = sorted((r for r in rows if r[2] <= 1), reverse=True)[:args.top]
+    for cumulative_us, _, _, name in top_level:
+        print(f"  {cumulative_us / 1000:>8.1f} ms  {name}")
+
+    failures = []
+    if total / 1000 > args.budget_ms:
+        failures.append(f"import took {total / 1000:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+    eager = [m for m in HEAVY_MODULES if m in loaded]
+    if eager:
+        failures.append("heavy modules imported eagerly: " + ", ".join(eager))
+    for failure in failures:
+        print("FAIL: " + failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import job_worker  # noqa: E402
+import legal_analysis  # noqa: E402
+from fake_llm import FakeChatModel  # noqa: E402
+from job_queue import DONE, FAILED, JobQueue  # noqa: E402
+from sample_contracts import generate_contract_pdf  # noqa: E402
+
+
+# Function to run a worker process against the fake model (no cache, so every job calls the model)
+def fake_worker(path, latency, tenant_concurrency, stop):
+    legal_analysis._model = FakeChatModel(latency=latency, tokens_per_second=0.0)
+    job_worker.work(path, use_cache=False, use_store=False, stop=stop, poll_seconds=0.05,
+                    tenant_concurrency=tenant_concurrency)
+
+
+# Function to run one scenario: a bulk tenant queues many documents, then another tenant queues a few.
+# Returns, per tenant, the seconds from submission to the first partial result and to the finished job.
+def run(pdfs, small_pdfs, workers, latency, tenant_concurrency):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "jobs.sqlite3")
+        queue = JobQueue(path)
+        bulk = [queue.submit("bulk", f"bulk-{i}.pdf", pdf) for i, pdf in enumerate(pdfs)]
+        stop = multiprocessing.Event()
+        processes = [multiprocessing.Process(target=fake_worker, args=(path, latency, tenant_concurrency, stop))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        time.sleep(0.5)
+        small = [queue.submit("small", f"small-{i}.pdf", pdf) for i, pdf in enumerate(small_pdfs)]
+
+        first_partial = {}
+        while True:
+            statuses = {job_id: queue.status(job_id) for job_id in bulk + small}
+            now = time.time()
+            for job_id, status in statuses.items():
+                if status["partials"] and job_id not in first_partial:
+                    first_partial[job_id] = now - status["created_at"]
+            if all(status["status"] in (DONE, FAILED) for status in statuses.values()):
+                break
+            time.sleep(0.05)
+        stop.set()
+        for process in processes:
+            process.join()
+        queue.close()
+
+    results = {}
+    for tenant, job_ids in (("bulk", bulk), ("small", small)):
+        finished = [statuses[job_id]["finished_at"] - statuses[job_id]["created_at"] for job_id in job_ids]
+        results[tenant] = (max(first_partial[job_id] for job_id in job_ids), max(finished),
+                           sum(statuses[job_id]["status"] == FAILED for job_id in job_ids))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time jobs of a small tenant queued behind a bulk upload, "
+                                                 "with and without the per-tenant concurrency limit")
+    parser.add_argument("--bulk-documents", type=int, default=12)
+    parser.add_argument("--small-documents", type=int, default=2)
+    parser.add_argument("--bulk-pages", type=int, default=60)
+    parser.add_argument("--small-pages", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--tenant-concurrency", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake model latency per call, seconds")
+    args = parser.parse_args()
+
+    pdfs = [generate_contract_pdf(args.bulk_pages, seed=i) for i in range(args.bulk_documents)]
+    small_pdfs = [generate_contract_pdf(args.small_pages, seed=1000 + i) for i in range(args.small_documents)]
+    print(f"{args.bulk_documents} bulk documents of {args.bulk_pages} pages, then {args.small_documents} of "
+          f"{args.small_pages} pages from another tenant; {args.workers} workers, "
+          f"fake model latency {args.latency:.2f}s")
+    print(f"{'tenant limit':<14} {'tenant':<7} {'first result s':>15} {'all done s':>11} {'failed':>7}")
+    for limit in (0, args.tenant_concurrency):
+        results = run(pdfs, small_pdfs, args.workers, args.latency, limit)
+        for tenant, (first, finished, failed) in results.items():
+            print(f"{limit or 'none':<14} {tenant:<7} {first:>15.1f} {finished:>11.1f} {failed:>7}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import legal_analysis  # noqa: E402
+from fake_llm import FakeChatModel  # noqa: E402
+from run_suite import contract_pdf  # noqa: E402
+
+
+# Function to analyze one document in this process and report its memory use (run as a child process)
+def measure(pages, streaming):
+    legal_analysis._model = FakeChatModel(latency=0.0, tokens_per_second=0.0)
+    pdf_bytes = contract_pdf(pages)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = legal_analysis.analyze_document(pdf_bytes, streaming=streaming)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"peak_mb": peak / 1e6, "rss_growth_mb": (rss_after - rss_before) / 1e3, "seconds": seconds,
+            "chunks": result["chunks"], "characters": result["characters"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory of the whole-text and the streaming analysis")
+    parser.add_argument("--sizes", default="100,1000", help="comma-separated document sizes in pages")
+    parser.add_argument("--child", nargs=2, metavar=("PAGES", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(int(args.child[0]), args.child[1] == "streaming")))
+        return 0
+
+    print(f"{'pages':>6} {'mode':<10} {'peak MB':>8} {'RSS +MB':>8} {'seconds':>8} {'chunks':>7}")
+    for pages in [int(size) for size in args.sizes.split(",") if size]:
+        contract_pdf(pages)
+        for mode in ("whole", "streaming"):
+            # A fresh process per run, so one run's memory does not hide the next one's
+            output = subprocess.run([sys.executable, __file__, "--child", str(pages), mode],
+                                    capture_output=True, text=True, check=True).stdout
+            row = json.loads(output.strip().splitlines()[-1])
+            print(f"{pages:>6} {mode:<10} {row['peak_mb']:>8.1f} {row['rss_growth_mb']:>8.1f} "
+                  f"{row['seconds']:>8.1f} {row['chunks']:>7}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
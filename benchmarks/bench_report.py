@@ -0,0 +1,73 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from charts import chart_cache  # noqa: E402
+from clause_scanner import detect_hidden_obligations, detect_key_clauses, detect_risks, scan  # noqa: E402
+from legal_analysis import (generate_complete_report, plot_detected_hidden_obligations_chart,  # noqa: E402
+                            plot_detected_key_clauses_chart, plot_risk_level_bar_chart)
+from sample_contracts import generate_contract  # noqa: E402
+
+
+# Function to list the files in the temp directory (to catch leaked temp files)
+def temp_files():
+    directory = tempfile.gettempdir()
+    return set(os.listdir(directory))
+
+
+# Function to measure wall time and peak traced memory of one call
+def measure(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure report build time and peak memory")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = generate_contract(args.pages, seed=args.pages)
+    summary = " ".join(["The agreement sets out payment, confidentiality and termination terms."] * 200)
+    hits = scan(text)
+    clauses = detect_key_clauses(text, hits)
+    obligations = detect_hidden_obligations(text, hits)
+    risks = detect_risks(text, summary, hits)
+    updates = [{"title": f"Recital {i}", "link": f"https://gdpr-info.eu/recitals/no-{i}/"} for i in range(3)]
+
+    # Charts as the UI already holds them
+    charts = [plot_detected_key_clauses_chart(clauses).getvalue(),
+              plot_detected_hidden_obligations_chart(obligations).getvalue(),
+              plot_risk_level_bar_chart(risks).getvalue()]
+
+    before = temp_files()
+    print(f"{args.pages}-page document, best of {args.repeat}")
+    print(f"{'variant':<16} {'ms':>9} {'peak MiB':>9} {'bytes':>9}")
+    for name, kwargs in (("render charts", {}), ("reuse charts", {"charts": charts})):
+        best = None
+        for _ in range(args.repeat):
+            # Charts are cached by their counts, so start cold to measure rendering them
+            chart_cache.clear()
+            report, elapsed, peak = measure(
+                lambda: generate_complete_report(summary, clauses, obligations, risks, updates, **kwargs))
+            if best is None or elapsed < best[0]:
+                best = (elapsed, peak, len(report.getvalue()))
+        print(f"{name:<16} {best[0] * 1000:>9.1f} {best[1] / 2 ** 20:>9.2f} {best[2]:>9}")
+
+    leaked = temp_files() - before
+    print(f"temp files left behind: {len(leaked)}")
+    return 1 if leaked else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clause_scanner import (RISK_PHRASES, detect_hidden_obligations, detect_key_clauses,  # noqa: E402
+                            detect_risks, scan)
+from sample_contracts import generate_contract  # noqa: E402
+
+
+# The per-pattern detectors the app used before clause_scanner.py (kept here as the baseline)
+def legacy_detect_key_clauses(text):
+    clauses = {
+        "Confidentiality Clause": r"(?i)(confidentiality|non-disclosure)[^.!?]*",
+        "Liability Clause": r"(?i)(liability|indemnity)[^.!?]*",
+        "Termination Clause": r"(?i)(termination|end|expire)[^.!?]*",
+        "Force Majeure Clause": r"(?i)(force majeure)[^.!?]*",
+        "Governing Law Clause": r"(?i)(governing law|jurisdiction)[^.!?]*",
+        "Dispute Resolution Clause": r"(?i)(dispute resolution|arbitration|mediation)[^.!?]*",
+        "Amendment Clause": r"(?i)(amendment|modification)[^.!?]*",
+        "Warranty Clause": r"(?i)(warranty|guarantee)[^.!?]*",
+    }
+    detected_clauses = {}
+    for clause_name, regex in clauses.items():
+        matches = re.findall(regex, text)
+        if matches:
+            detected_clauses[clause_name] = list(set(matches))
+    return detected_clauses
+
+
+def legacy_detect_hidden_obligations(text):
+    obligations = {
+        "Payment Obligations": r"(?i)(payment|fee|cost)[^.!?]*",
+        "Reporting Obligations": r"(?i)(reporting|notification|inform)[^.!?]*",
+        "Performance Obligations": r"(?i)(perform|provide|deliver)[^.!?]*",
+        "Compliance Obligations": r"(?i)(compliance|law|regulation)[^.!?]*",
+    }
+    detected_obligations = {}
+    for obligation_name, regex in obligations.items():
+        matches = re.findall(regex, text)
+        if matches:
+            detected_obligations[obligation_name] = list(set(matches))
+    return detected_obligations
+
+
+def legacy_detect_risks(text, summary):
+    detected_risks = []
+    for item in RISK_PHRASES:
+        if item["phrase"].lower() in text.lower() or item["phrase"].lower() in summary.lower():
+            phrase_start = text.lower().find(item["phrase"].lower())
+            context = text[phrase_start - 50: phrase_start + 200]
+            detected_risks.append({
+                "phrase": item["phrase"],
+                "summary": item["summary"],
+                "context": context.strip(),
+                "risk_level": item["risk_level"]
+            })
+    return detected_risks
+
+
+def legacy_pipeline(text, summary):
+    return (legacy_detect_key_clauses(text), legacy_detect_hidden_obligations(text),
+            legacy_detect_risks(text, summary))
+
+
+def scanner_pipeline(text, summary):
+    hits = scan(text)
+    return (detect_key_clauses(text, hits), detect_hidden_obligations(text, hits),
+            detect_risks(text, summary, hits))
+
+
+# Function to compare detector outputs, ignoring the order of matched keywords
+def same_results(legacy, new):
+    def normalize(groups):
+        return {name: sorted(values) for name, values in groups.items()}
+    legacy_risks = [r["phrase"] for r in legacy[2]]
+    new_risks = [r["phrase"] for r in new[2]]
+    return (normalize(legacy[0]) == normalize(new[0]) and normalize(legacy[1]) == normalize(new[1])
+            and legacy_risks == new_risks)
+
+
+# Function to time a pipeline, keeping the best of several runs
+def best_time(function, text, summary, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text, summary)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the combined scanner with the per-pattern detectors")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    summary = "The supplier must indemnify the customer and should report any breach."
+    print(f"{'pages':>6} {'legacy ms':>10} {'scanner ms':>11} {'speedup':>8} {'same':>5}")
+    for pages in args.pages:
+        text = generate_contract(pages, seed=pages)
+        legacy = best_time(legacy_pipeline, text, summary, args.repeat)
+        new = best_time(scanner_pipeline, text, summary, args.repeat)
+        same = same_results(legacy_pipeline(text, summary), scanner_pipeline(text, summary))
+        print(f"{pages:>6} {legacy * 1000:>10.1f} {new * 1000:>11.1f} {legacy / new:>7.1f}x {str(same):>5}")
+
+
+if __name__ == "__main__":
+    main()
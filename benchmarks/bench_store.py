@@ -0,0 +1,71 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis_store import AnalysisStore  # noqa: E402
+from clause_scanner import CLAUSE_KEYWORDS, OBLIGATION_KEYWORDS, RISK_PHRASES  # noqa: E402
+from legal_analysis import calculate_overall_risk_score  # noqa: E402
+from run_suite import percentile  # noqa: E402
+from sample_contracts import generate_contract  # noqa: E402
+
+QUERIES = [
+    ("High-risk indemnify", dict(risk_phrase="indemnify", risk_levels=["High"])),
+    ("Force Majeure clause", dict(clauses=["Force Majeure Clause"])),
+    ("Force Majeure + Governing Law, score >= 10",
+     dict(clauses=["Force Majeure Clause", "Governing Law Clause"], min_score=10)),
+    ("Payment obligations, any High risk", dict(obligations=["Payment Obligations"], risk_levels=["High"])),
+    ("score between 5 and 8", dict(min_score=5, max_score=8)),
+    ("text: arbitration", dict(text="arbitration")),
+]
+
+
+# Function to make the detections of one synthetic document
+def synthetic_analysis(rnd, sentences):
+    def pick(groups):
+        chosen = rnd.sample(list(groups), rnd.randint(0, len(groups)))
+        return {name: rnd.sample(groups[name], rnd.randint(1, len(groups[name]))) for name in chosen}
+
+    risks = [{"phrase": item["phrase"], "summary": item["summary"], "risk_level": item["risk_level"],
+              "context": " ".join(rnd.sample(sentences, 2))}
+             for item in rnd.sample(RISK_PHRASES, rnd.randint(0, len(RISK_PHRASES)))]
+    return pick(CLAUSE_KEYWORDS), pick(OBLIGATION_KEYWORDS), risks, " ".join(rnd.sample(sentences, 6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time corpus-wide queries on the analysis store")
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rnd = random.Random(11)
+    sentences = [s for s in generate_contract(20, seed=3).split(". ") if s.strip()]
+    with tempfile.TemporaryDirectory() as directory:
+        store = AnalysisStore(os.path.join(directory, "analyses.sqlite3"))
+        start = time.perf_counter()
+        for i in range(args.documents):
+            clauses, obligations, risks, summary = synthetic_analysis(rnd, sentences)
+            store.save(f"{i:064x}", f"contract-{i:05d}.pdf", clauses, obligations, risks,
+                       calculate_overall_risk_score(risks), summary=summary, pages=rnd.randint(1, 400))
+        print(f"stored {args.documents} analyses in {time.perf_counter() - start:.1f}s")
+
+        print(f"{'query':<45} {'matches':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for name, filters in QUERIES:
+            samples = []
+            for _ in range(args.repeat):
+                query_start = time.perf_counter()
+                store.query(**filters)
+                samples.append(time.perf_counter() - query_start)
+            count = len(store.query(limit=args.documents, **filters))
+            print(f"{name:<45} {count:>8} {percentile(samples, 0.5) * 1000:>8.2f} "
+                  f"{percentile(samples, 0.95) * 1000:>8.2f}")
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
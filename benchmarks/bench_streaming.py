@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import legal_analysis  # noqa: E402
+from chunking import split_text_into_chunks  # noqa: E402
+from fake_llm import FakeChatModel  # noqa: E402
+from sample_contracts import generate_contract  # noqa: E402
+from summary_engine import summarize_document  # noqa: E402
+
+
+# Function to run a call with a token callback and return (seconds to first output, total seconds, result)
+def time_to_first_output(run):
+    start = time.perf_counter()
+    first = []
+
+    def on_output(*_):
+        if not first:
+            first.append(time.perf_counter() - start)
+
+    result = run(on_output)
+    total = time.perf_counter() - start
+    return (first[0] if first else total), total, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure time to first visible output with streaming")
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.4, help="fake model first-token latency (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=150.0)
+    args = parser.parse_args()
+
+    model = FakeChatModel(latency=args.latency, tokens_per_second=args.tokens_per_second)
+    legal_analysis._model = model
+    chunks = split_text_into_chunks(generate_contract(args.pages, seed=args.pages), 2000, 100)
+    excerpts = "\n\n".join(chunks[:3])
+    question = "Who must indemnify whom?"
+
+    rows = [
+        ("answer, blocking", time_to_first_output(
+            lambda _: legal_analysis.answer_question(question, excerpts))),
+        ("answer, streamed", time_to_first_output(
+            lambda on_output: legal_analysis.answer_question(question, excerpts, on_token=on_output))),
+        (f"summary of {len(chunks)} chunks, blocking", time_to_first_output(
+            lambda _: summarize_document(model, chunks))),
+        (f"summary of {len(chunks)} chunks, streamed", time_to_first_output(
+            lambda on_output: summarize_document(model, chunks, on_chunk_summary=on_output, on_token=on_output))),
+    ]
+    print(f"fake model: {args.latency:.1f}s latency, {args.tokens_per_second:.0f} tokens/s")
+    print(f"{'variant':<34} {'first output s':>14} {'total s':>9}")
+    for name, (first, total, _) in rows:
+        print(f"{name:<34} {first:>14.2f} {total:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
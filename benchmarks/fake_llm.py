@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+
+# Response object with the same .content attribute as a langchain message / message chunk
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+
+
+# Stand-in for ChatGroq: a fixed first-token latency followed by tokens at a fixed rate, no network or API key
+class FakeChatModel:
+    def __init__(self, latency=0.5, tokens_per_second=200.0, output_words=120, model_name="fake-llm"):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.output_words = output_words
+        self.model_name = model_name
+        self.calls = 0
+
+    # Function to build a deterministic completion for a prompt
+    def _completion_words(self, prompt):
+        words = prompt.split()
+        body = words[-self.output_words:] if words else ["empty"]
+        return ["Summary:"] + body[:self.output_words - 1]
+
+    def _token_delay(self):
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        words = self._completion_words(prompt)
+        time.sleep(self.latency + len(words) * self._token_delay())
+        return FakeMessage(" ".join(words))
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        words = self._completion_words(prompt)
+        await asyncio.sleep(self.latency + len(words) * self._token_delay())
+        return FakeMessage(" ".join(words))
+
+    def stream(self, prompt):
+        self.calls += 1
+        time.sleep(self.latency)
+        for i, word in enumerate(self._completion_words(prompt)):
+            time.sleep(self._token_delay())
+            yield FakeMessage(word if i == 0 else " " + word)
+
+    async def astream(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        for i, word in enumerate(self._completion_words(prompt)):
+            await asyncio.sleep(self._token_delay())
+            yield FakeMessage(word if i == 0 else " " + word)
@@ -0,0 +1,157 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Path the Groq client posts chat completions to (relative to its base URL)
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+
+# Local stand-in for the Groq / OpenAI chat completions API, with injectable faults:
+# a share of requests answered with 429 or 503, and a share answered only after a long stall.
+class FakeLLMServer:
+    def __init__(self, latency=0.05, rate_limit_rate=0.0, server_error_rate=0.0, slow_rate=0.0,
+                 slow_latency=5.0, output_words=40, seed=0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.output_words = output_words
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="fake-llm-server", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # Function to decide what happens to the next request: "rate_limited", "server_error", "slow" or "ok"
+    def _next_outcome(self):
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+        for outcome, rate in (("rate_limited", self.rate_limit_rate), ("server_error", self.server_error_rate),
+                              ("slow", self.slow_rate)):
+            if roll < rate:
+                return outcome
+            roll -= rate
+        return "ok"
+
+    def _completion(self, messages):
+        words = " ".join(str(message.get("content", "")) for message in messages).split()
+        return " ".join(["Summary:"] + words[-(self.output_words - 1):])
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def handle(self):
+                # Clients that time out or lose a hedge race hang up mid-answer
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _send_json(self, status, payload, headers=()):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path != COMPLETIONS_PATH:
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                outcome = server._next_outcome()
+                time.sleep(server.latency)
+                if outcome == "rate_limited":
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "tokens"}},
+                                    headers=[("retry-after", "0.2")])
+                    return
+                if outcome == "server_error":
+                    self._send_json(503, {"error": {"message": "Service unavailable"}})
+                    return
+                if outcome == "slow":
+                    time.sleep(server.slow_latency)
+
+                model = request.get("model", "fake")
+                text = server._completion(request.get("messages", []))
+                prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages", []))
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(text.split()),
+                         "total_tokens": prompt_tokens + len(text.split())}
+                base = {"id": f"chatcmpl-{server.requests}", "created": int(time.time()), "model": model}
+                if not request.get("stream"):
+                    self._send_json(200, dict(base, object="chat.completion", usage=usage, choices=[
+                        {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}]))
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                words = text.split()
+                for i, word in enumerate(words):
+                    delta = {"content": word if i == 0 else " " + word}
+                    if i == 0:
+                        delta["role"] = "assistant"
+                    self._send_event(dict(base, object="chat.completion.chunk",
+                                          choices=[{"index": 0, "delta": delta, "finish_reason": None}]))
+                self._send_event(dict(base, object="chat.completion.chunk", x_groq={"usage": usage},
+                                      choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def _send_event(self, payload):
+                self.wfile.write(b"data: " + json.dumps(payload).encode('utf-8') + b"\n\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Groq-compatible chat API with injected faults")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.1, help="share of requests answered with 429")
+    parser.add_argument("--server-error-rate", type=float, default=0.05, help="share answered with 503")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="share answered only after --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.latency, args.rate_limit_rate, args.server_error_rate, args.slow_rate,
+                           args.slow_latency, port=args.port)
+    print(f"serving on {server.base_url} (point the app at it with GROQ_API_BASE={server.base_url})")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from charts import chart_cache  # noqa: E402
+from chunking import split_text_into_chunks  # noqa: E402
+from clause_scanner import detect_hidden_obligations, detect_key_clauses, detect_risks, scan  # noqa: E402
+from fake_llm import FakeChatModel  # noqa: E402
+from legal_analysis import (CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, calculate_overall_risk_score,  # noqa: E402
+                            generate_complete_report, plot_detected_hidden_obligations_chart,
+                            plot_detected_key_clauses_chart, plot_risk_level_bar_chart)
+from pdf_extraction import extract_text_from_pdf  # noqa: E402
+from sample_contracts import generate_contract_pdf  # noqa: E402
+from summary_engine import summarize_document  # noqa: E402
+
+DEFAULT_SIZES = "10,100,1000"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+PDF_CACHE_DIR = os.path.join(ROOT, ".cache", "benchmarks")
+# A stage is flagged when its p50 is this much slower than the baseline p50
+DEFAULT_TOLERANCE = 0.25
+# Stages faster than this are too noisy to flag
+MIN_FLAGGED_SECONDS = 0.005
+SEED = 7
+
+
+# Function to get the synthetic PDF of a given size, generating it once and keeping it on disk
+def contract_pdf(pages):
+    path = os.path.join(PDF_CACHE_DIR, f"contract-{pages}-{SEED}.pdf")
+    if not os.path.exists(path):
+        os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+        data = generate_contract_pdf(pages, seed=SEED)
+        with open(path + ".part", 'wb') as pdf_file:
+            pdf_file.write(data)
+        os.replace(path + ".part", path)
+    with open(path, 'rb') as pdf_file:
+        return pdf_file.read()
+
+
+# Function to compute a percentile (nearest rank) of a list of samples
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+# Function to time a stage repeatedly; returns the samples in seconds and the last result
+def run_stage(function, repeat, setup=None):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - start)
+    return samples, result
+
+
+# Function to run every stage against one document size; returns {stage: {"p50", "p95", "pages_per_second"}}
+def benchmark_size(pages, args, model):
+    pdf_bytes = contract_pdf(pages)
+    state = {}
+    stages = [
+        ("extract_text_from_pdf", lambda: extract_text_from_pdf(pdf_bytes, workers=args.pdf_workers), "text"),
+        ("split_text_into_chunks", lambda: split_text_into_chunks(state["text"], CHUNK_MAX_TOKENS,
+                                                                  CHUNK_OVERLAP_TOKENS), "chunks"),
+        ("scan", lambda: scan(state["text"]), "hits"),
+        ("detect_key_clauses", lambda: detect_key_clauses(state["text"], state["hits"]), "clauses"),
+        ("detect_hidden_obligations", lambda: detect_hidden_obligations(state["text"], state["hits"]),
+         "obligations"),
+        ("summarize_document", lambda: summarize_document(model, state["chunks"])[0], "summary"),
+        ("detect_risks", lambda: detect_risks(state["text"], state["summary"], state["hits"]), "risks"),
+        ("calculate_overall_risk_score", lambda: calculate_overall_risk_score(state["risks"]), None),
+        ("charts", lambda: [plot_detected_key_clauses_chart(state["clauses"]).getvalue(),
+                            plot_detected_hidden_obligations_chart(state["obligations"]).getvalue(),
+                            plot_risk_level_bar_chart(state["risks"]).getvalue()], "charts"),
+        ("generate_complete_report", lambda: generate_complete_report(
+            state["summary"], state["clauses"], state["obligations"], state["risks"], [], charts=state["charts"]),
+         None),
+    ]
+
+    results = {}
+    for name, function, output in stages:
+        if args.stages and name not in args.stages:
+            # Still computed once, because later stages need the output
+            if output is not None:
+                state[output] = function()
+            continue
+        repeat = args.llm_repeat if name == "summarize_document" else args.repeat
+        # Charts are cached by their counts; start cold so the render itself is measured
+        setup = chart_cache.clear if name == "charts" else None
+        samples, value = run_stage(function, repeat, setup)
+        if output is not None:
+            state[output] = value
+        p50 = percentile(samples, 0.5)
+        results[name] = {
+            "p50": round(p50, 6),
+            "p95": round(percentile(samples, 0.95), 6),
+            "pages_per_second": round(pages / p50, 1) if p50 else None,
+            "runs": len(samples),
+        }
+    return results
+
+
+# Function to compare results with a baseline; returns a list of (pages, stage, baseline p50, p50)
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for pages, stages in results.items():
+        for stage, measured in stages.items():
+            reference = baseline.get("results", {}).get(pages, {}).get(stage)
+            if not reference:
+                continue
+            if measured["p50"] > max(reference["p50"] * (1 + tolerance), MIN_FLAGGED_SECONDS):
+                regressions.append((pages, stage, reference["p50"], measured["p50"]))
+    return regressions
+
+
+# Function to print the results as one table per document size
+def print_tables(results, baseline):
+    for pages, stages in results.items():
+        print(f"\n{pages} pages")
+        print(f"  {'stage':<30} {'p50 ms':>10} {'p95 ms':>10} {'pages/s':>10} {'vs baseline':>12}")
+        for stage, measured in stages.items():
+            reference = baseline.get("results", {}).get(pages, {}).get(stage) if baseline else None
+            change = f"{measured['p50'] / reference['p50'] - 1:+.0%}" if reference and reference["p50"] else ""
+            throughput = f"{measured['pages_per_second']:.0f}" if measured["pages_per_second"] else "-"
+            print(f"  {stage:<30} {measured['p50'] * 1000:>10.1f} {measured['p95'] * 1000:>10.1f} "
+                  f"{throughput:>10} {change:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the analysis pipeline with a fake model")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated document sizes in pages")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per stage")
+    parser.add_argument("--llm-repeat", type=int, default=2, help="runs of the summarization stage")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake model first-token latency (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=5000.0, help="fake model output rate")
+    parser.add_argument("--pdf-workers", type=int, default=1, help="processes for PDF extraction")
+    parser.add_argument("--stages", nargs="*", help="only time these stages")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed p50 slowdown before a stage is flagged (0.25 = 25%%)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    model = FakeChatModel(latency=args.latency, tokens_per_second=args.tokens_per_second)
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    results = {}
+    for pages in sizes:
+        results[str(pages)] = benchmark_size(pages, args, model)
+
+    print(f"fake model: {args.latency}s latency, {args.tokens_per_second:.0f} tokens/s; "
+          f"{args.repeat} runs per stage ({args.llm_repeat} for summarization)")
+    print_tables(results, baseline)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        "settings": {"latency": args.latency, "tokens_per_second": args.tokens_per_second,
+                     "pdf_workers": args.pdf_workers, "seed": SEED},
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
+
+    if args.save_baseline:
+        # Keep the sizes that were not part of this run
+        merged = dict(baseline.get("results", {}), **results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(dict(report, results=merged), baseline_file, indent=2)
+            baseline_file.write("\n")
+        print(f"\nbaseline written to {args.baseline}")
+        return 0
+
+    if not baseline:
+        print("\nno baseline to compare with (run with --save-baseline to create one)")
+        return 0
+    if baseline.get("settings") != report["settings"]:
+        print(f"\nwarning: the baseline was recorded with different settings: {baseline.get('settings')}")
+    regressions = find_regressions(results, baseline, args.tolerance)
+    for pages, stage, reference, measured in regressions:
+        print(f"REGRESSION: {stage} on {pages} pages: p50 {measured * 1000:.1f} ms "
+              f"(baseline {reference * 1000:.1f} ms)")
+    if not regressions:
+        print(f"\nno stage is more than {args.tolerance:.0%} slower than the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
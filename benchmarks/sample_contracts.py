@@ -0,0 +1,75 @@
+import random
+
+# Building blocks for synthetic contracts; they deliberately contain the phrases the detectors look for
+PARTIES = ["Acme Holdings Ltd.", "Globex Corporation", "Initech LLC", "Umbrella Services GmbH",
+           "Stark Industries Inc.", "Wayne Enterprises plc", "Hooli Technologies", "Vandelay Imports"]
+
+SECTION_TITLES = ["Definitions", "Services", "Fees and Payment", "Confidentiality", "Term and Termination",
+                  "Liability and Indemnity", "Force Majeure", "Governing Law", "Dispute Resolution",
+                  "Amendments", "Warranties", "Compliance", "Reporting", "Miscellaneous"]
+
+SENTENCES = [
+    "{a} shall provide the Services described in Schedule {n} in accordance with the Service Levels.",
+    "All fees are payable within {n} days of the invoice date, and late payment shall bear interest at {n}% per annum.",
+    "Each party shall keep the Confidential Information of the other party in strict confidentiality and shall not disclose it to any third party without prior written consent.",
+    "This Agreement may be terminated by either party upon {n} days written notice; termination for cause takes effect immediately.",
+    "{a} shall indemnify and hold harmless {b} from and against any and all claims, losses, damages and liability arising out of a breach of this Agreement.",
+    "Neither party shall be liable for any failure to perform caused by force majeure, including acts of God, war, epidemic or governmental action.",
+    "This Agreement shall be governed by the laws of England and Wales, and the courts of London shall have exclusive jurisdiction.",
+    "Any dispute shall first be referred to mediation and, failing settlement within {n} days, to binding arbitration.",
+    "No amendment or modification of this Agreement shall be effective unless made in writing and signed by both parties.",
+    "{a} provides a warranty that the deliverables will conform to the specifications for a period of {n} months.",
+    "{b} should notify {a} promptly of any defect, and additional reporting may be required by the regulator.",
+    "Each party shall maintain compliance with all applicable laws and regulations, including data protection law.",
+    "In the event of default, the non-defaulting party may impose a penalty equal to {n}% of the monthly fee.",
+    "Suspension of the Services may occur where {b} fails to pay undisputed amounts when due.",
+    "{a} will deliver monthly reports and inform {b} of any incident within {n} hours, subject to clause {n}.{n}(c).",
+]
+
+# Roughly the amount of text on one page of a typed contract
+SENTENCES_PER_PAGE = 18
+
+
+# Function to generate the text of one synthetic contract page
+def generate_page(rng, page_number):
+    a, b = rng.sample(PARTIES, 2)
+    lines = []
+    if page_number % 2 == 1:
+        title = SECTION_TITLES[(page_number // 2) % len(SECTION_TITLES)]
+        lines.append(f"{page_number // 2 + 1}. {title}")
+        lines.append("")
+    paragraph = []
+    for i in range(SENTENCES_PER_PAGE):
+        template = rng.choice(SENTENCES)
+        paragraph.append(template.format(a=a, b=b, n=rng.randint(1, 90)))
+        if i % 6 == 5:
+            lines.append(" ".join(paragraph))
+            lines.append("")
+            paragraph = []
+    if paragraph:
+        lines.append(" ".join(paragraph))
+    return "\n".join(lines)
+
+
+# Function to generate the pages of a synthetic contract, deterministically for a given seed
+def generate_contract_pages(pages, seed=0):
+    rng = random.Random(seed)
+    return [generate_page(rng, number) for number in range(1, pages + 1)]
+
+
+# Function to generate a synthetic contract as one string (pages separated by newlines, like extract_text_from_pdf)
+def generate_contract(pages, seed=0):
+    return "\n".join(generate_contract_pages(pages, seed)) + "\n"
+
+
+# Function to render a synthetic contract as PDF bytes (one generated page per PDF page)
+def generate_contract_pdf(pages, seed=0):
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(False)
+    pdf.set_font("Helvetica", size=9)
+    for text in generate_contract_pages(pages, seed):
+        pdf.add_page()
+        pdf.multi_cell(0, 4, text)
+    return bytes(pdf.output())
@@ -0,0 +1,198 @@
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from instrumentation import metrics, timed
+
+# matplotlib is imported on first PNG render. Only the object-oriented Figure/Agg API is used (never pyplot),
+# so charts can be rendered from several sessions at once without sharing global figure state.
+
+# "png" renders with matplotlib; "vega" and "svg" emit data-only charts that skip rasterization
+CHART_RENDERER = os.environ.get("CHART_RENDERER", "png").lower()
+CHART_CACHE_SIZE = int(os.environ.get("CHART_CACHE_SIZE", "256"))
+
+RISK_LEVELS = ["High", "Medium", "Low"]
+
+# Chart layouts, matching the pyplot charts they replace
+CLAUSE_CHART = {"title": "Detected Key Clauses", "xlabel": "Clause Names", "ylabel": "Occurrences",
+                "color": "skyblue", "figsize": (6, 3), "label_size": 8, "align": "center"}
+OBLIGATION_CHART = {"title": "Detected Hidden Obligations and Dependencies", "xlabel": "Obligation Names",
+                    "ylabel": "Occurrences", "color": "lightgreen", "figsize": (6, 3), "label_size": 8,
+                    "align": "center"}
+RISK_CHART = {"title": "Detected Risks by Level", "xlabel": "Risk Level", "ylabel": "Count",
+              "color": "salmon", "figsize": (4, 3), "label_size": None, "align": "right"}
+
+# Named colors used above, for the SVG renderer
+SVG_COLORS = {"skyblue": "#87ceeb", "lightgreen": "#90ee90", "salmon": "#fa8072"}
+
+
+# Function to count the occurrences per detected clause / obligation, in detection order
+def occurrence_counts(detected):
+    return tuple((name, len(occurrences)) for name, occurrences in detected.items())
+
+
+# Function to count the detected risks per level, in a fixed level order
+def risk_level_counts(detected_risks):
+    counts = {}
+    for risk in detected_risks:
+        counts[risk['risk_level']] = counts.get(risk['risk_level'], 0) + 1
+    ordered = [level for level in RISK_LEVELS if level in counts] + sorted(set(counts) - set(RISK_LEVELS))
+    return tuple((level, counts[level]) for level in ordered)
+
+
+# Thread-safe LRU of rendered charts, keyed by the chart layout and its counts
+class ChartCache:
+    def __init__(self, max_entries=CHART_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.inc("chart_cache_total", 1, "Chart cache lookups", result="hit")
+                return self._entries[key]
+            self.misses += 1
+        metrics.inc("chart_cache_total", 1, "Chart cache lookups", result="miss")
+        # Rendered outside the lock; two sessions asking for the same new chart may both render it
+        value = render()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+chart_cache = ChartCache()
+
+
+# Function to render a bar chart to PNG bytes with a private Figure and Agg canvas
+def render_bar_chart_png(layout, counts):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    labels = [label for label, _ in counts]
+    values = [value for _, value in counts]
+
+    fig = Figure(figsize=layout["figsize"])
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.bar(labels, values, color=layout["color"])
+    ax.set_title(layout["title"], fontsize=10)
+    ax.set_xlabel(layout["xlabel"], fontsize=layout["label_size"])
+    ax.set_ylabel(layout["ylabel"], fontsize=layout["label_size"])
+    ax.tick_params(axis='x', labelrotation=45, labelsize=layout["label_size"])
+    if layout["label_size"]:
+        ax.tick_params(axis='y', labelsize=layout["label_size"])
+    for tick_label in ax.get_xticklabels():
+        tick_label.set_horizontalalignment(layout["align"])
+    if layout["align"] == "center":
+        fig.tight_layout()
+
+    buf = BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight')
+    return buf.getvalue()
+
+
+# Function to build a data-only Vega-Lite spec (for st.vega_lite_chart)
+def bar_chart_spec(layout, counts):
+    return {
+        "title": layout["title"],
+        "data": {"values": [{"label": label, "count": value} for label, value in counts]},
+        "mark": {"type": "bar", "color": layout["color"]},
+        "encoding": {
+            "x": {"field": "label", "type": "nominal", "sort": None, "title": layout["xlabel"],
+                  "axis": {"labelAngle": -45}},
+            "y": {"field": "count", "type": "quantitative", "title": layout["ylabel"]},
+        },
+    }
+
+
+# Function to draw a bar chart directly as SVG markup (no matplotlib, no rasterization)
+def render_bar_chart_svg(layout, counts):
+    width = int(layout["figsize"][0] * 100)
+    height = int(layout["figsize"][1] * 100)
+    left, right, top, bottom = 50, 10, 30, 90
+    plot_width = width - left - right
+    plot_height = height - top - bottom
+    top_value = max([value for _, value in counts] + [1])
+    slot = plot_width / max(len(counts), 1)
+    color = SVG_COLORS.get(layout["color"], layout["color"])
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="sans-serif">',
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+        f'<text x="{width / 2:.1f}" y="18" font-size="12" text-anchor="middle">{escape(layout["title"])}</text>',
+        f'<line x1="{left}" y1="{top + plot_height}" x2="{left + plot_width}" y2="{top + plot_height}" '
+        f'stroke="black"/>',
+        f'<line x1="{left}" y1="{top}" x2="{left}" y2="{top + plot_height}" stroke="black"/>',
+        f'<text x="{left - 6}" y="{top + 4}" font-size="9" text-anchor="end">{top_value}</text>',
+        f'<text x="{left - 6}" y="{top + plot_height}" font-size="9" text-anchor="end">0</text>',
+        f'<text x="12" y="{top + plot_height / 2:.1f}" font-size="9" text-anchor="middle" '
+        f'transform="rotate(-90 12 {top + plot_height / 2:.1f})">{escape(layout["ylabel"])}</text>',
+        f'<text x="{left + plot_width / 2:.1f}" y="{height - 6}" font-size="9" '
+        f'text-anchor="middle">{escape(layout["xlabel"])}</text>',
+    ]
+    for i, (label, value) in enumerate(counts):
+        bar_height = plot_height * value / top_value
+        x = left + i * slot + slot * 0.1
+        center = left + (i + 0.5) * slot
+        label_y = top + plot_height + 12
+        parts.append(f'<rect x="{x:.1f}" y="{top + plot_height - bar_height:.1f}" width="{slot * 0.8:.1f}" '
+                     f'height="{bar_height:.1f}" fill="{color}"><title>{escape(label)}: {value}</title></rect>')
+        parts.append(f'<text x="{center:.1f}" y="{label_y}" font-size="9" text-anchor="end" '
+                     f'transform="rotate(-45 {center:.1f} {label_y})">{escape(label)}</text>')
+    parts.append('</svg>')
+    return "".join(parts)
+
+
+# Function to render a chart in the requested format ("png" bytes, "svg" markup or a "vega" spec), cached by its counts
+def render_chart(layout, counts, renderer=None):
+    renderer = (renderer or CHART_RENDERER).lower()
+    if renderer == "vega":
+        # A spec is just the data; there is nothing worth caching
+        return bar_chart_spec(layout, counts)
+    if renderer == "svg":
+        render = render_bar_chart_svg
+    elif renderer == "png":
+        render = render_bar_chart_png
+    else:
+        raise ValueError(f"Unknown chart renderer: {renderer}")
+    key = (renderer, layout["title"], counts)
+
+    def render_timed():
+        with timed("chart_render", chart=layout["title"], renderer=renderer):
+            return render(layout, counts)
+
+    return chart_cache.get_or_render(key, render_timed)
+
+
+# Function to render the detected key clauses chart
+def key_clauses_chart(detected_clauses, renderer=None):
+    return render_chart(CLAUSE_CHART, occurrence_counts(detected_clauses), renderer)
+
+
+# Function to render the detected hidden obligations chart
+def hidden_obligations_chart(detected_obligations, renderer=None):
+    return render_chart(OBLIGATION_CHART, occurrence_counts(detected_obligations), renderer)
+
+
+# Function to render the detected risks by level chart
+def risk_level_chart(detected_risks, renderer=None):
+    return render_chart(RISK_CHART, risk_level_counts(detected_risks), renderer)
+
@@ -0,0 +1,200 @@
+import math
+import os
+import re
+import zlib
+
+from instrumentation import timed
+
+DEFAULT_MAX_TOKENS = 2000
+DEFAULT_OVERLAP_TOKENS = 0
+# Text held back while looking for the end of a sentence when chunking a stream of pages
+DEFAULT_MAX_PENDING_CHARS = 100_000
+
+# Set TOKENIZER=tiktoken to count with a real BPE vocabulary when tiktoken and its encoding are available locally
+TOKENIZER = os.environ.get("TOKENIZER", "estimate")
+TIKTOKEN_ENCODING = os.environ.get("TIKTOKEN_ENCODING", "cl100k_base")
+
+# Sentence boundaries: end punctuation followed by whitespace and an upper-case letter, digit or opening bracket,
+# or a blank line (paragraph / section break)
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+(?=["\'(\[A-Z0-9])|\n\s*\n')
+
+# Clause boundaries inside an over-long sentence
+CLAUSE_BOUNDARY = re.compile(r'(?<=[;:])\s+|(?<=,)\s+(?=(?:and|or|but|provided|including|unless|except|which|whereas)\b)')
+
+# Pieces the estimator counts separately: runs of letters, runs of digits, single punctuation marks
+TOKEN_PIECE = re.compile(r"[^\W\d_]+|\d+|[^\w\s]")
+
+# Average number of characters per token for letter runs (calibrated against Llama 3 / cl100k on contract text)
+CHARS_PER_TOKEN = 4.6
+
+# Content-defined boundaries: once a chunk holds CDC_MIN_FILL of the budget, it is also cut after any sentence
+# whose hash is divisible by CDC_DIVISOR. The cut points then depend on the text around them rather than on
+# everything before them, so an edit only changes the chunks near it and later chunks stay byte-identical.
+CDC_MIN_FILL = 0.75
+CDC_DIVISOR = 8
+
+_tiktoken_encoding = None
+
+
+# Function to estimate the number of tokens in a piece of text without a tokenizer
+def estimate_tokens(text):
+    tokens = 0
+    for piece in TOKEN_PIECE.findall(text):
+        first = piece[0]
+        if first.isdigit():
+            # BPE vocabularies used by Llama 3 split numbers into groups of up to three digits
+            tokens += math.ceil(len(piece) / 3)
+        elif first.isalpha():
+            tokens += max(1, math.ceil(len(piece) / CHARS_PER_TOKEN))
+        else:
+            tokens += 1
+    return tokens
+
+
+# Function to load the tiktoken encoding once; returns None when it is not available offline
+def _load_tiktoken():
+    global _tiktoken_encoding
+    if _tiktoken_encoding is None:
+        try:
+            import tiktoken
+            _tiktoken_encoding = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+        except Exception:
+            _tiktoken_encoding = False
+    return _tiktoken_encoding or None
+
+
+# Function to count tokens with the configured tokenizer, falling back to the estimator
+def count_tokens(text):
+    if TOKENIZER == "tiktoken":
+        encoding = _load_tiktoken()
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+# Function to split text into sentences (paragraph breaks are treated as sentence ends)
+def split_sentences(text):
+    return [s.strip() for s in SENTENCE_BOUNDARY.split(text) if s and s.strip()]
+
+
+# Function to break a unit that is too long on its own into pieces that fit the budget
+def split_oversized(unit, max_tokens, counter):
+    pieces = [p.strip() for p in CLAUSE_BOUNDARY.split(unit) if p and p.strip()]
+    if len(pieces) == 1:
+        # No clause boundary left; fall back to words
+        pieces = unit.split()
+    parts = []
+    current = []
+    current_tokens = 0
+    for piece in pieces:
+        piece_tokens = counter(piece)
+        if piece_tokens > max_tokens and len(pieces) > 1:
+            if current:
+                parts.append(" ".join(current))
+                current, current_tokens = [], 0
+            parts.extend(split_oversized(piece, max_tokens, counter))
+            continue
+        if current and current_tokens + piece_tokens > max_tokens:
+            parts.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        parts.append(" ".join(current))
+    return parts
+
+
+# Function to split a stream of texts (e.g. PDF pages, each followed by a newline) into the same sentences
+# split_sentences() would find in their concatenation, holding only the unfinished last sentence in memory.
+# A sentence with no boundary in max_pending_chars is let through as it is (split_oversized breaks it up later).
+def iter_sentences(texts, max_pending_chars=DEFAULT_MAX_PENDING_CHARS):
+    pending = ""
+    for text in texts:
+        pending += text
+        # A boundary only counts once non-space text follows it; until then the next text could still extend it
+        last_content = len(pending.rstrip())
+        start = 0
+        for boundary in SENTENCE_BOUNDARY.finditer(pending):
+            if boundary.end() >= last_content:
+                break
+            sentence = pending[start:boundary.start()].strip()
+            if sentence:
+                yield sentence
+            start = boundary.end()
+        pending = pending[start:]
+        if len(pending) > max_pending_chars:
+            sentence = pending.strip()
+            if sentence:
+                yield sentence
+            pending = ""
+    sentence = pending.strip()
+    if sentence:
+        yield sentence
+
+
+# Function to turn sentences into (unit, token_count) pairs no larger than the budget
+def sentence_units(sentences, max_tokens, counter):
+    for sentence in sentences:
+        sentence_tokens = counter(sentence)
+        if sentence_tokens <= max_tokens:
+            yield sentence, sentence_tokens
+        else:
+            for part in split_oversized(sentence, max_tokens, counter):
+                yield part, counter(part)
+
+
+# Function to turn text into (unit, token_count) pairs no larger than the budget
+def split_units(text, max_tokens, counter):
+    return sentence_units(split_sentences(text), max_tokens, counter)
+
+
+# Function to tell whether a unit is a content-defined chunk boundary
+def is_anchor(unit, divisor=CDC_DIVISOR):
+    return zlib.crc32(" ".join(unit.split()).encode('utf-8')) % divisor == 0
+
+
+# Function to pack sentence/clause units greedily into chunks close to the token budget.
+# With content_defined=True a chunk may also end early (but not below CDC_MIN_FILL of the budget) after an anchor unit.
+def pack_units(units, max_tokens=DEFAULT_MAX_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS, content_defined=False):
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+    min_tokens = max_tokens * CDC_MIN_FILL
+    current = []
+    current_tokens = 0
+    cut = False
+    for unit, unit_tokens in units:
+        if current and (cut or current_tokens + unit_tokens > max_tokens):
+            yield " ".join(u for u, _ in current)
+            # Carry the trailing units (up to overlap_tokens) into the next chunk
+            carried = []
+            carried_tokens = 0
+            for previous, previous_tokens in reversed(current):
+                if carried_tokens + previous_tokens > overlap_tokens:
+                    break
+                carried.insert(0, (previous, previous_tokens))
+                carried_tokens += previous_tokens
+            if carried_tokens + unit_tokens > max_tokens:
+                carried, carried_tokens = [], 0
+            current, current_tokens = carried, carried_tokens
+        current.append((unit, unit_tokens))
+        current_tokens += unit_tokens
+        cut = content_defined and current_tokens >= min_tokens and is_anchor(unit)
+    if current:
+        yield " ".join(u for u, _ in current)
+
+
+# Function to split text into chunks of at most max_tokens tokens on sentence and clause boundaries
+def split_text_into_chunks(input_text, max_tokens=DEFAULT_MAX_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS,
+                           counter=count_tokens, content_defined=False):
+    with timed("chunking") as span:
+        units = split_units(input_text, max_tokens, counter)
+        chunks = list(pack_units(units, max_tokens, overlap_tokens, content_defined))
+        span["chunks"] = len(chunks)
+    return chunks
+
+
+# Function to chunk a stream of texts (e.g. PDF pages) lazily; yields the chunks split_text_into_chunks would
+# return for their concatenation, so memory stays bounded by one chunk plus one pending sentence
+def iter_text_chunks(texts, max_tokens=DEFAULT_MAX_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS,
+                     counter=count_tokens, content_defined=False):
+    units = sentence_units(iter_sentences(texts), max_tokens, counter)
+    yield from pack_units(units, max_tokens, overlap_tokens, content_defined)
@@ -0,0 +1,278 @@
+import math
+import re
+from collections import namedtuple
+
+from instrumentation import instrumented
+
+# Keywords that identify each key clause
+CLAUSE_KEYWORDS = {
+    "Confidentiality Clause": ["confidentiality", "non-disclosure"],
+    "Liability Clause": ["liability", "indemnity"],
+    "Termination Clause": ["termination", "end", "expire"],
+    "Force Majeure Clause": ["force majeure"],
+    "Governing Law Clause": ["governing law", "jurisdiction"],
+    "Dispute Resolution Clause": ["dispute resolution", "arbitration", "mediation"],
+    "Amendment Clause": ["amendment", "modification"],
+    "Warranty Clause": ["warranty", "guarantee"],
+}
+
+# Keywords that identify each hidden obligation
+OBLIGATION_KEYWORDS = {
+    "Payment Obligations": ["payment", "fee", "cost"],
+    "Reporting Obligations": ["reporting", "notification", "inform"],
+    "Performance Obligations": ["perform", "provide", "deliver"],
+    "Compliance Obligations": ["compliance", "law", "regulation"],
+}
+
+# Risk phrases with their explanation and level
+RISK_PHRASES = [
+    {"phrase": "penalty", "summary": "This indicates financial or legal consequences.", "risk_level": "High"},
+    {"phrase": "liability", "summary": "This suggests potential financial responsibility.", "risk_level": "Medium"},
+    {"phrase": "default", "summary": "This can lead to serious legal consequences.", "risk_level": "High"},
+    {"phrase": "breach", "summary": "This may expose the party to significant penalties.", "risk_level": "High"},
+    {"phrase": "suspension", "summary": "This indicates risks of halting services.", "risk_level": "Medium"},
+    {"phrase": "should", "summary": "This implies a recommendation, which may not be mandatory.", "risk_level": "Low"},
+    {"phrase": "may be required", "summary": "This suggests that obligations could exist under certain conditions.", "risk_level": "Low"},
+    {"phrase": "indemnify", "summary": "This entails a duty to compensate for harm or loss, indicating potential financial risk.", "risk_level": "High"},
+    {"phrase": "termination for cause", "summary": "This indicates a risk of ending the contract due to specific failures.", "risk_level": "High"},
+    {"phrase": "compliance", "summary": "Non-compliance with regulations can lead to legal penalties.", "risk_level": "High"},
+]
+
+CLAUSE = "clause"
+OBLIGATION = "obligation"
+RISK = "risk"
+
+# One keyword occurrence found by the scanner
+Hit = namedtuple("Hit", ["kind", "category", "keyword", "start", "end"])
+
+# Characters that end the text captured after a clause/obligation keyword
+SENTENCE_END = re.compile(r"[.!?]")
+
+# Characters of text kept before and after the first occurrence of a risk phrase
+RISK_CONTEXT_BEFORE = 50
+RISK_CONTEXT_AFTER = 200
+
+# No keyword spans a line break, so streamed text is scanned up to the last one; a line longer than this
+# is scanned in pieces anyway (a keyword cut in two there can be missed)
+MAX_PENDING_LINE_CHARS = 100_000
+
+
+# Function to build the keyword -> [(kind, category)] table for every pattern
+def _build_keyword_table():
+    table = {}
+    for kind, groups in ((CLAUSE, CLAUSE_KEYWORDS), (OBLIGATION, OBLIGATION_KEYWORDS)):
+        for category, keywords in groups.items():
+            for keyword in keywords:
+                table.setdefault(keyword, []).append((kind, category))
+    for item in RISK_PHRASES:
+        table.setdefault(item["phrase"], []).append((RISK, item["phrase"]))
+    return table
+
+
+KEYWORD_TABLE = _build_keyword_table()
+
+
+# Function to build a regex alternation factored as a trie, so the engine dispatches on one character at a time
+def _trie_pattern(keywords):
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Optional suffixes are greedy, so the longest keyword at a position wins
+        return "(?:" + body + ")?" if "" in node else body
+
+    return build(trie)
+
+
+# Single combined matcher for every clause, obligation and risk keyword, compiled once at import.
+# The lookahead makes every match zero-width, so overlapping keywords ("end" inside "amendment") are all reported.
+_TRIE = _trie_pattern(KEYWORD_TABLE)
+COMBINED_PATTERN = re.compile("(?=(" + _TRIE + "))")
+COMBINED_PATTERN_IGNORECASE = re.compile("(?=(" + _TRIE + "))", re.IGNORECASE)
+
+# For each keyword, the shorter keywords that are its prefixes (they match at the same position)
+PREFIX_KEYWORDS = {
+    keyword: [other for other in KEYWORD_TABLE if other != keyword and keyword.startswith(other)]
+    for keyword in KEYWORD_TABLE
+}
+
+
+# Function to scan text once and return every keyword hit with its offsets (overlapping hits included)
+@instrumented("scan")
+def scan(text):
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        matches = COMBINED_PATTERN.finditer(lowered)
+    else:
+        # Some characters change length when lower-cased; match case-insensitively to keep offsets exact
+        matches = COMBINED_PATTERN_IGNORECASE.finditer(text)
+
+    hits = []
+    append = hits.append
+    for match in matches:
+        start = match.start()
+        keyword = match.group(1).lower()
+        if keyword not in KEYWORD_TABLE:
+            # Case-insensitive match on a character whose lower-case form is not ASCII (e.g. the long s)
+            continue
+        for kind, category in KEYWORD_TABLE[keyword]:
+            append(Hit(kind, category, keyword, start, start + len(keyword)))
+        for matched in PREFIX_KEYWORDS[keyword]:
+            for kind, category in KEYWORD_TABLE[matched]:
+                append(Hit(kind, category, matched, start, start + len(matched)))
+    return hits
+
+
+# Function to group clause/obligation hits the way re.findall(r"(?i)(kw|...)[^.!?]*") does per category
+def _group_sentence_hits(text, hits, kind):
+    blocked_until = {}
+    grouped = {}
+    for hit in hits:
+        if hit.kind != kind or hit.start < blocked_until.get(hit.category, 0):
+            continue
+        grouped.setdefault(hit.category, set()).add(text[hit.start:hit.end])
+        # The rest of the sentence is consumed by the match, so no further hit of this category counts in it
+        sentence_end = SENTENCE_END.search(text, hit.end)
+        blocked_until[hit.category] = sentence_end.start() if sentence_end else len(text)
+    return grouped
+
+
+# Function to detect key clauses and their matched keywords
+@instrumented("detect_key_clauses")
+def detect_key_clauses(text, hits=None):
+    if hits is None:
+        hits = scan(text)
+    grouped = _group_sentence_hits(text, hits, CLAUSE)
+    return {name: list(grouped[name]) for name in CLAUSE_KEYWORDS if name in grouped}
+
+
+# Function to detect hidden obligations and dependencies
+@instrumented("detect_hidden_obligations")
+def detect_hidden_obligations(text, hits=None):
+    if hits is None:
+        hits = scan(text)
+    grouped = _group_sentence_hits(text, hits, OBLIGATION)
+    return {name: list(grouped[name]) for name in OBLIGATION_KEYWORDS if name in grouped}
+
+
+# Function to detect risks in the text (and in its summary)
+@instrumented("detect_risks")
+def detect_risks(text, summary, hits=None):
+    if hits is None:
+        hits = scan(text)
+    contexts = {}
+    for hit in hits:
+        if hit.kind == RISK and hit.category not in contexts:
+            contexts[hit.category] = text[max(0, hit.start - RISK_CONTEXT_BEFORE): hit.start + RISK_CONTEXT_AFTER]
+    return risks_from_contexts(contexts, summary)
+
+
+# Function to build the risk list from the context of each phrase's first occurrence and the summary
+def risks_from_contexts(contexts, summary):
+    summary_phrases = {hit.category for hit in scan(summary) if hit.kind == RISK} if summary else set()
+
+    detected_risks = []
+    for item in RISK_PHRASES:
+        phrase = item["phrase"]
+        if phrase not in contexts and phrase not in summary_phrases:
+            continue
+        detected_risks.append({
+            "phrase": phrase,
+            "summary": item["summary"],
+            "context": contexts.get(phrase, "").strip(),
+            "risk_level": item["risk_level"]
+        })
+    return detected_risks
+
+
+# Detectors for text that arrives in pieces (e.g. PDF pages): feed() the pieces in order and read the results.
+# They equal those of detect_key_clauses / detect_hidden_obligations / detect_risks on the concatenated text,
+# while only the current line and a few hundred characters around risk phrases are held.
+class StreamingDetector:
+    def __init__(self):
+        self.offset = 0
+        self._pending = ""
+        # Per kind: category -> offset before which further hits are inside an already matched sentence
+        # (math.inf while that sentence has not ended yet)
+        self._blocked_until = {CLAUSE: {}, OBLIGATION: {}}
+        self._grouped = {CLAUSE: {}, OBLIGATION: {}}
+        self._risk_contexts = {}
+        # Risk phrase -> characters of context still to be taken from the next pieces
+        self._open_contexts = {}
+        self._tail = ""
+
+    def feed(self, text):
+        self._pending += text
+        cut = self._pending.rfind("\n") + 1
+        if not cut and len(self._pending) <= MAX_PENDING_LINE_CHARS:
+            return
+        if not cut:
+            cut = len(self._pending)
+        piece, self._pending = self._pending[:cut], self._pending[cut:]
+        self._scan_piece(piece)
+
+    # Function to scan whatever is still held back (the text after the last line break)
+    def flush(self):
+        piece, self._pending = self._pending, ""
+        if piece:
+            self._scan_piece(piece)
+
+    def _scan_piece(self, text):
+        offset = self.offset
+        # Sentences left open by the previous pieces end at the first sentence end of this one
+        sentence_end = None
+        for blocked in self._blocked_until.values():
+            for category, until in blocked.items():
+                if until == math.inf:
+                    if sentence_end is None:
+                        match = SENTENCE_END.search(text)
+                        sentence_end = offset + match.start() if match else math.inf
+                    blocked[category] = sentence_end
+        for phrase, missing in list(self._open_contexts.items()):
+            taken = text[:missing]
+            self._risk_contexts[phrase] += taken
+            if len(taken) < missing:
+                self._open_contexts[phrase] = missing - len(taken)
+            else:
+                del self._open_contexts[phrase]
+
+        for hit in scan(text):
+            if hit.kind == RISK:
+                if hit.category not in self._risk_contexts:
+                    before = (self._tail + text[:hit.start])[-RISK_CONTEXT_BEFORE:]
+                    after = text[hit.start:hit.start + RISK_CONTEXT_AFTER]
+                    self._risk_contexts[hit.category] = before + after
+                    if len(after) < RISK_CONTEXT_AFTER:
+                        self._open_contexts[hit.category] = RISK_CONTEXT_AFTER - len(after)
+                continue
+            blocked = self._blocked_until[hit.kind]
+            if offset + hit.start < blocked.get(hit.category, 0):
+                continue
+            self._grouped[hit.kind].setdefault(hit.category, set()).add(text[hit.start:hit.end])
+            match = SENTENCE_END.search(text, hit.end)
+            blocked[hit.category] = offset + match.start() if match else math.inf
+
+        self._tail = (self._tail + text)[-RISK_CONTEXT_BEFORE:]
+        self.offset += len(text)
+
+    def key_clauses(self):
+        self.flush()
+        grouped = self._grouped[CLAUSE]
+        return {name: list(grouped[name]) for name in CLAUSE_KEYWORDS if name in grouped}
+
+    def hidden_obligations(self):
+        self.flush()
+        grouped = self._grouped[OBLIGATION]
+        return {name: list(grouped[name]) for name in OBLIGATION_KEYWORDS if name in grouped}
+
+    def risks(self, summary):
+        self.flush()
+        return risks_from_contexts(self._risk_contexts, summary)
@@ -0,0 +1,192 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+# numpy is imported on first use to keep startup fast
+
+DEFAULT_STORE_PATH = os.environ.get("FINGERPRINT_STORE_PATH", os.path.join(".cache", "fingerprints.sqlite3"))
+# Documents whose estimated similarity reaches this are treated as versions of each other
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", "0.5"))
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 128
+# Keep the fingerprints (signature and chunk hashes, no contract text) of at most this many uploads, the oldest
+# dropped first
+MAX_STORED_DOCUMENTS = int(os.environ.get("FINGERPRINT_MAX_DOCUMENTS", "500"))
+# Keep the extracted text, which lets a re-upload of the same file skip extraction, of only the most recent this
+# many uploads; 0 never stores contract text
+MAX_STORED_TEXTS = int(os.environ.get("FINGERPRINT_TEXT_DOCUMENTS", str(MAX_STORED_DOCUMENTS)))
+
+WORD = re.compile(r"\w+")
+
+# Mersenne prime used by the MinHash permutations (a * x + b) mod p, with x < 2**32
+MERSENNE_PRIME = (1 << 61) - 1
+
+_permutations = None
+
+
+# Function to hash a piece of text (whitespace-insensitive)
+def text_hash(text):
+    return hashlib.sha256(" ".join(text.split()).encode('utf-8')).hexdigest()
+
+
+# Function to hash the overlapping word k-shingles of a text to 32-bit integers
+def shingle_hashes(text, k=SHINGLE_WORDS):
+    words = WORD.findall(text.lower())
+    if len(words) < k:
+        return {zlib.crc32(" ".join(words).encode('utf-8'))} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + k]).encode('utf-8')) for i in range(len(words) - k + 1)}
+
+
+def _load_permutations():
+    global _permutations
+    if _permutations is None:
+        import numpy as np
+
+        # Fixed seed: signatures have to stay comparable across processes and restarts
+        rng = np.random.RandomState(1)
+        a = rng.randint(1, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+        b = rng.randint(0, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+        _permutations = (a, b)
+    return _permutations
+
+
+# Function to compute the MinHash signature of a text, as NUM_PERMUTATIONS little-endian uint64 values
+def minhash_signature(text):
+    import numpy as np
+
+    hashes = shingle_hashes(text)
+    if not hashes:
+        return np.full(NUM_PERMUTATIONS, MERSENNE_PRIME, dtype=np.uint64).tobytes()
+    a, b = _load_permutations()
+    values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+    signature = np.full(NUM_PERMUTATIONS, MERSENNE_PRIME, dtype=np.uint64)
+    # Blocks keep the (permutations x shingles) matrix small for long documents
+    for start in range(0, len(values), 4096):
+        block = values[start:start + 4096]
+        permuted = (np.outer(a, block) + b[:, None]) % MERSENNE_PRIME
+        np.minimum(signature, permuted.min(axis=1), out=signature)
+    return signature.astype('<u8').tobytes()
+
+
+# Function to estimate the Jaccard similarity of two texts from their MinHash signatures
+def estimate_similarity(signature_a, signature_b):
+    import numpy as np
+
+    a = np.frombuffer(signature_a, dtype='<u8')
+    b = np.frombuffer(signature_b, dtype='<u8')
+    return float(np.mean(a == b))
+
+
+# Function to compare the chunks of a document with those of an earlier version
+def compare_chunks(chunks, previous_chunk_hashes):
+    previous = set(previous_chunk_hashes)
+    changed = [i for i, chunk in enumerate(chunks) if text_hash(chunk) not in previous]
+    unchanged = len(chunks) - len(changed)
+    return {
+        "chunks": len(chunks),
+        "unchanged": unchanged,
+        "changed": changed,
+        "reused_fraction": unchanged / len(chunks) if chunks else 0.0,
+    }
+
+
+# On-disk store of upload fingerprints: exact hashes (with the extracted text of the latest uploads) and MinHash
+# signatures. A text no longer kept is stored as an empty blob.
+class FingerprintStore:
+    def __init__(self, path=DEFAULT_STORE_PATH, max_documents=MAX_STORED_DOCUMENTS, max_texts=MAX_STORED_TEXTS):
+        self.max_documents = max_documents
+        self.max_texts = max_texts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Overwrite dropped texts instead of leaving them in free pages of the file
+        self._conn.execute("PRAGMA secure_delete=ON")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " upload_sha TEXT PRIMARY KEY,"
+            " name TEXT,"
+            " text_sha TEXT NOT NULL,"
+            " characters INTEGER NOT NULL,"
+            " signature BLOB NOT NULL,"
+            " text BLOB NOT NULL,"
+            " chunk_hashes TEXT,"
+            " created_at REAL NOT NULL)"
+        )
+        # A lower limit than the one the file was written with applies to what is already stored
+        self._prune()
+        self._conn.commit()
+
+    def _prune(self):
+        self._conn.execute(
+            "DELETE FROM documents WHERE upload_sha NOT IN"
+            " (SELECT upload_sha FROM documents ORDER BY created_at DESC LIMIT ?)",
+            (self.max_documents,),
+        )
+        self._conn.execute(
+            "UPDATE documents SET text = x'' WHERE text != x'' AND upload_sha NOT IN"
+            " (SELECT upload_sha FROM documents ORDER BY created_at DESC LIMIT ?)",
+            (self.max_texts,),
+        )
+
+    # Function to get (extracted text, signature) of an upload seen before (exact duplicate), or None
+    def lookup(self, upload_sha):
+        with self._lock:
+            row = self._conn.execute("SELECT text, signature FROM documents WHERE upload_sha = ?",
+                                     (upload_sha,)).fetchone()
+        if row is None or not row[0]:
+            return None
+        return zlib.decompress(row[0]).decode('utf-8'), row[1]
+
+    # Function to record an upload's text and signature; returns the signature
+    def record_document(self, upload_sha, name, text):
+        signature = minhash_signature(text)
+        stored_text = zlib.compress(text.encode('utf-8')) if self.max_texts > 0 else b""
+        with self._lock:
+            # An upload seen before whose text was dropped becomes the latest again, text included
+            self._conn.execute(
+                "INSERT INTO documents (upload_sha, name, text_sha, characters, signature, text, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (upload_sha) DO UPDATE SET text = excluded.text, created_at = excluded.created_at",
+                (upload_sha, name, text_hash(text), len(text), signature, stored_text, time.time()),
+            )
+            self._prune()
+            self._conn.commit()
+        return signature
+
+    # Function to record the chunk hashes of an upload (once it has been chunked)
+    def record_chunks(self, upload_sha, chunks):
+        with self._lock:
+            self._conn.execute("UPDATE documents SET chunk_hashes = ? WHERE upload_sha = ?",
+                               (",".join(text_hash(chunk) for chunk in chunks), upload_sha))
+            self._conn.commit()
+
+    # Function to find the most similar earlier upload: (upload_sha, name, similarity, chunk hashes) or None
+    def nearest(self, upload_sha, signature, threshold=NEAR_DUPLICATE_THRESHOLD):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT upload_sha, name, signature, chunk_hashes FROM documents WHERE upload_sha != ?",
+                (upload_sha,),
+            ).fetchall()
+        best = None
+        for other_sha, name, other_signature, chunk_hashes in rows:
+            similarity = estimate_similarity(signature, other_signature)
+            if similarity >= threshold and (best is None or similarity > best[2]):
+                best = (other_sha, name, similarity, chunk_hashes.split(",") if chunk_hashes else [])
+        return best
+
+    def stats(self):
+        with self._lock:
+            documents, characters, texts = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(characters), 0), COUNT(NULLIF(text, x'')) FROM documents").fetchone()
+        return {"documents": documents, "characters": characters, "texts": texts}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
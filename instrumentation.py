@@ -0,0 +1,215 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Spans kept per trace (per-page spans of a huge PDF would otherwise grow without bound); totals are always kept
+MAX_TRACE_SPANS = int(os.environ.get("TRACE_MAX_SPANS", "2000"))
+METRIC_PREFIX = "legal_summarizer_"
+
+# Trace of the document being processed in the current thread / asyncio task
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+# Function to escape a label value the Prometheus way
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Function to format a label set the Prometheus way
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+# Process-wide counters and histograms, rendered in the Prometheus text exposition format
+class Metrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    # Function to add to a counter
+    def inc(self, name, amount=1, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, (help_text, "counter"))
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    # Function to record one observation in a histogram
+    def observe(self, name, value, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, (help_text, "histogram"))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    # Function to get the current value of a counter (0 if it was never incremented)
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    # Function to summarize the histograms as {(name, labels): (count, sum)}
+    def histogram_totals(self):
+        with self._lock:
+            return {key: (h["count"], h["sum"]) for key, h in self._histograms.items()}
+
+    # Function to render every metric in the Prometheus text format
+    def render(self):
+        with self._lock:
+            lines = []
+            names = sorted({key[0] for key in self._counters} | {key[0] for key in self._histograms})
+            for name in names:
+                help_text, kind = self._help[name]
+                full_name = METRIC_PREFIX + name
+                if help_text:
+                    lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                if kind == "counter":
+                    for (metric, labels), value in sorted(self._counters.items()):
+                        if metric == name:
+                            lines.append(f"{full_name}{_format_labels(labels)} {value}")
+                    continue
+                for (metric, labels), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(self.buckets, histogram["buckets"]):
+                        lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {count}")
+                    lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', '+Inf'),))} "
+                                 f"{histogram['count']}")
+                    lines.append(f"{full_name}_sum{_format_labels(labels)} {histogram['sum']:.6f}")
+                    lines.append(f"{full_name}_count{_format_labels(labels)} {histogram['count']}")
+            return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+metrics = Metrics()
+
+
+# Timings of one document: individual spans (capped) and per-stage totals
+class Trace:
+    def __init__(self, name="", max_spans=MAX_TRACE_SPANS):
+        self.name = name
+        self.max_spans = max_spans
+        self.started = time.perf_counter()
+        self.spans = []
+        self.dropped_spans = 0
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, start, seconds, attributes):
+        with self._lock:
+            count, total = self._totals.get(stage, (0, 0.0))
+            self._totals[stage] = (count + 1, total + seconds)
+            if len(self.spans) < self.max_spans:
+                self.spans.append(dict(attributes, stage=stage, start=round(start - self.started, 4),
+                                       seconds=round(seconds, 4)))
+            else:
+                self.dropped_spans += 1
+
+    # Function to get {stage: {"count", "seconds"}} over every span, in first-seen order
+    def totals(self):
+        with self._lock:
+            return {stage: {"count": count, "seconds": round(seconds, 4)}
+                    for stage, (count, seconds) in self._totals.items()}
+
+
+# Function to make a trace the current one for this thread / task (None to clear); returns a reset token
+def set_trace(trace):
+    return _current_trace.set(trace)
+
+
+# Function to get the current trace, or None
+def current_trace():
+    return _current_trace.get()
+
+
+# Context manager that makes a trace current for the duration of a block
+@contextmanager
+def use_trace(trace):
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+# Context manager that times a pipeline stage into the stage histogram and the current trace.
+# The yielded dict can be filled with attributes (e.g. token counts) while the stage runs.
+@contextmanager
+def timed(stage, **attributes):
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield attributes
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        metrics.observe("stage_seconds", seconds, "Time spent in each pipeline stage", stage=stage)
+        if outcome == "error":
+            metrics.inc("stage_errors_total", 1, "Pipeline stages that raised", stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, start, seconds, attributes if outcome == "ok" else dict(attributes, error=True))
+
+
+# Function to record a stage that was timed elsewhere (e.g. in a worker process)
+def record(stage, seconds, **attributes):
+    metrics.observe("stage_seconds", seconds, "Time spent in each pipeline stage", stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, time.perf_counter() - seconds, seconds, attributes)
+
+
+# Decorator that times every call of a function as a stage
+def instrumented(stage):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Function to serve the metrics at http://<host>:<port>/metrics from a background thread
+def serve_metrics(port, host="0.0.0.0"):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
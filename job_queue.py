@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from instrumentation import metrics
+
+DEFAULT_QUEUE_PATH = os.environ.get("JOB_QUEUE_PATH", os.path.join(".cache", "jobs.sqlite3"))
+# Jobs of one tenant that may run at the same time (0: no limit), so a bulk upload cannot take every worker
+DEFAULT_TENANT_CONCURRENCY = int(os.environ.get("JOB_TENANT_CONCURRENCY", "2"))
+# A running job whose worker has not reported for this long is handed to another worker
+DEFAULT_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "120"))
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+# Raised by a worker that finds it no longer holds the job it is running
+class JobLostError(RuntimeError):
+    pass
+
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    " id INTEGER PRIMARY KEY,"
+    " tenant TEXT NOT NULL,"
+    " name TEXT NOT NULL,"
+    " document_sha TEXT NOT NULL,"
+    " options TEXT NOT NULL,"
+    " status TEXT NOT NULL,"
+    " attempts INTEGER NOT NULL DEFAULT 0,"
+    " worker TEXT,"
+    " lease_until REAL,"
+    " error TEXT,"
+    " result TEXT,"
+    " created_at REAL NOT NULL,"
+    " started_at REAL,"
+    " finished_at REAL)",
+    # Oldest queued job of each tenant, and the running jobs of each tenant
+    "CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, tenant, id)",
+    "CREATE INDEX IF NOT EXISTS jobs_by_tenant ON jobs (tenant, id)",
+    # Uploaded PDFs, once per distinct file, kept apart so polling the jobs never reads them
+    "CREATE TABLE IF NOT EXISTS uploads (document_sha TEXT PRIMARY KEY, pdf BLOB NOT NULL)",
+    # Results published by a worker while the job runs (detections, section summaries, the summary, ...)
+    "CREATE TABLE IF NOT EXISTS partials ("
+    " id INTEGER PRIMARY KEY,"
+    " job_id INTEGER NOT NULL,"
+    " stage TEXT NOT NULL,"
+    " payload TEXT NOT NULL,"
+    " created_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS partials_by_job ON partials (job_id, id)",
+]
+
+
+# Queue of document analyses in a SQLite file: the app submits uploads and polls them, worker processes
+# (job_worker.py) claim and run them. Claims respect a per-tenant concurrency limit and prefer the tenant
+# with the fewest running jobs, and a job whose worker stops reporting is handed to another worker.
+class JobQueue:
+    def __init__(self, path=DEFAULT_QUEUE_PATH, tenant_concurrency=DEFAULT_TENANT_CONCURRENCY,
+                 lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.tenant_concurrency = tenant_concurrency
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Transactions are opened explicitly, so a claim can take the write lock before it reads
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        # WAL lets the app poll while the workers write
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+
+    # Function to run statements in one write transaction
+    def _transaction(self, work):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work()
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return result
+
+    # Function to queue the analysis of an uploaded PDF for a tenant; returns the job id.
+    # options: summarize (default True), email (send the report to this address), updates (for the report)
+    def submit(self, tenant, name, pdf_bytes, **options):
+        document_sha = hashlib.sha256(pdf_bytes).hexdigest()
+
+        def work():
+            self._conn.execute("INSERT OR IGNORE INTO uploads VALUES (?, ?)", (document_sha, pdf_bytes))
+            return self._conn.execute(
+                "INSERT INTO jobs (tenant, name, document_sha, options, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (tenant, name, document_sha, json.dumps(options), QUEUED, time.time()),
+            ).lastrowid
+        job_id = self._transaction(work)
+        metrics.inc("jobs_submitted_total", 1, "Analysis jobs submitted")
+        return job_id
+
+    # Function to claim the next job for a worker; returns (job id, name, PDF bytes, options) or None.
+    # Jobs of a tenant at its concurrency limit are skipped; among the others the tenant with the fewest running
+    # jobs goes first, then the oldest job.
+    def claim(self, worker):
+        def work():
+            now = time.time()
+            self._expire_leases(now)
+            running = dict(self._conn.execute(
+                "SELECT tenant, COUNT(*) FROM jobs WHERE status = ? GROUP BY tenant", (RUNNING,)).fetchall())
+            candidates = [
+                (running.get(tenant, 0), job_id)
+                for tenant, job_id in self._conn.execute(
+                    "SELECT tenant, MIN(id) FROM jobs WHERE status = ? GROUP BY tenant", (QUEUED,))
+                if not self.tenant_concurrency or running.get(tenant, 0) < self.tenant_concurrency
+            ]
+            if not candidates:
+                return None
+            _, job_id = min(candidates)
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, lease_until = ?, started_at = ?"
+                " WHERE id = ?",
+                (RUNNING, worker, now + self.lease_seconds, now, job_id),
+            )
+            # A retried job starts over; drop what its earlier attempt published
+            self._conn.execute("DELETE FROM partials WHERE job_id = ?", (job_id,))
+            name, document_sha, options, created_at = self._conn.execute(
+                "SELECT name, document_sha, options, created_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            pdf, = self._conn.execute("SELECT pdf FROM uploads WHERE document_sha = ?", (document_sha,)).fetchone()
+            return job_id, name, pdf, json.loads(options), now - created_at
+        claimed = self._transaction(work)
+        if claimed is None:
+            return None
+        metrics.observe("job_wait_seconds", claimed[4], "Time jobs spent queued before a worker took them")
+        return claimed[:4]
+
+    # Function to put jobs whose worker went silent back in the queue (or fail them after max_attempts)
+    def _expire_leases(self, now):
+        expired = self._conn.execute(
+            "SELECT id, attempts, document_sha FROM jobs WHERE status = ? AND lease_until < ?", (RUNNING, now)
+        ).fetchall()
+        for job_id, attempts, document_sha in expired:
+            if attempts >= self.max_attempts:
+                self._finish(job_id, document_sha, FAILED, error="worker stopped responding", now=now)
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, worker = NULL, lease_until = NULL,"
+                    " error = 'worker stopped responding' WHERE id = ?",
+                    (QUEUED, job_id),
+                )
+
+    # Function to extend the lease of a running job; False if the job is no longer this worker's
+    def heartbeat(self, job_id, worker):
+        def work():
+            return self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+                (time.time() + self.lease_seconds, job_id, worker, RUNNING),
+            ).rowcount
+        return bool(self._transaction(work))
+
+    # Function to publish a partial result of a running job; False (nothing published) if the worker no longer
+    # holds the job, e.g. its lease expired and another worker has taken it over
+    def publish(self, job_id, worker, stage, payload):
+        def work():
+            return self._conn.execute(
+                "INSERT INTO partials (job_id, stage, payload, created_at)"
+                " SELECT id, ?, ?, ? FROM jobs WHERE id = ? AND worker = ? AND status = ?",
+                (stage, json.dumps(payload), time.time(), job_id, worker, RUNNING),
+            ).rowcount
+        return bool(self._transaction(work))
+
+    # Function to mark a job done (result: JSON-serializable) or failed (error: message); ignored (None) unless
+    # the worker still holds the job. A failure with retry=True puts it back in the queue until it has had
+    # max_attempts.
+    def finish(self, job_id, worker, result=None, error=None, retry=False):
+        def work():
+            row = self._conn.execute(
+                "SELECT attempts, document_sha FROM jobs WHERE id = ? AND worker = ? AND status = ?",
+                (job_id, worker, RUNNING),
+            ).fetchone()
+            if row is None:
+                return None
+            attempts, document_sha = row
+            if error is not None and retry and attempts < self.max_attempts:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, worker = NULL, lease_until = NULL, error = ? WHERE id = ?",
+                    (QUEUED, error, job_id),
+                )
+                return QUEUED
+            status = FAILED if error is not None else DONE
+            self._finish(job_id, document_sha, status, error=error, result=result)
+            return status
+        status = self._transaction(work)
+        if status in (DONE, FAILED):
+            metrics.inc("jobs_finished_total", 1, "Analysis jobs by final status", status=status)
+        return status
+
+    def _finish(self, job_id, document_sha, status, error=None, result=None, now=None):
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, result = ?, lease_until = NULL, finished_at = ? WHERE id = ?",
+            (status, error, json.dumps(result) if result is not None else None, now or time.time(), job_id),
+        )
+        # The PDF is only kept while a job still needs it
+        self._conn.execute(
+            "DELETE FROM uploads WHERE document_sha = ? AND NOT EXISTS"
+            " (SELECT 1 FROM jobs WHERE document_sha = ? AND status IN (?, ?))",
+            (document_sha, document_sha, QUEUED, RUNNING),
+        )
+
+    # Function to list the jobs of a tenant, newest first (without results)
+    def jobs(self, tenant, limit=50):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, name, status, attempts, error, created_at, started_at, finished_at FROM jobs"
+                " WHERE tenant = ? ORDER BY id DESC LIMIT ?", (tenant, limit)
+            ).fetchall()
+        return [{"id": job_id, "name": name, "status": status, "attempts": attempts, "error": error,
+                 "created_at": created_at, "started_at": started_at, "finished_at": finished_at}
+                for job_id, name, status, attempts, error, created_at, started_at, finished_at in rows]
+
+    # Function to get the status of one job, its result once done, and its partial results after a given one.
+    # With a tenant, a job of another tenant is reported as missing (None).
+    def status(self, job_id, after=0, tenant=None):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tenant, name, status, attempts, error, result, created_at, started_at, finished_at"
+                " FROM jobs WHERE id = ? AND (? IS NULL OR tenant = ?)", (job_id, tenant, tenant)
+            ).fetchone()
+            if row is None:
+                return None
+            partials = self._conn.execute(
+                "SELECT id, stage, payload FROM partials WHERE job_id = ? AND id > ? ORDER BY id", (job_id, after)
+            ).fetchall()
+            position = None
+            if row[2] == QUEUED:
+                position, = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND tenant = ? AND id < ?", (QUEUED, row[0], job_id)
+                ).fetchone()
+        tenant, name, status, attempts, error, result, created_at, started_at, finished_at = row
+        return {
+            "id": job_id, "tenant": tenant, "name": name, "status": status, "attempts": attempts, "error": error,
+            "result": json.loads(result) if result else None, "created_at": created_at, "started_at": started_at,
+            "finished_at": finished_at,
+            # Jobs of the same tenant ahead of this one
+            "queued_ahead": position,
+            "partials": [{"id": partial_id, "stage": stage, "payload": json.loads(payload)}
+                         for partial_id, stage, payload in partials],
+        }
+
+    # Function to count jobs by status (all tenants)
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,156 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from job_queue import DEFAULT_QUEUE_PATH, DEFAULT_TENANT_CONCURRENCY, JobLostError, JobQueue
+
+logger = logging.getLogger("job_worker")
+
+# Seconds an idle worker waits before looking for a new job again
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "1"))
+
+
+# Function to run the analysis of one claimed job, publishing every result as soon as it is computed:
+# the detections first (no model needed), then each section summary, the summary, the risks and the email.
+# Raises JobLostError as soon as a result cannot be published because the job was handed to another worker.
+def run_job(queue, worker, job_id, name, pdf_bytes, options, cache=None, store=None, fingerprints=None):
+    from analysis_state import DocumentAnalysis
+    from legal_analysis import calculate_overall_risk_score, generate_complete_report, send_email
+
+    def publish(stage, payload):
+        if not queue.publish(job_id, worker, stage, payload):
+            raise JobLostError(f"job {job_id} is no longer held by {worker}")
+
+    analysis = DocumentAnalysis(name, pdf_bytes, cache=cache, fingerprints=fingerprints)
+    publish("detections", {"pages": analysis.page_count, "key_clauses": analysis.key_clauses,
+                           "hidden_obligations": analysis.obligations})
+    if store is not None:
+        analysis.persist(store)
+
+    summary, summary_errors = "", []
+    if options.get("summarize", True):
+        # Called inside the summarization, where raising would only fail the chunk; a lost job is noticed
+        # when the summary itself is published
+        def publish_section(index, result):
+            if isinstance(result, str):
+                queue.publish(job_id, worker, "section", {"index": index, "summary": result})
+
+        summary, _, errors = analysis.summarize(on_chunk_summary=publish_section)
+        summary_errors = [str(e) for e in errors]
+        publish("summary", {"summary": summary, "errors": summary_errors})
+        risks = analysis.risks
+        if store is not None:
+            analysis.persist(store)
+    else:
+        risks = analysis.text_risks
+    overall_risk_score = calculate_overall_risk_score(risks)
+    publish("risks", {"risks": risks, "overall_risk_score": overall_risk_score})
+
+    if options.get("email"):
+        report = generate_complete_report(summary, analysis.key_clauses, analysis.obligations, risks,
+                                          options.get("updates") or [],
+                                          charts=[analysis.clause_chart, analysis.obligation_chart,
+                                                  analysis.risk_chart])
+        sent, error = send_email(report, options["email"])
+        publish("email", {"to": options["email"], "sent": sent, "error": error})
+
+    return {
+        "pages": analysis.page_count, "summary": summary, "summary_errors": summary_errors,
+        "key_clauses": analysis.key_clauses, "hidden_obligations": analysis.obligations, "risks": risks,
+        "overall_risk_score": overall_risk_score, "timings": analysis.trace.totals(),
+    }
+
+
+# Function to keep extending the lease of a job until it is done
+def keep_alive(queue, job_id, worker, done):
+    while not done.wait(queue.lease_seconds / 3):
+        if not queue.heartbeat(job_id, worker):
+            return
+
+
+# Function to claim and run jobs until stop is set (or max_jobs have been run)
+def work(path=DEFAULT_QUEUE_PATH, use_cache=True, use_store=True, stop=None, max_jobs=None,
+         poll_seconds=JOB_POLL_SECONDS, tenant_concurrency=DEFAULT_TENANT_CONCURRENCY):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    queue = JobQueue(path, tenant_concurrency=tenant_concurrency)
+    cache = store = fingerprints = None
+    if use_cache:
+        from fingerprint import FingerprintStore
+        from llm_cache import LLMCache
+        cache = LLMCache()
+        fingerprints = FingerprintStore()
+    if use_store:
+        from analysis_store import AnalysisStore
+        store = AnalysisStore()
+
+    done_jobs = 0
+    while (stop is None or not stop.is_set()) and (max_jobs is None or done_jobs < max_jobs):
+        claimed = queue.claim(worker)
+        if claimed is None:
+            time.sleep(poll_seconds)
+            continue
+        job_id, name, pdf_bytes, options = claimed
+        logger.info("%s: job %d (%s) started", worker, job_id, name)
+        start = time.perf_counter()
+        done = threading.Event()
+        threading.Thread(target=keep_alive, args=(queue, job_id, worker, done), daemon=True).start()
+        try:
+            result = run_job(queue, worker, job_id, name, pdf_bytes, options, cache, store, fingerprints)
+        except JobLostError as e:
+            logger.warning("%s: %s, dropping it", worker, e)
+        except Exception as e:
+            logger.error("%s: job %d (%s) failed: %s", worker, job_id, name, e)
+            queue.finish(job_id, worker, error=str(e), retry=True)
+        else:
+            queue.finish(job_id, worker, result=result)
+            logger.info("%s: job %d (%s) done in %.1fs", worker, job_id, name, time.perf_counter() - start)
+        finally:
+            done.set()
+        done_jobs += 1
+    queue.close()
+
+
+def _worker_process(*args):
+    # Ctrl-C reaches the whole process group; the parent stops the workers between jobs instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work(*args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run analysis jobs queued by the app (see job_queue.py)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="path of the job queue database")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the LLM completion cache")
+    parser.add_argument("--no-store", action="store_true",
+                        help="do not add the results to the searchable store of analyses")
+    parser.add_argument("--tenant-concurrency", type=int, default=DEFAULT_TENANT_CONCURRENCY,
+                        help="jobs of one tenant run at the same time across all workers (0: no limit)")
+    args = parser.parse_args(argv)
+
+    stop = multiprocessing.Event()
+    processes = [multiprocessing.Process(target=_worker_process, name=f"job-worker-{i}",
+                                         args=(args.queue, not args.no_cache, not args.no_store, stop, None,
+                                               JOB_POLL_SECONDS, args.tenant_concurrency))
+                 for i in range(max(1, args.workers))]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Running jobs are finished first; a worker killed mid-job leaves it to be retried after its lease
+        stop.set()
+        for process in processes:
+            process.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
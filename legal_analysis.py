@@ -0,0 +1,335 @@
+import os
+import sys
+import getpass
+import hashlib
+import logging
+import threading
+from io import BytesIO
+from dotenv import load_dotenv
+import io
+from summary_engine import SUMMARY_PROMPT, invoke_model, summarize_document
+from llm_cache import cacheable_answer, model_name_of, track_answers
+from chunking import iter_text_chunks, split_text_into_chunks
+from pdf_extraction import extract_text_from_pdf, iter_pages, open_pdf, read_pdf_bytes
+from clause_scanner import StreamingDetector, detect_hidden_obligations, detect_key_clauses, detect_risks, scan
+from charts import hidden_obligations_chart, key_clauses_chart, risk_level_chart
+from instrumentation import instrumented
+
+# matplotlib, fpdf, the email package and langchain_groq are imported on first use to keep startup fast
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Groq model used for summaries and answers
+MODEL_NAME = os.environ.get("GROQ_MODEL", "llama-3.1-8b-instant")
+# Comma-separated models tried in order when the primary one keeps failing
+FALLBACK_MODEL_NAMES = [name.strip() for name in os.environ.get("GROQ_FALLBACK_MODELS", "").split(",")
+                        if name.strip()]
+
+_model = None
+_model_lock = threading.Lock()
+
+# Function to initialize the Langchain Groq model on first use, behind the gateway (timeouts, rate limits,
+# retries, hedging, fallback). All sessions share the gateway, and its rate limits are shared with the other
+# processes (batch_cli.py, job_worker.py) through LLM_RATE_LIMIT_PATH.
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from langchain_groq import ChatGroq
+
+                if not os.environ.get("GROQ_API_KEY"):
+                    if not sys.stdin or not sys.stdin.isatty():
+                        raise RuntimeError("GROQ_API_KEY is not set.")
+                    os.environ["GROQ_API_KEY"] = getpass.getpass("Enter API key for Groq: ")
+                from llm_gateway import LLM_TIMEOUT_SECONDS, LLMGateway
+
+                # Retries belong to the gateway; the client's own would hide 429s from the rate limiter
+                _model = LLMGateway([ChatGroq(model=name, api_key=os.environ.get("GROQ_API_KEY"),
+                                              timeout=LLM_TIMEOUT_SECONDS, max_retries=0)
+                                     for name in [MODEL_NAME] + FALLBACK_MODEL_NAMES],
+                                    max_concurrency=SUMMARY_MAX_CONCURRENCY)
+    return _model
+
+# Maximum number of chunk summaries requested from the model at the same time
+SUMMARY_MAX_CONCURRENCY = int(os.environ.get("SUMMARY_MAX_CONCURRENCY", "4"))
+
+# Token budget per chunk sent to the model, and the number of tokens repeated between neighbouring chunks
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", "2000"))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", "100"))
+# Content-defined chunk boundaries keep unchanged parts of a new contract version in identical chunks,
+# so their summaries come from the LLM cache (see chunking.py). Off by default: the earlier cuts make about 16%
+# more chunks, and model calls, on a first upload; turn it on where revised versions are often re-uploaded.
+CHUNK_CONTENT_DEFINED = os.environ.get("CHUNK_CONTENT_DEFINED", "0").lower() in ("1", "true", "yes")
+
+# PDFs with at least this many pages are processed page by page (extraction, chunking, detection and
+# summarization over a stream of pages) instead of as one string, so memory does not grow with their size
+STREAMING_PAGE_THRESHOLD = int(os.environ.get("STREAMING_PAGE_THRESHOLD", "300"))
+
+# Prompt used by the chatbot
+QA_PROMPT = "The following are the most relevant excerpts of a legal document:\n\n{document}\n\nBased on these excerpts, answer the following question: {question}"
+
+# Function to generate summary for each chunk (streamed piece by piece to on_token, if given)
+def generate_summary(text, cache=None, on_token=None):
+    model = get_model()
+    model_name = model_name_of(model)
+    cached = cache.get(model_name, SUMMARY_PROMPT, text) if cache is not None else None
+    if cached is not None:
+        if on_token is not None:
+            on_token(cached)
+        return cached
+
+    prompt = SUMMARY_PROMPT.format(text=text)
+    
+    try:
+        with track_answers() as answers:
+            summary = invoke_model(model, prompt, on_token)
+        
+        if not summary:
+            return "No summary available."
+        summary = summary.strip()
+        if cache is not None and cacheable_answer(answers, model_name):
+            cache.set(summary, model_name, SUMMARY_PROMPT, text)
+        return summary
+    except Exception as e:
+        logger.error(f"Error generating summary: {str(e)}")
+        return None
+
+# Function to save summary to a PDF
+def save_summary_to_pdf(summary_text):
+    try:
+        summary_stream = BytesIO()
+        summary_stream.write(summary_text.encode('utf-8'))
+        summary_stream.seek(0)
+        return summary_stream
+    except Exception as e:
+        raise RuntimeError(f"Failed to save summary to PDF: {e}")
+
+# Function to generate context for detected clauses
+def generate_clause_context(clause_name):
+    context_dict = {
+        "Confidentiality Clause": "This clause is important to protect sensitive information shared between parties.",
+        "Liability Clause": "This clause limits the liability of one or both parties in case of damages or losses.",
+        "Termination Clause": "This clause outlines the conditions under which the agreement can be terminated.",
+        "Force Majeure Clause": "This clause protects parties from liability if an unforeseen event prevents them from fulfilling their obligations.",
+        "Governing Law Clause": "This clause specifies the jurisdiction whose laws will govern the agreement.",
+        "Dispute Resolution Clause": "This clause outlines the method for resolving disputes that arise from the agreement.",
+        "Amendment Clause": "This clause defines how changes to the agreement can be made.",
+        "Warranty Clause": "This clause provides assurances regarding the quality and performance of the subject matter.",
+    }
+    return context_dict.get(clause_name, "No context available for this clause.")
+
+# Function to generate context for hidden obligations
+def generate_obligation_context(obligation_name):
+    context_dict = {
+        "Payment Obligations": "This obligation refers to the responsibility of one party to pay fees or costs as required by the agreement.",
+        "Reporting Obligations": "This obligation entails the requirement to report or notify the other party about specific events or actions.",
+        "Performance Obligations": "This obligation involves ensuring that certain actions or deliverables are completed as specified in the agreement.",
+        "Compliance Obligations": "This obligation requires adherence to relevant laws and regulations applicable to the agreement.",
+    }
+    return context_dict.get(obligation_name, "No context available for this obligation.")
+
+# Function to calculate overall risk score
+def calculate_overall_risk_score(detected_risks):
+    risk_scores = {
+        "High": 3,
+        "Medium": 2,
+        "Low": 1
+    }
+    total_score = sum(risk_scores.get(risk['risk_level'], 0) for risk in detected_risks)
+    return total_score
+
+# Function to plot bar chart for detected key clauses (PNG, cached by the counts; see charts.py)
+def plot_detected_key_clauses_chart(detected_clauses):
+    return io.BytesIO(key_clauses_chart(detected_clauses, renderer="png"))
+
+# Function to plot bar chart for detected hidden obligations
+def plot_detected_hidden_obligations_chart(detected_obligations):
+    return io.BytesIO(hidden_obligations_chart(detected_obligations, renderer="png"))
+
+# Function to plot bar chart for detected risks by risk level
+def plot_risk_level_bar_chart(detected_risks):
+    return io.BytesIO(risk_level_chart(detected_risks, renderer="png"))
+
+# Function to make text safe for the PDF core fonts (latin-1 only)
+def to_latin1(text):
+    return str(text).encode('latin-1', 'replace').decode('latin-1')
+
+# Function to generate the complete report as a PDF, rendered in memory.
+# charts: already rendered PNGs (bytes or BytesIO) for the clause, obligation and risk charts; rendered here if omitted.
+@instrumented("report_build")
+def generate_complete_report(summary_text, detected_clauses, detected_obligations, risks, updates, charts=None):
+    logger.debug("Updates passed to report: %s", updates)
+
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Helvetica", size=12)
+
+    def line(text, width=0, align='L'):
+        pdf.cell(width, 10, text=to_latin1(text), new_x="LMARGIN", new_y="NEXT", align=align)
+
+    line("Legal Document Report", 200, align='C')
+    line("Summary:", 200)
+    pdf.multi_cell(0, 10, to_latin1(summary_text), new_x="LMARGIN", new_y="NEXT")
+
+    line("Detected Key Clauses:", 200)
+    for clause, occurrences in detected_clauses.items():
+        line(f"{clause}: {', '.join(occurrences)}")
+
+    line("Hidden Obligations:", 200)
+    for obligation, occurrences in detected_obligations.items():
+        line(f"{obligation}: {', '.join(occurrences)}")
+
+    # Add Regulatory Updates
+    line("Regulatory Updates:", 200)
+    for update in updates:
+        if isinstance(update, dict) and 'title' in update and 'link' in update:
+            line(f"{update['title']}: {update['link']}")
+        else:
+            line("Invalid update format")
+
+    # Add charts to the PDF straight from memory
+    if charts is None:
+        charts = [plot_detected_key_clauses_chart(detected_clauses),
+                  plot_detected_hidden_obligations_chart(detected_obligations),
+                  plot_risk_level_bar_chart(risks if isinstance(risks, list) else [])]
+    for image in charts:
+        image_bytes = image.getvalue() if hasattr(image, 'getvalue') else image
+        pdf.image(BytesIO(image_bytes), x=10, w=180)  # Adjust size as necessary
+
+    return BytesIO(bytes(pdf.output()))
+
+# Function to send email with the report (synchronously; the app uses the queue in mail_delivery.py)
+def send_email(report_pdf, recipient_email):
+    from mail_delivery import SMTPConnection, build_report_message
+
+    msg = build_report_message(report_pdf, recipient_email, os.environ.get("SENDER_EMAIL"))
+    connection = SMTPConnection()
+    try:
+        connection.send(msg)
+        return True, None  # Return success and no error
+    except Exception as e:
+        return False, str(e)  # Return failure and the error message
+    finally:
+        connection.close()
+
+# Function to answer questions about the document
+def answer_question(question, document_text, cache=None, on_token=None):
+    model = get_model()
+    model_name = model_name_of(model)
+    cached = cache.get(model_name, QA_PROMPT, document_text, question) if cache is not None else None
+    if cached is not None:
+        if on_token is not None:
+            on_token(cached)
+        return cached
+
+    prompt = QA_PROMPT.format(document=document_text, question=question)
+    
+    try:
+        with track_answers() as answers:
+            answer = invoke_model(model, prompt, on_token)
+        
+        if not answer:
+            return "No answer available."
+        answer = answer.strip()
+        if cache is not None and cacheable_answer(answers, model_name):
+            cache.set(answer, model_name, QA_PROMPT, document_text, question)
+        return answer
+    except Exception as e:
+        logger.error(f"Error answering question: {str(e)}")
+        return None
+
+# Function to pass the pages of a PDF through the streaming detector (and a hash, and optionally a spool);
+# yields each page text followed by the newline that separates pages in the full text
+def observe_pages(source, detector, digest, spool=None, workers=1):
+    for page in iter_pages(source, workers):
+        if spool is not None:
+            spool.append(page.text)
+        text = page.text + "\n"
+        detector.feed(text)
+        digest.update(text.encode('utf-8'))
+        yield text
+
+
+# Function to run the full analysis of one document (used by the batch runner).
+# streaming=None picks the page-by-page mode for PDFs of STREAMING_PAGE_THRESHOLD pages or more.
+def analyze_document(source, cache=None, summarize=True, workers=1, streaming=None):
+    source = read_pdf_bytes(source)
+    # The store of analyses (analysis_store.py) is keyed by the hash of the PDF itself, like the app's uploads
+    document = {"upload_sha256": hashlib.sha256(source).hexdigest(), "pages": len(open_pdf(source).pages)}
+    if streaming is None:
+        streaming = document["pages"] >= STREAMING_PAGE_THRESHOLD
+    if streaming:
+        return dict(document, **analyze_document_streaming(source, cache, summarize, workers))
+
+    extracted_text = extract_text_from_pdf(source, workers=workers)
+    text_chunks = split_text_into_chunks(extracted_text, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS,
+                                         content_defined=CHUNK_CONTENT_DEFINED)
+
+    final_summary, summary_errors = "", []
+    if summarize and text_chunks:
+        final_summary, _, summary_errors = summarize_document(
+            get_model(), text_chunks, max_concurrency=SUMMARY_MAX_CONCURRENCY, cache=cache
+        )
+
+    document_hits = scan(extracted_text)
+    detected_clauses = detect_key_clauses(extracted_text, document_hits)
+    detected_obligations = detect_hidden_obligations(extracted_text, document_hits)
+    detected_risks = detect_risks(extracted_text, final_summary, document_hits)
+
+    return dict(document, **{
+        "sha256": hashlib.sha256(extracted_text.encode('utf-8')).hexdigest(),
+        "characters": len(extracted_text),
+        "chunks": len(text_chunks),
+        "summary": final_summary,
+        "summary_errors": [str(e) for e in summary_errors],
+        "key_clauses": detected_clauses,
+        "hidden_obligations": detected_obligations,
+        "risks": detected_risks,
+        "overall_risk_score": calculate_overall_risk_score(detected_risks),
+    })
+
+
+# Function to analyze a document in one pass over its pages: every page goes through the detectors and the
+# chunker as it is extracted, and chunks are summarized as they are produced. Only the current page, a few
+# chunks and the chunk summaries are held, whatever the size of the PDF.
+def analyze_document_streaming(source, cache=None, summarize=True, workers=1):
+    detector = StreamingDetector()
+    digest = hashlib.sha256()
+    texts = observe_pages(source, detector, digest, workers=workers)
+    chunk_count = 0
+
+    def counted(chunks):
+        nonlocal chunk_count
+        for chunk in chunks:
+            chunk_count += 1
+            yield chunk
+
+    chunks = counted(iter_text_chunks(texts, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS,
+                                      content_defined=CHUNK_CONTENT_DEFINED))
+    final_summary, summary_errors = "", []
+    if summarize:
+        final_summary, _, summary_errors = summarize_document(
+            get_model(), chunks, max_concurrency=SUMMARY_MAX_CONCURRENCY, cache=cache
+        )
+    else:
+        for _ in chunks:
+            pass
+
+    detected_risks = detector.risks(final_summary)
+    return {
+        "sha256": digest.hexdigest(),
+        "characters": detector.offset,
+        "chunks": chunk_count,
+        "summary": final_summary,
+        "summary_errors": [str(e) for e in summary_errors],
+        "key_clauses": detector.key_clauses(),
+        "hidden_obligations": detector.hidden_obligations(),
+        "risks": detected_risks,
+        "overall_risk_score": calculate_overall_risk_score(detected_risks),
+    }
@@ -0,0 +1,187 @@
+import contextvars
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from instrumentation import metrics
+
+# Bump this to invalidate every cached entry after an incompatible change
+CACHE_VERSION = "1"
+
+DEFAULT_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3"))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "20000"))
+DEFAULT_TTL_SECONDS = int(os.environ.get("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+
+# Function to hash a piece of text
+def hash_text(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# Function to build the cache key from the prompt inputs, the prompt template and the model name
+def make_key(model_name, prompt_template, *parts):
+    digest = hashlib.sha256()
+    for part in (CACHE_VERSION, model_name or "", prompt_template, *parts):
+        encoded = str(part).encode('utf-8')
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") hash differently
+        digest.update(str(len(encoded)).encode('ascii') + b":" + encoded)
+    return digest.hexdigest()
+
+
+# Function to get a readable name for a model object
+def model_name_of(model):
+    for attribute in ('model_name', 'model'):
+        value = getattr(model, attribute, None)
+        if isinstance(value, str):
+            return value
+    return type(model).__name__
+
+
+# Names of the models that answered the calls made inside the current track_answers() block (None outside one)
+_answers = contextvars.ContextVar("llm_answers", default=None)
+
+
+# Function to note which model answered a call (the LLM gateway calls it; the answer may come from a fallback)
+def record_answer(model_name):
+    answers = _answers.get()
+    if answers is not None:
+        answers.append(model_name)
+
+
+# Context manager collecting the models that answer the calls made inside the block, including those made by tasks
+# it starts; they also count for an enclosing block
+@contextmanager
+def track_answers():
+    answers = []
+    token = _answers.set(answers)
+    try:
+        yield answers
+    finally:
+        _answers.reset(token)
+        outer = _answers.get()
+        if outer is not None:
+            outer.extend(answers)
+
+
+# Function to tell whether an answer may be cached under model_name: not when another model (a fallback) produced
+# any of it, or a short outage of the primary would pin fallback answers under its key for the whole TTL
+def cacheable_answer(answers, model_name):
+    return all(name == model_name for name in answers)
+
+
+# Disk-backed cache for LLM completions with size/TTL eviction and hit/miss counters
+class LLMCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL lets several worker processes read and write the same cache file
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY,"
+            " model_name TEXT NOT NULL,"
+            " prompt_hash TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_accessed ON completions (accessed_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_model ON completions (model_name, prompt_hash)")
+        self._conn.commit()
+
+    # Function to look up a cached completion; returns None on a miss
+    def get(self, model_name, prompt_template, *parts):
+        key = make_key(model_name, prompt_template, *parts)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                metrics.inc("llm_cache_total", 1, "LLM cache lookups", result="miss")
+                return None
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                metrics.inc("llm_cache_total", 1, "LLM cache lookups", result="expired")
+                return None
+            self._conn.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            metrics.inc("llm_cache_total", 1, "LLM cache lookups", result="hit")
+            return value
+
+    # Function to store a completion in the cache
+    def set(self, value, model_name, prompt_template, *parts):
+        key = make_key(model_name, prompt_template, *parts)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, model_name, prompt_hash, value, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name or "", hash_text(prompt_template), value, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    # Function to drop expired entries and the least recently used ones above the size limit
+    def _evict(self, now):
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl_seconds,))
+        if self.max_entries:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM completions WHERE key IN ("
+                    " SELECT key FROM completions ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    # Function to invalidate entries for a model and/or prompt template (everything if neither is given)
+    def invalidate(self, model_name=None, prompt_template=None):
+        conditions = []
+        params = []
+        if model_name is not None:
+            conditions.append("model_name = ?")
+            params.append(model_name)
+        if prompt_template is not None:
+            conditions.append("prompt_hash = ?")
+            params.append(hash_text(prompt_template))
+        query = "DELETE FROM completions"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            deleted = self._conn.execute(query, params).rowcount
+            self._conn.commit()
+        return deleted
+
+    # Function to report cache statistics
+    def stats(self):
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
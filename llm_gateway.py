@@ -0,0 +1,415 @@
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from chunking import estimate_tokens
+from instrumentation import metrics
+from llm_cache import model_name_of, record_answer
+from summary_engine import backoff_delay, is_rate_limit_error, retry_after_seconds
+
+# Seconds to wait for a completion (or, when streaming, for each next piece) before giving up on the attempt
+LLM_TIMEOUT_SECONDS = float(os.environ.get("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE_DELAY = float(os.environ.get("LLM_RETRY_BASE_DELAY", "1.0"))
+# Send a second, identical request when the first has not answered after this many seconds (0 disables hedging)
+LLM_HEDGE_AFTER_SECONDS = float(os.environ.get("LLM_HEDGE_AFTER_SECONDS", "0"))
+# Provider limits, enforced before sending so requests queue here instead of failing with 429 (0 = no limit)
+LLM_REQUESTS_PER_MINUTE = float(os.environ.get("LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_TOKENS_PER_MINUTE = float(os.environ.get("LLM_TOKENS_PER_MINUTE", "0"))
+# File holding the rate limiter state, so the app, batch_cli.py and job_worker.py processes all draw from the
+# same per-minute budget instead of each getting the full limit ("" keeps the limiter inside the process)
+LLM_RATE_LIMIT_PATH = os.environ.get("LLM_RATE_LIMIT_PATH", os.path.join(".cache", "llm_rate_limit.sqlite3"))
+# Calls expected in flight at once through one gateway (get_model passes SUMMARY_MAX_CONCURRENCY); sizes the
+# thread pool used to put a timeout on synchronous calls
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+class LLMTimeoutError(TimeoutError):
+    pass
+
+
+# Function to get the HTTP status carried by a provider error, if any
+def error_status(exc):
+    status = getattr(exc, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+# Function to classify a failed call: "timeout", "rate_limited", "server_error", "connection" or "error"
+def classify_error(exc):
+    if isinstance(exc, TimeoutError) or "timeout" in type(exc).__name__.lower():
+        return "timeout"
+    if is_rate_limit_error(exc):
+        return "rate_limited"
+    status = error_status(exc)
+    if status is not None and status >= 500:
+        return "server_error"
+    if isinstance(exc, ConnectionError) or "connection" in type(exc).__name__.lower():
+        return "connection"
+    return "error"
+
+
+# Function to tell whether a failed call is worth retrying on the same model
+def is_retryable(exc):
+    return classify_error(exc) != "error"
+
+
+# Token bucket; callers reserve capacity and wait their turn, in arrival order
+class TokenBucket:
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._available = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Function to reserve an amount and return how long the caller has to wait for it
+    def reserve(self, amount=1.0):
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+            self._updated = now
+            # A request larger than the whole bucket would wait forever; let it through once the bucket is full
+            self._available -= min(amount, self.capacity)
+            return max(0.0, -self._available / self.rate)
+
+
+# Token bucket kept in a SQLite file: every process opening the same file and name shares one budget.
+# Reservations work as in TokenBucket, with wall-clock time since the processes do not share a monotonic clock.
+class SharedTokenBucket:
+    def __init__(self, path, name, per_minute, capacity=None):
+        self.path = path
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # The file is only opened once a limit is actually enforced, and again in a forked child
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " name TEXT PRIMARY KEY,"
+                " available REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            self._pid = os.getpid()
+        return self._conn
+
+    def reserve(self, amount=1.0):
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = conn.execute("SELECT available, updated_at FROM buckets WHERE name = ?",
+                                   (self.name,)).fetchone()
+                available, updated = row if row is not None else (self.capacity, now)
+                available = min(self.capacity, available + max(0.0, now - updated) * self.rate)
+                available -= min(amount, self.capacity)
+                conn.execute("INSERT OR REPLACE INTO buckets (name, available, updated_at) VALUES (?, ?, ?)",
+                             (self.name, available, now))
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return max(0.0, -available / self.rate)
+
+
+# Function to size the thread pool of synchronous calls: each call in flight may have a hedge copy, and a call
+# given up on after a timeout keeps its thread until the provider client's own timeout ends it
+def sync_call_threads(max_concurrency, hedge_after):
+    in_flight = max(1, max_concurrency) * (2 if hedge_after else 1)
+    return in_flight * 2
+
+
+# Function to create the rate limiter of one provider budget: shared through path when given, else per process
+def make_bucket(per_minute, path, name):
+    if not path:
+        return TokenBucket(per_minute)
+    return SharedTokenBucket(path, name, per_minute)
+
+
+# Drop-in replacement for a chat model: timeouts, shared rate limiting, retries with backoff on 429/5xx,
+# hedged requests and fallback to the next model. Answers come back as the underlying model's responses.
+class LLMGateway:
+    # Tells the summarizer not to add its own retry loop on top of this one
+    handles_retries = True
+
+    def __init__(self, models, timeout=LLM_TIMEOUT_SECONDS, max_retries=LLM_MAX_RETRIES,
+                 base_delay=LLM_RETRY_BASE_DELAY, hedge_after=LLM_HEDGE_AFTER_SECONDS,
+                 requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                 rate_limit_path=LLM_RATE_LIMIT_PATH, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.models = list(models)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.hedge_after = hedge_after
+        # The budget belongs to the provider account, so it is keyed by the primary model, whichever answers
+        self.request_bucket = make_bucket(requests_per_minute, rate_limit_path, f"{self.model_name}:requests")
+        self.token_bucket = make_bucket(tokens_per_minute, rate_limit_path, f"{self.model_name}:tokens")
+        self._executor = ThreadPoolExecutor(max_workers=sync_call_threads(max_concurrency, hedge_after),
+                                            thread_name_prefix="llm-call")
+
+    # Cache entries are keyed by the primary model, whichever model actually answered
+    @property
+    def model_name(self):
+        return model_name_of(self.models[0])
+
+    def _throttle_delay(self, prompt):
+        delay = max(self.request_bucket.reserve(1), self.token_bucket.reserve(estimate_tokens(prompt)))
+        if delay:
+            metrics.observe("llm_throttle_seconds", delay, "Time LLM requests waited for the rate limiter")
+        return delay
+
+    def _retry_delay(self, exc, attempt):
+        return retry_after_seconds(exc) or backoff_delay(attempt, self.base_delay)
+
+    def _count(self, model, outcome):
+        metrics.inc("llm_gateway_requests_total", 1, "LLM requests by model and outcome",
+                    model=model_name_of(model), outcome=outcome)
+
+    # Function to yield (model, attempt) in the order they are tried: every retry of a model, then the next model
+    def _attempts(self):
+        for index, model in enumerate(self.models):
+            if index:
+                metrics.inc("llm_fallbacks_total", 1, "Requests handed to a fallback model",
+                            model=model_name_of(model))
+            for attempt in range(self.max_retries + 1):
+                yield model, attempt
+
+    # ---- asynchronous calls (used by the summarizer) ----
+
+    async def _ainvoke_once(self, model, prompt):
+        try:
+            return await asyncio.wait_for(model.ainvoke(prompt), self.timeout)
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"{model_name_of(model)} did not answer within {self.timeout:.0f}s")
+
+    async def _ainvoke_hedged(self, model, prompt):
+        if not self.hedge_after:
+            return await self._ainvoke_once(model, prompt)
+        pending = {asyncio.ensure_future(self._ainvoke_once(model, prompt))}
+        error = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_after)
+            if done:
+                return done.pop().result()
+            metrics.inc("llm_hedges_total", 1, "Hedge requests sent for slow calls", model=model_name_of(model))
+            await asyncio.sleep(self._throttle_delay(prompt))
+            pending.add(asyncio.ensure_future(self._ainvoke_once(model, prompt)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+        finally:
+            # Whatever is still running is cancelled: the loser after a win, and every request when the caller
+            # itself is cancelled, at any point of the hedge
+            for task in pending:
+                task.cancel()
+        raise error
+
+    async def ainvoke(self, prompt):
+        last_error = None
+        skip_model = None
+        for model, attempt in self._attempts():
+            if model is skip_model:
+                continue
+            if attempt and last_error is not None:
+                await asyncio.sleep(self._retry_delay(last_error, attempt - 1))
+            await asyncio.sleep(self._throttle_delay(prompt))
+            try:
+                response = await self._ainvoke_hedged(model, prompt)
+            except Exception as e:
+                self._count(model, classify_error(e))
+                last_error = e
+                if not is_retryable(e):
+                    skip_model = model
+                continue
+            self._count(model, "ok")
+            record_answer(model_name_of(model))
+            return response
+        raise last_error
+
+    async def astream(self, prompt):
+        last_error = None
+        skip_model = None
+        for model, attempt in self._attempts():
+            if model is skip_model:
+                continue
+            if attempt and last_error is not None:
+                await asyncio.sleep(self._retry_delay(last_error, attempt - 1))
+            await asyncio.sleep(self._throttle_delay(prompt))
+            stream = model.astream(prompt).__aiter__()
+            started = False
+            try:
+                try:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), self.timeout)
+                        except StopAsyncIteration:
+                            break
+                        except asyncio.TimeoutError:
+                            raise LLMTimeoutError(f"{model_name_of(model)} stalled for {self.timeout:.0f}s")
+                        started = True
+                        yield chunk
+                finally:
+                    # Release the model's stream (and its HTTP response) on a timeout, an error, or a caller
+                    # that stops reading, instead of leaving it to the garbage collector
+                    if hasattr(stream, "aclose"):
+                        await stream.aclose()
+            except Exception as e:
+                self._count(model, classify_error(e))
+                # Pieces already shown cannot be taken back, so only a stream that has not started is retried
+                if started:
+                    raise
+                last_error = e
+                if not is_retryable(e):
+                    skip_model = model
+                continue
+            self._count(model, "ok")
+            record_answer(model_name_of(model))
+            return
+        raise last_error
+
+    # ---- synchronous calls (used by generate_summary and answer_question) ----
+
+    def _invoke_once(self, model, prompt, future=None):
+        future = future or self._executor.submit(model.invoke, prompt)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise LLMTimeoutError(f"{model_name_of(model)} did not answer within {self.timeout:.0f}s")
+
+    def _invoke_hedged(self, model, prompt):
+        first = self._executor.submit(model.invoke, prompt)
+        if not self.hedge_after:
+            return self._invoke_once(model, prompt, first)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+        metrics.inc("llm_hedges_total", 1, "Hedge requests sent for slow calls", model=model_name_of(model))
+        time.sleep(self._throttle_delay(prompt))
+        pending = {first, self._executor.submit(model.invoke, prompt)}
+        deadline = time.monotonic() + self.timeout
+        error = None
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                     return_when=FIRST_COMPLETED)
+                if not done:
+                    raise LLMTimeoutError(f"{model_name_of(model)} did not answer within {self.timeout:.0f}s")
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    error = future.exception()
+        finally:
+            # A loser still waiting for a thread is dropped; one already running ends at the client's timeout
+            for future in pending:
+                future.cancel()
+        raise error
+
+    def invoke(self, prompt):
+        last_error = None
+        skip_model = None
+        for model, attempt in self._attempts():
+            if model is skip_model:
+                continue
+            if attempt and last_error is not None:
+                time.sleep(self._retry_delay(last_error, attempt - 1))
+            time.sleep(self._throttle_delay(prompt))
+            try:
+                response = self._invoke_hedged(model, prompt)
+            except Exception as e:
+                self._count(model, classify_error(e))
+                last_error = e
+                if not is_retryable(e):
+                    skip_model = model
+                continue
+            self._count(model, "ok")
+            record_answer(model_name_of(model))
+            return response
+        raise last_error
+
+    # Function to read a synchronous stream in a helper thread so a stalled stream can time out
+    def _stream_pieces(self, model, prompt):
+        pieces = queue.Queue()
+        done = object()
+        abandoned = threading.Event()
+
+        def produce():
+            chunks = None
+            try:
+                chunks = model.stream(prompt)
+                for chunk in chunks:
+                    if abandoned.is_set():
+                        break
+                    pieces.put(chunk)
+                pieces.put(done)
+            except Exception as e:
+                pieces.put(e)
+            finally:
+                if hasattr(chunks, "close"):
+                    chunks.close()
+
+        threading.Thread(target=produce, name="llm-stream", daemon=True).start()
+        try:
+            while True:
+                try:
+                    item = pieces.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise LLMTimeoutError(f"{model_name_of(model)} stalled for {self.timeout:.0f}s")
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Stops reading the model's stream after a timeout or when the caller stops, at the next piece
+            abandoned.set()
+
+    def stream(self, prompt):
+        last_error = None
+        skip_model = None
+        for model, attempt in self._attempts():
+            if model is skip_model:
+                continue
+            if attempt and last_error is not None:
+                time.sleep(self._retry_delay(last_error, attempt - 1))
+            time.sleep(self._throttle_delay(prompt))
+            started = False
+            try:
+                for chunk in self._stream_pieces(model, prompt):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                self._count(model, classify_error(e))
+                if started:
+                    raise
+                last_error = e
+                if not is_retryable(e):
+                    skip_model = model
+                continue
+            self._count(model, "ok")
+            record_answer(model_name_of(model))
+            return
+        raise last_error
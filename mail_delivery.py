@@ -0,0 +1,193 @@
+import itertools
+import logging
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from instrumentation import metrics, timed
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "1").lower() not in ("0", "false", "no")
+SMTP_TIMEOUT = float(os.environ.get("SMTP_TIMEOUT_SECONDS", "30"))
+# An idle connection older than this is checked with NOOP before it is reused
+SMTP_IDLE_CHECK_SECONDS = 60
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 2.0
+
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+# SMTP errors that will not go away by trying again
+PERMANENT_ERRORS = (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                    smtplib.SMTPNotSupportedError)
+
+
+# Function to build the report email with the PDF attached
+def build_report_message(report_pdf, recipient_email, sender_email):
+    msg = MIMEMultipart()
+    msg['From'] = sender_email
+    msg['To'] = recipient_email
+    msg['Subject'] = "Your Legal Document Report"
+
+    body = "Attached is your legal document report."
+    msg.attach(MIMEText(body, 'plain'))
+
+    pdf_bytes = report_pdf.getvalue() if hasattr(report_pdf, 'getvalue') else report_pdf
+    attachment = MIMEApplication(pdf_bytes, _subtype='pdf')
+    attachment.add_header('Content-Disposition', 'attachment', filename='report.pdf')
+    msg.attach(attachment)
+    return msg
+
+
+# Persistent authenticated SMTP connection, reused across messages and reopened when the server drops it
+class SMTPConnection:
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, username=None, password=None, starttls=SMTP_STARTTLS,
+                 timeout=SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.username = username if username is not None else os.environ.get("SENDER_EMAIL")
+        self.password = password if password is not None else os.environ.get("SENDER_PASSWORD")
+        self.starttls = starttls
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._server = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.starttls:
+                # Never fall back to plain text when TLS was asked for: the login would send the password in clear
+                if not server.has_extn('starttls'):
+                    raise smtplib.SMTPNotSupportedError(f"{self.host} does not offer STARTTLS")
+                server.starttls()
+                server.ehlo()
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except BaseException:
+            server.close()
+            raise
+        self.connections_opened += 1
+        return server
+
+    def _ensure_connected(self):
+        if self._server is not None and time.monotonic() - self._last_used > SMTP_IDLE_CHECK_SECONDS:
+            try:
+                if self._server.noop()[0] != 250:
+                    self._drop()
+            except smtplib.SMTPException:
+                self._drop()
+            except OSError:
+                self._drop()
+        if self._server is None:
+            self._server = self._connect()
+        return self._server
+
+    def _drop(self):
+        if self._server is not None:
+            try:
+                self._server.close()
+            except Exception:
+                pass
+        self._server = None
+
+    # Function to send one message, reconnecting once if the server closed the connection
+    def send(self, msg):
+        with self._lock:
+            try:
+                self._ensure_connected().send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self._drop()
+                self._ensure_connected().send_message(msg)
+            except Exception:
+                self._drop()
+                raise
+            self._last_used = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except Exception:
+                    pass
+            self._server = None
+
+
+# Background delivery queue with retry/backoff and pollable per-message status
+class MailQueue:
+    def __init__(self, connection=None, max_retries=MAX_RETRIES, retry_base_delay=RETRY_BASE_DELAY):
+        self.connection = connection or SMTPConnection()
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self._ids = itertools.count(1)
+        self._statuses = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="mail-queue", daemon=True)
+        self._thread.start()
+
+    # Function to queue a message; returns its job id
+    def submit(self, msg):
+        job_id = next(self._ids)
+        with self._lock:
+            self._statuses[job_id] = {"status": QUEUED, "attempts": 0, "error": None,
+                                      "to": msg['To'], "updated_at": time.time()}
+        self._queue.put((job_id, msg))
+        return job_id
+
+    # Function to get the delivery status of a job
+    def status(self, job_id):
+        with self._lock:
+            status = self._statuses.get(job_id)
+            return dict(status) if status else None
+
+    # Function to wait until every queued message has been sent or has failed
+    def join(self):
+        self._queue.join()
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._statuses[job_id].update(fields, updated_at=time.time())
+
+    def _run(self):
+        while True:
+            job_id, msg = self._queue.get()
+            try:
+                self._deliver(job_id, msg)
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, job_id, msg):
+        for attempt in range(1, self.max_retries + 2):
+            self._update(job_id, status=SENDING, attempts=attempt)
+            try:
+                with timed("email_send", attempt=attempt):
+                    self.connection.send(msg)
+            except Exception as e:
+                permanent = isinstance(e, PERMANENT_ERRORS)
+                if permanent or attempt > self.max_retries:
+                    logger.error("Failed to send report to %s: %s", msg['To'], e)
+                    self._update(job_id, status=FAILED, error=str(e))
+                    metrics.inc("emails_total", 1, "Report emails by final status", status=FAILED)
+                    return
+                delay = self.retry_base_delay * (2 ** (attempt - 1))
+                self._update(job_id, status=QUEUED, error=str(e))
+                time.sleep(delay / 2 + random.uniform(0, delay / 2))
+                continue
+            self._update(job_id, status=SENT, error=None)
+            metrics.inc("emails_total", 1, "Report emails by final status", status=SENT)
+            return
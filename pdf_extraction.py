@@ -0,0 +1,157 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from array import array
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from PyPDF2 import PdfReader
+
+from instrumentation import record, timed
+
+# PDFs with at least this many pages are extracted in a process pool
+PARALLEL_PAGE_THRESHOLD = int(os.environ.get("PDF_PARALLEL_PAGE_THRESHOLD", "64"))
+# Number of consecutive pages handed to a worker at a time
+PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", "16"))
+DEFAULT_WORKERS = int(os.environ.get("PDF_WORKERS", "0")) or os.cpu_count() or 1
+# PyPDF2 keeps every object it has parsed; dropping them every this many pages keeps a reader's memory flat
+READER_CACHE_PAGES = 16
+
+# One extracted page: 1-based page number, character offset in the full text, and the page text
+Page = namedtuple("Page", ["number", "offset", "text"])
+
+# Reader opened once per worker process
+_worker_reader = None
+
+
+# Function to extract the text of one page (pages without a text layer give an empty string)
+def page_text(page):
+    try:
+        return page.extract_text() or ""
+    except Exception:
+        return ""
+
+
+# Function to get the raw bytes of an uploaded file, a path or a bytes object
+def read_pdf_bytes(source):
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if isinstance(source, str):
+        with open(source, 'rb') as pdf_file:
+            return pdf_file.read()
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    source.seek(0)
+    return source.read()
+
+
+# Function to open a PDF for random access to its pages (e.g. to preview one page)
+def open_pdf(source):
+    return PdfReader(BytesIO(read_pdf_bytes(source)))
+
+
+def _init_worker(pdf_bytes):
+    global _worker_reader
+    _worker_reader = PdfReader(BytesIO(pdf_bytes))
+
+
+# Function to extract a range of pages in a worker; returns (text, seconds) per page
+def _extract_page_range(page_range):
+    start, end = page_range
+    results = []
+    for i in range(start, end):
+        page_start = time.perf_counter()
+        text = page_text(_worker_reader.pages[i])
+        results.append((text, time.perf_counter() - page_start))
+    _worker_reader.resolved_objects.clear()
+    return results
+
+
+# Function to yield page texts in order in this process, timing each page
+def _iter_page_texts(reader):
+    for number, page in enumerate(reader.pages, start=1):
+        with timed("pdf_page", page=number):
+            text = page_text(page)
+        if number % READER_CACHE_PAGES == 0:
+            reader.resolved_objects.clear()
+        yield text
+
+
+# Function to yield page texts in order, extracting them in a process pool
+def _iter_page_texts_parallel(pdf_bytes, page_count, workers):
+    ranges = [(start, min(start + PAGES_PER_TASK, page_count)) for start in range(0, page_count, PAGES_PER_TASK)]
+    # Spawned workers do not inherit the Streamlit server's threads and locks
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(pdf_bytes,)) as executor:
+        # map() yields results in page order as soon as each range (and every range before it) is done
+        for (start, _), results in zip(ranges, executor.map(_extract_page_range, ranges)):
+            for number, (text, seconds) in enumerate(results, start=start + 1):
+                # Timed in the worker; recorded here so it lands in the caller's trace
+                record("pdf_page", seconds, page=number, parallel=True)
+                yield text
+
+
+# Function to yield the pages of a PDF one by one, with page numbers and character offsets
+def iter_pages(source, workers=None, parallel_threshold=PARALLEL_PAGE_THRESHOLD):
+    if workers is None:
+        workers = DEFAULT_WORKERS
+    pdf_bytes = read_pdf_bytes(source)
+    reader = PdfReader(BytesIO(pdf_bytes))
+    page_count = len(reader.pages)
+
+    if workers > 1 and page_count >= parallel_threshold:
+        texts = _iter_page_texts_parallel(pdf_bytes, page_count, min(workers, -(-page_count // PAGES_PER_TASK)))
+    else:
+        texts = _iter_page_texts(reader)
+
+    offset = 0
+    for number, text in enumerate(texts, start=1):
+        yield Page(number, offset, text)
+        # Pages are separated by a newline in the full text
+        offset += len(text) + 1
+
+
+# Extracted page texts kept in a temporary file rather than in memory; pages can be read back one at a time
+class PageSpool:
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        # Byte offset where each page starts, plus the end of the last one
+        self._offsets = array('q', [0])
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def append(self, text):
+        data = text.encode('utf-8')
+        with self._lock:
+            self._file.seek(self._offsets[-1])
+            self._file.write(data)
+            self._offsets.append(self._offsets[-1] + len(data))
+
+    # Function to read the text of one page (1-based)
+    def page(self, number):
+        with self._lock:
+            start, end = self._offsets[number - 1], self._offsets[number]
+            self._file.seek(start)
+            return self._file.read(end - start).decode('utf-8')
+
+    # Function to yield the page texts in order, each followed by the newline that separates pages in the full text
+    def texts(self):
+        for number in range(1, len(self) + 1):
+            yield self.page(number) + "\n"
+
+    def close(self):
+        self._file.close()
+
+
+# Function to extract the whole text of a PDF (pages joined by newlines)
+def extract_text_from_pdf(source, workers=None):
+    with timed("pdf_extraction") as span:
+        pages = [page.text + "\n" for page in iter_pages(source, workers)]
+        span["pages"] = len(pages)
+        return "".join(pages)
@@ -0,0 +1,215 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+from instrumentation import metrics, timed
+
+logger = logging.getLogger(__name__)
+
+GDPR_BASE_URL = os.environ.get("GDPR_BASE_URL", "https://gdpr-info.eu/")
+DEFAULT_CACHE_PATH = os.environ.get("REGULATORY_CACHE_PATH", os.path.join(".cache", "regulatory.sqlite3"))
+# Responses younger than this are served from the cache without touching the network
+DEFAULT_TTL_SECONDS = int(os.environ.get("REGULATORY_TTL_SECONDS", "3600"))
+REQUEST_TIMEOUT = float(os.environ.get("REGULATORY_TIMEOUT_SECONDS", "10"))
+MAX_PARALLEL_FETCHES = 4
+RECITAL_LIMIT = 3
+FEED_LIMIT = 3
+
+
+class RegulatoryFetchError(RuntimeError):
+    pass
+
+
+# Function to create an HTTP session with a connection pool, reused for every request of the process
+def create_session(pool_size=MAX_PARALLEL_FETCHES):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = "legal-document-summarizer"
+    return session
+
+
+# On-disk HTTP cache that revalidates stale entries with ETag / If-Modified-Since
+class CachedHTTPClient:
+    def __init__(self, cache_path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, session=None,
+                 timeout=REQUEST_TIMEOUT):
+        self.ttl_seconds = ttl_seconds
+        self.timeout = timeout
+        self.session = session or create_session()
+        self.network_requests = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " url TEXT PRIMARY KEY,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " body BLOB NOT NULL,"
+            " fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _load(self, url):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT etag, last_modified, body, fetched_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+
+    def _store(self, url, etag, last_modified, body, fetched_at):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (url, etag, last_modified, body, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, body, fetched_at),
+            )
+            self._conn.commit()
+
+    # Function to GET a URL, answering from the cache while it is fresh and revalidating it when stale
+    def get(self, url):
+        with timed("http_fetch", url=url) as span:
+            body, span["result"] = self._get(url)
+        metrics.inc("http_fetches_total", 1, "Regulatory source fetches by outcome", result=span["result"])
+        return body
+
+    # Function to GET a URL; returns (body, how it was answered)
+    def _get(self, url):
+        now = time.time()
+        cached = self._load(url)
+        if cached is not None and now - cached[3] < self.ttl_seconds:
+            return cached[2], "cached"
+
+        headers = {}
+        if cached is not None:
+            if cached[0]:
+                headers["If-None-Match"] = cached[0]
+            if cached[1]:
+                headers["If-Modified-Since"] = cached[1]
+
+        self.network_requests += 1
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except Exception as e:
+            if cached is not None:
+                logger.warning("Serving stale copy of %s: %s", url, e)
+                return cached[2], "stale"
+            raise RegulatoryFetchError(f"Failed to fetch {url}: {e}")
+
+        if response.status_code == 304 and cached is not None:
+            self.not_modified += 1
+            self._store(url, cached[0], cached[1], cached[2], now)
+            return cached[2], "not_modified"
+        if response.status_code != 200:
+            if cached is not None:
+                logger.warning("Serving stale copy of %s: HTTP %s", url, response.status_code)
+                return cached[2], "stale"
+            raise RegulatoryFetchError(f"Failed to fetch {url}: HTTP {response.status_code}")
+
+        body = response.content
+        self._store(url, response.headers.get("ETag"), response.headers.get("Last-Modified"), body, now)
+        return body, "fetched"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        self.session.close()
+
+
+# Regulatory sources (GDPR recitals and news feed), scraped at most once per interval per process
+class RegulatorySources:
+    def __init__(self, client=None, base_url=GDPR_BASE_URL, interval_seconds=DEFAULT_TTL_SECONDS,
+                 max_workers=MAX_PARALLEL_FETCHES):
+        self.client = client or CachedHTTPClient(ttl_seconds=interval_seconds)
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.interval_seconds = interval_seconds
+        self.max_workers = max_workers
+        self._results = {}
+        self._locks = {"recitals": threading.Lock(), "feed": threading.Lock()}
+
+    # Function to return a memoized result, recomputing it once the interval has passed (one caller at a time)
+    def _memoized(self, name, compute):
+        result = self._results.get(name)
+        if result is not None and time.time() - result[0] < self.interval_seconds:
+            return result[1]
+        with self._locks[name]:
+            result = self._results.get(name)
+            if result is not None and time.time() - result[0] < self.interval_seconds:
+                return result[1]
+            value = compute()
+            self._results[name] = (time.time(), value)
+            return value
+
+    # Function to fetch the latest GDPR updates from the RSS feed
+    def latest_updates(self, limit=FEED_LIMIT):
+        def compute():
+            import feedparser
+
+            feed = feedparser.parse(self.client.get(self.base_url))
+            return [{"update": entry.title, "link": entry.link} for entry in feed.entries[:limit]]
+        return self._memoized("feed", compute)
+
+    # Function to fetch the first recitals, requesting their pages concurrently
+    def recitals(self, limit=RECITAL_LIMIT):
+        def compute():
+            from bs4 import BeautifulSoup
+
+            soup = BeautifulSoup(self.client.get(urljoin(self.base_url, "recitals/")), 'html.parser')
+            listed = []
+            for article in soup.find_all('div', class_='artikel')[:limit]:
+                link = urljoin(self.base_url, article.find('a')['href'])
+                number = article.find('span', class_='nummer').text.strip('()')
+                title = article.find('span', class_='titel').text.strip()
+                listed.append((number, title, link))
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                pages = list(executor.map(self._fetch_recital_page, [link for _, _, link in listed]))
+
+            recitals = {}
+            for (number, title, link), page in zip(listed, pages):
+                if page is None:
+                    logger.warning("Failed to fetch recital %s from %s", number, link)
+                    continue
+                content, release_date = page
+                recitals[number] = {
+                    'title': title,
+                    'content': content,
+                    'release_date': release_date
+                }
+            return recitals
+        return self._memoized("recitals", compute)
+
+    # Function to fetch and parse one recital page; returns None if it cannot be fetched
+    def _fetch_recital_page(self, link):
+        from bs4 import BeautifulSoup
+
+        try:
+            body = self.client.get(link)
+        except RegulatoryFetchError:
+            return None
+        rec_soup = BeautifulSoup(body, 'html.parser')
+        entry = rec_soup.find('div', class_='entry-content')
+        content = entry.get_text(strip=True) if entry else ""
+
+        # Extract the release date (adjust the selector if necessary)
+        date_element = rec_soup.find('time')
+        release_date = date_element['datetime'] if date_element and date_element.has_attr('datetime') \
+            else "Date not available"
+        return content, release_date
+
+    # Function to report fetch statistics (for debugging)
+    def stats(self):
+        return {
+            "network_requests": self.client.network_requests,
+            "not_modified": self.client.not_modified,
+            "memoized": sorted(self._results),
+        }
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import re
+
+import numpy as np
+
+from chunking import iter_text_chunks, split_text_into_chunks
+
+DEFAULT_INDEX_DIR = os.environ.get("RETRIEVAL_INDEX_DIR", os.path.join(".cache", "retrieval"))
+
+# Retrieval works best on smaller passages than the ones sent for summarization
+PASSAGE_MAX_TOKENS = int(os.environ.get("RETRIEVAL_PASSAGE_TOKENS", "300"))
+PASSAGE_OVERLAP_TOKENS = int(os.environ.get("RETRIEVAL_PASSAGE_OVERLAP", "50"))
+DEFAULT_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "6"))
+
+# Bump when the index layout or tokenization changes so old files are rebuilt
+INDEX_VERSION = 1
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or shall that the this to was were will with "
+    "which who what when where how does do any all not no such than then there these those may".split()
+)
+
+
+# Function to split text into lower-case search terms
+def tokenize(text):
+    return [w for w in WORD.findall(text.lower()) if w not in STOPWORDS]
+
+
+# Function to hash a document's text (used as the index key)
+def document_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# BM25 index over the passages of one document, stored as flat NumPy posting arrays
+class DocumentIndex:
+    def __init__(self, passages, vocabulary, postings_offsets, postings_passages, postings_tf, passage_lengths):
+        self.passages = passages
+        self.vocabulary = vocabulary
+        self.term_ids = {term: i for i, term in enumerate(vocabulary)}
+        self.postings_offsets = postings_offsets
+        self.postings_passages = postings_passages
+        self.postings_tf = postings_tf
+        self.passage_lengths = passage_lengths
+        self.average_length = float(passage_lengths.mean()) if len(passage_lengths) else 0.0
+        document_frequency = np.diff(postings_offsets).astype(np.float32)
+        n = len(passages)
+        self.idf = np.log(1.0 + (n - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+
+    # Function to build the index for a list of passages
+    @classmethod
+    def build(cls, passages):
+        term_counts = []
+        vocabulary = {}
+        for passage in passages:
+            counts = {}
+            for term in tokenize(passage):
+                counts[term] = counts.get(term, 0) + 1
+                if term not in vocabulary:
+                    vocabulary[term] = len(vocabulary)
+            term_counts.append(counts)
+
+        terms = sorted(vocabulary)
+        term_ids = {term: i for i, term in enumerate(terms)}
+        term_column = []
+        passage_column = []
+        tf_column = []
+        for passage_id, counts in enumerate(term_counts):
+            for term, count in counts.items():
+                term_column.append(term_ids[term])
+                passage_column.append(passage_id)
+                tf_column.append(count)
+
+        term_column = np.asarray(term_column, dtype=np.int32)
+        order = np.argsort(term_column, kind='stable')
+        postings_passages = np.asarray(passage_column, dtype=np.int32)[order]
+        postings_tf = np.asarray(tf_column, dtype=np.float32)[order]
+        postings_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_column, minlength=len(terms)), out=postings_offsets[1:])
+        passage_lengths = np.asarray([sum(c.values()) for c in term_counts], dtype=np.float32)
+        return cls(list(passages), terms, postings_offsets, postings_passages, postings_tf, passage_lengths)
+
+    # Function to score every passage against a query
+    def score(self, query):
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        if not len(self.passages):
+            return scores
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self.passage_lengths / max(self.average_length, 1e-6))
+        for term in set(tokenize(query)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self.postings_offsets[term_id], self.postings_offsets[term_id + 1]
+            passage_ids = self.postings_passages[start:end]
+            tf = self.postings_tf[start:end]
+            scores[passage_ids] += self.idf[term_id] * tf * (BM25_K1 + 1) / (tf + length_norm[passage_ids])
+        return scores
+
+    # Function to return the top-k passages for a query, in document order
+    def retrieve(self, query, k=DEFAULT_TOP_K):
+        scores = self.score(query)
+        if not len(scores):
+            return []
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = [int(i) for i in top if scores[i] > 0] or [int(i) for i in top]
+        return [self.passages[i] for i in sorted(top)]
+
+    # Function to save the index to an .npz file
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            temp_path,
+            version=np.int32(INDEX_VERSION),
+            passages=np.asarray(self.passages, dtype=np.str_),
+            vocabulary=np.asarray(self.vocabulary, dtype=np.str_),
+            postings_offsets=self.postings_offsets,
+            postings_passages=self.postings_passages,
+            postings_tf=self.postings_tf,
+            passage_lengths=self.passage_lengths,
+        )
+        os.replace(temp_path, path)
+
+    # Function to load an index saved with save(); returns None if it is missing or outdated
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data['version']) != INDEX_VERSION:
+                    return None
+                return cls(
+                    [str(p) for p in data['passages']],
+                    [str(t) for t in data['vocabulary']],
+                    data['postings_offsets'],
+                    data['postings_passages'],
+                    data['postings_tf'],
+                    data['passage_lengths'],
+                )
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+# Function to get the index for a document, loading it from disk or building and persisting it
+def get_document_index(document_text, index_dir=DEFAULT_INDEX_DIR):
+    return _load_or_build(document_hash(document_text), index_dir, lambda: split_text_into_chunks(
+        document_text, PASSAGE_MAX_TOKENS, PASSAGE_OVERLAP_TOKENS))
+
+
+# Function to get the index for a document streamed page by page (texts as given to iter_text_chunks);
+# text_hash is the SHA-256 of their concatenation, so the index file is shared with get_document_index
+def get_streamed_document_index(text_hash, texts, index_dir=DEFAULT_INDEX_DIR):
+    return _load_or_build(text_hash, index_dir, lambda: list(iter_text_chunks(
+        texts, PASSAGE_MAX_TOKENS, PASSAGE_OVERLAP_TOKENS)))
+
+
+def _load_or_build(text_hash, index_dir, make_passages):
+    path = os.path.join(index_dir, text_hash + ".npz")
+    index = DocumentIndex.load(path)
+    if index is None:
+        index = DocumentIndex.build(make_passages())
+        index.save(path)
+    return index
@@ -0,0 +1,136 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+
+from instrumentation import metrics, timed
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CREDENTIALS_PATH = os.environ.get(
+    "GOOGLE_CREDENTIALS_PATH", 'C:/Users/HP/Downloads/legal-document-summarizer-9184c374ef5e.json'
+)
+GOOGLE_SHEET_ID = os.environ.get("GOOGLE_SHEET_ID", "10CfoDU63laATnvYiCh8rUCfTpVbaYmq7CMEPIFQ5CPQ")
+GOOGLE_SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+
+# Function to build the (title, release_date) row stored for an update
+def update_row(update):
+    return [update['title'], update['release_date']]
+
+
+# Google Sheets backend; authorizes once and reuses the worksheet handle
+class GoogleSheetsBackend:
+    def __init__(self, credentials_path=GOOGLE_CREDENTIALS_PATH, sheet_id=GOOGLE_SHEET_ID):
+        self.credentials_path = credentials_path
+        self.sheet_id = sheet_id
+        self._sheet = None
+
+    def _worksheet(self):
+        if self._sheet is None:
+            import gspread
+            from oauth2client.service_account import ServiceAccountCredentials
+
+            creds = ServiceAccountCredentials.from_json_keyfile_name(self.credentials_path, GOOGLE_SCOPE)
+            client = gspread.authorize(creds)
+            self._sheet = client.open_by_key(self.sheet_id).sheet1  # Access the first sheet
+        return self._sheet
+
+    # Function to read the (title, release_date) keys already in the sheet
+    def existing_keys(self):
+        return {tuple(row[:2]) for row in self._worksheet().get_all_values() if len(row) >= 2}
+
+    # Function to append several rows in a single API call
+    def append_rows(self, rows):
+        self._worksheet().append_rows(rows, value_input_option="RAW")
+
+
+# SQLite backend with the same interface, for tests and local runs
+class SQLiteBackend:
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS updates (title TEXT NOT NULL, release_date TEXT NOT NULL)")
+        self._conn.commit()
+
+    def existing_keys(self):
+        return {tuple(row) for row in self._conn.execute("SELECT title, release_date FROM updates")}
+
+    def append_rows(self, rows):
+        self._conn.executemany("INSERT INTO updates (title, release_date) VALUES (?, ?)", rows)
+        self._conn.commit()
+
+
+# Deduplicating sink that writes new rows in batches from a background thread
+class UpdateSink:
+    def __init__(self, backend):
+        self.backend = backend
+        self.rows_written = 0
+        self.batches_written = 0
+        self.last_error = None
+        self._known_keys = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = threading.Thread(target=self._run, name="update-sink", daemon=True)
+        self._thread.start()
+
+    # Function to queue updates for writing (duplicates are dropped by the background thread)
+    def submit(self, updates):
+        rows = [update_row(update) for update in updates.values()]
+        with self._lock:
+            self._idle.clear()
+            self._queue.put(rows)
+
+    # Function to wait until every submitted row has been written (or failed)
+    def flush(self, timeout=None):
+        return self._idle.wait(timeout)
+
+    def _load_known_keys(self):
+        if self._known_keys is None:
+            self._known_keys = self.backend.existing_keys()
+        return self._known_keys
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Drain everything already queued so it goes out in the same API call
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write([row for rows in batch for row in rows])
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error("Error storing updates: %s", e)
+            with self._lock:
+                if self._queue.empty():
+                    self._idle.set()
+
+    def _write(self, rows):
+        known_keys = self._load_known_keys()
+        new_rows = []
+        for row in rows:
+            key = tuple(row)
+            if key not in known_keys:
+                known_keys.add(key)
+                new_rows.append(row)
+        if not new_rows:
+            return
+        try:
+            with timed("sheets_write", rows=len(new_rows)):
+                self.backend.append_rows(new_rows)
+        except Exception:
+            # Forget the keys so a later submit can retry them
+            known_keys.difference_update(tuple(row) for row in new_rows)
+            raise
+        self.rows_written += len(new_rows)
+        self.batches_written += 1
+        metrics.inc("sheets_rows_written_total", len(new_rows), "Update rows written to the sheet")
+        logger.info("Stored %d new updates", len(new_rows))
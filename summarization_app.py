@@ -1,451 +1,383 @@
 import os
-import re
-import getpass
-import requests
-import json
-import matplotlib.pyplot as plt
+import subprocess
+import sys
+import time
+import uuid
 import streamlit as st
-from io import BytesIO
-from dotenv import load_dotenv
-from PyPDF2 import PdfReader
-from langchain_groq import ChatGroq
-from fpdf import FPDF
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
-import tempfile
-from bs4 import BeautifulSoup
-import feedparser
-import io
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-
-# Load environment variables
-load_dotenv()
-
-# Initialize Langchain Groq model
-if not os.environ.get("GROQ_API_KEY"):
-    os.environ["GROQ_API_KEY"] = getpass.getpass("Enter API key for Groq: ")
-
-model = ChatGroq(model="llama-3.1-8b-instant", api_key=os.environ.get("GROQ_API_KEY"))
-
-# Function to connect to Google Sheets
-def connect_to_google_sheets():
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_name('C:/Users/HP/Downloads/legal-document-summarizer-9184c374ef5e.json', scope)
-    client = gspread.authorize(creds)
-    return client
-
-def store_updates_in_google_sheet(updates):
-    print("Storing updates in Google Sheets...")  # Debug statement
-    client = connect_to_google_sheets()
-    sheet_id = "10CfoDU63laATnvYiCh8rUCfTpVbaYmq7CMEPIFQ5CPQ"  # Your Sheet ID
-    sheet = client.open_by_key(sheet_id).sheet1  # Access the first sheet
-
-    for _, update in updates.items():  # Iterate over the values of the dictionary
-        try:
-            print(f"Storing update: {update}")  # Debug statement
-            sheet.append_row([update['title'], update['release_date']])  # Adjust fields as necessary
-            print(f"Successfully stored: {update}")  # Success message
-        except Exception as e:
-            print(f"Error storing update: {e}")  # Log error
-
-# Function to extract text from PDF
-def extract_text_from_pdf(uploaded_file):
-    reader = PdfReader(uploaded_file)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() + "\n"
-    return text
-
-# Function to split text into chunks based on token estimate
-def split_text_into_chunks(input_text, max_tokens=2000):
-    words = input_text.split()
-    chunks = []
-    current_chunk = []
-    current_token_count = 0
-    
-    for word in words:
-        estimated_tokens = len(word.split())
-        if current_token_count + estimated_tokens > max_tokens:
-            chunks.append(" ".join(current_chunk))
-            current_chunk = [word]
-            current_token_count = estimated_tokens
+from llm_cache import LLMCache
+from fingerprint import FingerprintStore
+from instrumentation import metrics, serve_metrics, set_trace
+from analysis_state import BundleAnalysis, DocumentAnalysis, bundle_id_of, hash_upload
+from analysis_store import AnalysisStore
+from job_queue import DONE as JOB_DONE, FAILED as JOB_FAILED, QUEUED as JOB_QUEUED, JobQueue
+from clause_scanner import CLAUSE_KEYWORDS, OBLIGATION_KEYWORDS, RISK_PHRASES
+from regulatory_sources import RegulatoryFetchError, RegulatorySources
+from sheets_sink import GoogleSheetsBackend, UpdateSink
+from legal_analysis import (
+    answer_question, calculate_overall_risk_score, generate_clause_context, generate_complete_report,
+    generate_obligation_context, get_model, save_summary_to_pdf,
+)
+
+# Langchain Groq model, created on first use and shared by every session
+@st.cache_resource
+def get_shared_model():
+    return get_model()
+
+# Disk-backed cache of LLM completions, shared by every session of this process
+@st.cache_resource
+def get_llm_cache():
+    return LLMCache()
+
+llm_cache = get_llm_cache()
+
+# Fingerprints of earlier uploads (exact duplicates and near-identical versions), shared by every session
+@st.cache_resource
+def get_fingerprint_store():
+    return FingerprintStore()
+
+# Detections of every analyzed document, searchable across the corpus, shared by every session
+@st.cache_resource
+def get_analysis_store():
+    return AnalysisStore()
+
+# Google Sheets sink with one authorized client, shared by every session
+@st.cache_resource
+def get_update_sink():
+    return UpdateSink(GoogleSheetsBackend())
+
+# Email delivery queue with one persistent SMTP connection, shared by every session
+@st.cache_resource
+def get_mail_queue():
+    from mail_delivery import MailQueue
+    return MailQueue()
+
+# Regulatory sources with a pooled HTTP session and an on-disk cache, shared by every session
+@st.cache_resource
+def get_regulatory_sources():
+    return RegulatorySources()
+
+# Queue of background analyses, run by job_worker.py processes, shared by every session
+@st.cache_resource
+def get_job_queue():
+    return JobQueue()
+
+# Worker processes for the background analyses, started once per app process when JOB_WORKERS is set
+# (otherwise run `python job_worker.py` separately, on as many cores as needed)
+@st.cache_resource
+def start_job_workers(count):
+    worker_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "job_worker.py")
+    return subprocess.Popen([sys.executable, worker_script, "--workers", str(count)])
+
+if os.environ.get("JOB_WORKERS"):
+    start_job_workers(int(os.environ["JOB_WORKERS"]))
+
+# Prometheus endpoint at :METRICS_PORT/metrics, started once per process when METRICS_PORT is set
+@st.cache_resource
+def start_metrics_server(port):
+    return serve_metrics(port)
+
+if os.environ.get("METRICS_PORT"):
+    start_metrics_server(int(os.environ["METRICS_PORT"]))
+
+# Function to display a chart: a Vega-Lite spec is drawn by the browser, PNG bytes or SVG markup as an image
+def show_chart(chart, caption):
+    if isinstance(chart, dict):
+        st.vega_lite_chart(chart, use_container_width=True)
+        st.caption(caption)
+    else:
+        st.image(chart, caption=caption)
+
+# Highest possible overall risk score: every risk phrase detected
+MAX_RISK_SCORE = calculate_overall_risk_score(RISK_PHRASES)
+
+# Function to show the corpus search: filters over every stored analysis, answered from the index alone
+def show_corpus_search(store):
+    st.header("🔎 Search Analyzed Documents")
+    facets = store.facets()
+    st.caption(f"{store.stats()['documents']} documents analyzed so far")
+    with st.form("corpus_search"):
+        first, second = st.columns(2)
+        clauses = first.multiselect(
+            "Key clauses (all of)", list(CLAUSE_KEYWORDS),
+            format_func=lambda name: f"{name} ({facets['clause'].get(name, 0)})")
+        obligations = second.multiselect(
+            "Hidden obligations (all of)", list(OBLIGATION_KEYWORDS),
+            format_func=lambda name: f"{name} ({facets['obligation'].get(name, 0)})")
+        risk_phrase = first.selectbox("Risk phrase", [""] + [item["phrase"] for item in RISK_PHRASES],
+                                      format_func=lambda phrase: phrase or "any")
+        risk_levels = second.multiselect(
+            "Risk level (any of)", ["High", "Medium", "Low"],
+            format_func=lambda level: f"{level} ({facets['risk_level'].get(level, 0)})")
+        min_score, max_score = first.slider("Overall risk score", 0, MAX_RISK_SCORE, (0, MAX_RISK_SCORE))
+        text = second.text_input("Words in the name, summary or risk context")
+        st.form_submit_button("Search")
+    start = time.perf_counter()
+    results = store.query(clauses, obligations, risk_phrase or None, risk_levels,
+                          min_score or None, max_score if max_score < MAX_RISK_SCORE else None, text)
+    st.write(f"**{len(results)} documents** ({(time.perf_counter() - start) * 1000:.1f} ms)")
+    if results:
+        st.dataframe([{"document": row["name"], "pages": row["pages"], "risk score": row["overall_risk_score"],
+                       "key clauses": row["key_clauses"], "risks": row["risks"]} for row in results],
+                     use_container_width=True)
+        names = {row["document_sha"]: row["name"] for row in results}
+        chosen = st.selectbox("Details", list(names), format_func=names.get)
+        stored = store.get(chosen)
+        if stored:
+            if stored["summary"]:
+                st.write(stored["summary"])
+            st.json({"key_clauses": stored["key_clauses"], "hidden_obligations": stored["hidden_obligations"],
+                     "risks": stored["risks"]}, expanded=False)
+
+# Function to show the bundle view: the PDFs of a contract bundle summarized as one tree (chunks, documents, bundle).
+# Documents summarized before come from the cache, so adding an amendment only summarizes that file and the bundle.
+def show_bundle_summary():
+    st.header("📚 Summarize a Contract Bundle")
+    uploads = st.file_uploader("Upload the PDFs of the bundle, master agreement first, then its schedules and "
+                               "amendments", type=["pdf"], accept_multiple_files=True)
+    if not uploads:
+        return
+    # Per-document state is kept across reruns, so adding or removing a file leaves the other documents as they are
+    known = st.session_state.get('bundle_documents', {})
+    documents = {}
+    for upload in uploads:
+        pdf_bytes = upload.getvalue()
+        document_id = hash_upload(pdf_bytes)
+        if document_id not in documents:
+            documents[document_id] = known.get(document_id) or DocumentAnalysis(
+                upload.name, pdf_bytes, cache=llm_cache, model_getter=get_shared_model,
+                fingerprints=get_fingerprint_store())
+    st.session_state.bundle_documents = documents
+    documents = list(documents.values())
+    bundle = st.session_state.get('bundle')
+    if bundle is None or bundle.bundle_id != bundle_id_of(documents):
+        bundle = BundleAnalysis(documents, cache=llm_cache, model_getter=get_shared_model)
+        st.session_state.bundle = bundle
+
+    # One status line per document, filled in as each document summary is done, then the bundle summary streamed
+    status_slots = [st.empty() for _ in documents]
+    for slot, document in zip(status_slots, documents):
+        slot.write(f"⏳ {document.name}")
+    final_slot = st.empty()
+    streamed = []
+    started = time.perf_counter()
+
+    def show_document_done(index, summary, errors):
+        nonlocal started
+        mark = "⚠️" if errors or not summary else "✅"
+        status_slots[index].write(f"{mark} {documents[index].name} ({time.perf_counter() - started:.1f}s)")
+        started = time.perf_counter()
+
+    def show_summary_token(piece):
+        streamed.append(piece)
+        final_slot.markdown("".join(streamed) + "▌")
+
+    bundle_summary, document_summaries, errors = bundle.summarize(show_document_done, show_summary_token)
+    final_slot.empty()
+    for error in errors:
+        st.error(f"Error generating summary: {str(error)}")
+    st.subheader("📋 Bundle Summary")
+    st.text_area("Bundle Summary:", bundle_summary, height=300)
+    st.download_button(label="Download Bundle Summary as PDF", data=save_summary_to_pdf(bundle_summary).getvalue(),
+                       file_name="bundle_summary.pdf", mime="application/pdf")
+    for document, summary in zip(documents, document_summaries):
+        with st.expander(document.name, expanded=False):
+            st.write(summary or "No summary available.")
+
+# Seconds between two looks at the running jobs of the jobs view
+JOB_REFRESH_SECONDS = float(os.environ.get("JOB_REFRESH_SECONDS", "2"))
+
+# Function to show the results a job has published so far (see job_worker.run_job)
+def show_job_results(status):
+    partials = {}
+    sections = []
+    for partial in status["partials"]:
+        if partial["stage"] == "section":
+            sections.append(partial["payload"])
         else:
-            current_chunk.append(word)
-            current_token_count += estimated_tokens
-
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
-    
-    return chunks
-
-# Function to generate summary for each chunk
-def generate_summary(text):
-    prompt = f"Please summarize the following content:\n\n{text}"
-    
-    try:
-        response = model.invoke(prompt)
-        if hasattr(response, 'content'):
-            summary = response.content
-        else:
-            summary = str(response)
-        
-        return summary.strip() if summary else "No summary available."
-    except Exception as e:
-        st.error(f"Error generating summary: {str(e)}")
-        return None
-
-# Function to save summary to a PDF
-def save_summary_to_pdf(summary_text):
-    try:
-        summary_stream = BytesIO()
-        summary_stream.write(summary_text.encode('utf-8'))
-        summary_stream.seek(0)
-        return summary_stream
-    except Exception as e:
-        raise RuntimeError(f"Failed to save summary to PDF: {e}")
-
-# Function to detect key clauses and their purposes
-def detect_key_clauses(text):
-    clauses = {
-        "Confidentiality Clause": r"(?i)(confidentiality|non-disclosure)[^.!?]*",
-        "Liability Clause": r"(?i)(liability|indemnity)[^.!?]*",
-        "Termination Clause": r"(?i)(termination|end|expire)[^.!?]*",
-        "Force Majeure Clause": r"(?i)(force majeure)[^.!?]*",
-        "Governing Law Clause": r"(?i)(governing law|jurisdiction)[^.!?]*",
-        "Dispute Resolution Clause": r"(?i)(dispute resolution|arbitration|mediation)[^.!?]*",
-        "Amendment Clause": r"(?i)(amendment|modification)[^.!?]*",
-        "Warranty Clause": r"(?i)(warranty|guarantee)[^.!?]*",
-    }
-    detected_clauses = {}
-    for clause_name, regex in clauses.items():
-        matches = re.findall(regex, text)
-        if matches:
-            detected_clauses[clause_name] = list(set(matches))  # Unique matches
-    return detected_clauses
-
-# Function to detect hidden obligations and dependencies
-def detect_hidden_obligations(text):
-    obligations = {
-        "Payment Obligations": r"(?i)(payment|fee|cost)[^.!?]*",
-        "Reporting Obligations": r"(?i)(reporting|notification|inform)[^.!?]*",
-        "Performance Obligations": r"(?i)(perform|provide|deliver)[^.!?]*",
-        "Compliance Obligations": r"(?i)(compliance|law|regulation)[^.!?]*",
-    }
-    detected_obligations = {}
-    for obligation_name, regex in obligations.items():
-        matches = re.findall(regex, text)
-        if matches:
-            detected_obligations[obligation_name] = list(set(matches))  # Unique matches
-    return detected_obligations
-
-# Function to generate context for detected clauses
-def generate_clause_context(clause_name):
-    context_dict = {
-        "Confidentiality Clause": "This clause is important to protect sensitive information shared between parties.",
-        "Liability Clause": "This clause limits the liability of one or both parties in case of damages or losses.",
-        "Termination Clause": "This clause outlines the conditions under which the agreement can be terminated.",
-        "Force Majeure Clause": "This clause protects parties from liability if an unforeseen event prevents them from fulfilling their obligations.",
-        "Governing Law Clause": "This clause specifies the jurisdiction whose laws will govern the agreement.",
-        "Dispute Resolution Clause": "This clause outlines the method for resolving disputes that arise from the agreement.",
-        "Amendment Clause": "This clause defines how changes to the agreement can be made.",
-        "Warranty Clause": "This clause provides assurances regarding the quality and performance of the subject matter.",
-    }
-    return context_dict.get(clause_name, "No context available for this clause.")
-
-# Function to generate context for hidden obligations
-def generate_obligation_context(obligation_name):
-    context_dict = {
-        "Payment Obligations": "This obligation refers to the responsibility of one party to pay fees or costs as required by the agreement.",
-        "Reporting Obligations": "This obligation entails the requirement to report or notify the other party about specific events or actions.",
-        "Performance Obligations": "This obligation involves ensuring that certain actions or deliverables are completed as specified in the agreement.",
-        "Compliance Obligations": "This obligation requires adherence to relevant laws and regulations applicable to the agreement.",
-    }
-    return context_dict.get(obligation_name, "No context available for this obligation.")
-
-# Function to detect risks in the text
-def detect_risks(text, summary):
-    risk_phrases = [
-        {"phrase": "penalty", "summary": "This indicates financial or legal consequences.", "risk_level": "High"},
-        {"phrase": "liability", "summary": "This suggests potential financial responsibility.", "risk_level": "Medium"},
-        {"phrase": "default", "summary": "This can lead to serious legal consequences.", "risk_level": "High"},
-        {"phrase": "breach", "summary": "This may expose the party to significant penalties.", "risk_level": "High"},
-        {"phrase": "suspension", "summary": "This indicates risks of halting services.", "risk_level": "Medium"},
-        {"phrase": "should", "summary": "This implies a recommendation, which may not be mandatory.", "risk_level": "Low"},
-        {"phrase": "may be required", "summary": "This suggests that obligations could exist under certain conditions.", "risk_level": "Low"},
-        {"phrase": "indemnify", "summary": "This entails a duty to compensate for harm or loss, indicating potential financial risk.", "risk_level": "High"},
-        {"phrase": "termination for cause", "summary": "This indicates a risk of ending the contract due to specific failures.", "risk_level": "High"},
-        {"phrase": "compliance", "summary": "Non-compliance with regulations can lead to legal penalties.", "risk_level": "High"},
-    ]
-    
-    detected_risks = []
-    
-    for item in risk_phrases:
-        if item["phrase"].lower() in text.lower() or item["phrase"].lower() in summary.lower():
-            phrase_start = text.lower().find(item["phrase"].lower())
-            context = text[phrase_start - 50: phrase_start + 200]
-            detected_risks.append({
-                "phrase": item["phrase"],
-                "summary": item["summary"],
-                "context": context.strip(),
-                "risk_level": item["risk_level"]
-            })
-    
-    return detected_risks
-
-# Function to calculate overall risk score
-def calculate_overall_risk_score(detected_risks):
-    risk_scores = {
-        "High": 3,
-        "Medium": 2,
-        "Low": 1
-    }
-    total_score = sum(risk_scores.get(risk['risk_level'], 0) for risk in detected_risks)
-    return total_score
-
-# Function to plot bar chart for detected key clauses
-def plot_detected_key_clauses_chart(detected_clauses):
-    clause_names = list(detected_clauses.keys())
-    occurrence_counts = [len(occurrences) for occurrences in detected_clauses.values()]
-
-    plt.figure(figsize=(6, 3))  # Reduced size
-    plt.bar(clause_names, occurrence_counts, color='skyblue')
-    plt.title('Detected Key Clauses', fontsize=10)
-    plt.xlabel('Clause Names', fontsize=8)
-    plt.ylabel('Occurrences', fontsize=8)
-    plt.xticks(rotation=45, fontsize=8)
-    plt.yticks(fontsize=8)
-    plt.tight_layout()
-
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight')
-    buf.seek(0)
-    plt.close()  # Close the figure after saving to prevent display
-    return buf
-
-# Function to plot bar chart for detected hidden obligations
-def plot_detected_hidden_obligations_chart(detected_obligations):
-    obligation_names = list(detected_obligations.keys())
-    occurrence_counts = [len(occurrences) for occurrences in detected_obligations.values()]
-
-    plt.figure(figsize=(6, 3))  # Reduced size
-    plt.bar(obligation_names, occurrence_counts, color='lightgreen')
-    plt.title('Detected Hidden Obligations and Dependencies', fontsize=10)
-    plt.xlabel('Obligation Names', fontsize=8)
-    plt.ylabel('Occurrences', fontsize=8)
-    plt.xticks(rotation=45, fontsize=8)
-    plt.yticks(fontsize=8)
-    plt.tight_layout()
-
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight')
-    buf.seek(0)
-    plt.close()  # Close the figure after saving to prevent display
-    return buf
-
-# Function to plot bar chart for detected risks by risk level
-def plot_risk_level_bar_chart(detected_risks):
-    risk_levels = [risk['risk_level'] for risk in detected_risks]
-    risk_counts = {level: risk_levels.count(level) for level in set(risk_levels)}
-
-    plt.figure(figsize=(4, 3))  # Smaller figure size
-    plt.bar(risk_counts.keys(), risk_counts.values(), color='salmon')
-    plt.xticks(rotation=45, ha='right')
-    plt.title("Detected Risks by Level", fontsize=10)
-    plt.xlabel("Risk Level")
-    plt.ylabel("Count")
-
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight')
-    buf.seek(0)
-    plt.close()  # Close the figure after saving to prevent display
-    return buf
-
-# Function to generate the complete report as a PDF
-def generate_complete_report(summary_text, detected_clauses, detected_obligations, risks, updates):
-    # Debug statement
-    print(f"Updates passed to report: {updates}")
-
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-
-    pdf.cell(200, 10, txt="Legal Document Report", ln=True, align='C')
-    pdf.cell(200, 10, txt="Summary:", ln=True)
-    pdf.multi_cell(0, 10, summary_text.encode('latin-1', 'replace').decode('latin-1'))  # Handle encoding
-
-    pdf.cell(200, 10, txt="Detected Key Clauses:", ln=True)
-    for clause, occurrences in detected_clauses.items():
-        pdf.cell(0, 10, txt=f"{clause}: {', '.join(occurrences)}", ln=True)
-
-    pdf.cell(200, 10, txt="Hidden Obligations:", ln=True)
-    for obligation, occurrences in detected_obligations.items():
-        pdf.cell(0, 10, txt=f"{obligation}: {', '.join(occurrences)}", ln=True)
-
-    # Add Regulatory Updates
-    pdf.cell(200, 10, txt="Regulatory Updates:", ln=True)
-    for update in updates:
-        if isinstance(update, dict) and 'title' in update and 'link' in update:
-            pdf.cell(0, 10, txt=f"{update['title']}: {update['link']}", ln=True)
-        else:
-            pdf.cell(0, 10, txt="Invalid update format", ln=True)
-
-    # Add charts to the PDF
-    for image_buf in [plot_detected_key_clauses_chart(detected_clauses), 
-                      plot_detected_hidden_obligations_chart(detected_obligations), 
-                      plot_risk_level_bar_chart([])]:  # Pass an empty list for now
-        image_path = tempfile.mktemp(suffix='.png')
-        with open(image_path, 'wb') as img_file:
-            img_file.write(image_buf.getvalue())
-        pdf.image(image_path, x=10, w=180)  # Adjust size as necessary
-
-    # Write to a temporary file and then read back
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-        pdf.output(temp_file.name)
-        temp_file.seek(0)
-        pdf_output = BytesIO(temp_file.read())
-        
-    return pdf_output
-
-# Function to send email with the report
-def send_email(report_pdf, recipient_email):
-    sender_email = os.environ.get("SENDER_EMAIL")
-    sender_password = os.environ.get("SENDER_PASSWORD")
-
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = recipient_email
-    msg['Subject'] = "Your Legal Document Report"
-
-    body = "Attached is your legal document report."
-    msg.attach(MIMEText(body, 'plain'))
-
-    attachment = MIMEApplication(report_pdf.read(), _subtype='pdf')
-    attachment.add_header('Content-Disposition', 'attachment', filename='report.pdf')
-    msg.attach(attachment)
-
-    try:
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.send_message(msg)
-        return True, None  # Return success and no error
-    except Exception as e:
-        return False, str(e)  # Return failure and the error message
-
-# Function to fetch the latest GDPR updates from the RSS feed
-def fetch_latest_gdpr_updates():
-    url = "https://gdpr-info.eu/"
-    feed = feedparser.parse(url)
-
-    updates = []
-    
-    # Extract the latest 3 updates
-    for entry in feed.entries[:3]:
-        title = entry.title
-        link = entry.link
-        updates.append({"update": title, "link": link})
-
-    return updates
-
-# Function to fetch live recitals from the GDPR website
-def fetch_gdpr_recitals():
-    url = "https://gdpr-info.eu/recitals/"
-    response = requests.get(url)
-
-    # Check if the request was successful
-    if response.status_code != 200:
-        st.error("Failed to fetch data from the GDPR website.")
-        return {}
-
-    soup = BeautifulSoup(response.content, 'html.parser')
-
-    recitals = {}
-    # Locate all recital links
-    articles = soup.find_all('div', class_='artikel')
-    
-    # Extract each recital's link and title
-    for i, article in enumerate(articles):
-        if i >= 3:  # Limit to the first 3 recitals
-            break
-        link = article.find('a')['href']
-        number = article.find('span', class_='nummer').text.strip('()')
-        title = article.find('span', class_='titel').text.strip()
-        
-        # Fetch the content of each recital
-        rec_response = requests.get(link)
-        if rec_response.status_code == 200:
-            rec_soup = BeautifulSoup(rec_response.content, 'html.parser')
-            content = rec_soup.find('div', class_='entry-content').get_text(strip=True)
-
-            # Extract the release date (adjust the selector if necessary)
-            date_element = rec_soup.find('time')
-            release_date = date_element['datetime'] if date_element else "Date not available"
-
-            recitals[number] = {
-                'title': title,
-                'content': content,
-                'release_date': release_date
-            }
-        else:
-            print(f"Failed to fetch recital {number} from {link}")
-
-    return recitals
-
-# Function to answer questions about the document
-def answer_question(question, document_text):
-    prompt = f"The following is a legal document:\n\n{document_text}\n\nBased on this document, answer the following question: {question}"
-    
-    try:
-        response = model.invoke(prompt)
-        if hasattr(response, 'content'):
-            answer = response.content
+            partials[partial["stage"]] = partial["payload"]
+    if "detections" in partials:
+        detections = partials["detections"]
+        st.write(f"**Pages:** {detections['pages']}")
+        st.write("**Key clauses:** " + (", ".join(detections["key_clauses"]) or "none"))
+        st.write("**Hidden obligations:** " + (", ".join(detections["hidden_obligations"]) or "none"))
+    if "summary" in partials:
+        for error in partials["summary"]["errors"]:
+            st.error(f"Error generating summary: {error}")
+        st.text_area("Generated Summary:", partials["summary"]["summary"], height=300)
+    elif sections:
+        # Section summaries as they land, in document order
+        with st.expander(f"{len(sections)} sections summarized so far", expanded=True):
+            for section in sorted(sections, key=lambda payload: payload["index"]):
+                st.markdown(f"**Section {section['index'] + 1}:** {section['summary']}")
+    if "risks" in partials:
+        st.write(f"*Overall Risk Score:* {partials['risks']['overall_risk_score']}")
+        for risk in partials["risks"]["risks"]:
+            st.write(f"- {risk['phrase']} ({risk['risk_level']})")
+    if "email" in partials:
+        email = partials["email"]
+        if email["sent"]:
+            st.success(f"Report sent successfully to {email['to']}!")
         else:
-            answer = str(response)
-        
-        return answer.strip() if answer else "No answer available."
-    except Exception as e:
-        st.error(f"Error answering question: {str(e)}")
-        return None
+            st.error(f"Error sending report to {email['to']}: {email['error']}")
+
+# Function to get the tenant of this session's background jobs. The user cannot choose it: every browser session is
+# its own tenant, so sessions neither share the concurrency limit nor see each other's jobs and results.
+def session_tenant():
+    if 'job_tenant' not in st.session_state:
+        st.session_state.job_tenant = f"session-{uuid.uuid4().hex}"
+    return st.session_state.job_tenant
+
+# Function to show the jobs view: uploads are analyzed by the worker processes, not by this session, and their
+# results are shown as they land. Each tenant has its own jobs and at most JOB_TENANT_CONCURRENCY of them run at once.
+def show_jobs(queue):
+    st.header("🗂 Background Analyses")
+    tenant = session_tenant()
+    with st.form("submit_jobs", clear_on_submit=True):
+        uploads = st.file_uploader("Upload PDFs to analyze in the background", type=["pdf"],
+                                   accept_multiple_files=True)
+        summarize = st.checkbox("Summarize", value=True)
+        email_address = st.text_input("Email the report to (optional)")
+        submitted = st.form_submit_button("Queue")
+    if submitted and uploads:
+        for upload in uploads:
+            queue.submit(tenant, upload.name, upload.getvalue(), summarize=summarize,
+                         email=email_address or None, updates=st.session_state.get('updates') or [])
+        st.success(f"{len(uploads)} documents queued.")
+
+    jobs = queue.jobs(tenant)
+    if not jobs:
+        st.write("No jobs yet.")
+        return
+    stats = queue.stats()
+    st.caption(f"All tenants: {stats['queued']} queued, {stats['running']} running")
+    st.dataframe([{"job": job["id"], "document": job["name"], "status": job["status"], "attempts": job["attempts"],
+                   "seconds": round((job["finished_at"] or time.time()) - job["created_at"], 1)}
+                  for job in jobs], use_container_width=True)
+    names = {job["id"]: f"{job['id']}: {job['name']}" for job in jobs}
+    chosen = st.selectbox("Results of", list(names), format_func=names.get)
+    status = queue.status(chosen, tenant=tenant)
+    if status["status"] == JOB_QUEUED:
+        st.info(f"Queued, {status['queued_ahead']} of your jobs ahead of it.")
+    elif status["status"] == JOB_FAILED:
+        st.error(f"Failed after {status['attempts']} attempts: {status['error']}")
+    show_job_results(status)
+
+    # Poll while any job is unfinished; the script reruns to pick up what the workers have published since
+    if any(job["status"] not in (JOB_DONE, JOB_FAILED) for job in jobs) and st.checkbox("Auto-refresh", value=True):
+        time.sleep(JOB_REFRESH_SECONDS)
+        st.experimental_rerun()
 
 # Streamlit app configuration
 st.set_page_config(page_title="Legal Document Summary Generator", page_icon="⚖", layout="wide")
 
+view = st.sidebar.radio("View", ["Analyze a document", "Summarize a contract bundle", "Background analyses",
+                                 "Search analyzed documents"])
+# The corpus search needs neither an upload nor the model
+if view == "Search analyzed documents":
+    show_corpus_search(get_analysis_store())
+    st.stop()
+if view == "Summarize a contract bundle":
+    show_bundle_summary()
+    st.stop()
+if view == "Background analyses":
+    show_jobs(get_job_queue())
+    st.stop()
+
 # Upload section
 st.header("📤 Upload Your Legal Document")
 uploaded_pdf = st.file_uploader("Upload a PDF", type=["pdf"])
 
+# LLM cache statistics and manual invalidation
+with st.sidebar:
+    cache_stats = llm_cache.stats()
+    st.caption(
+        f"LLM cache: {cache_stats['entries']} entries, "
+        f"{cache_stats['hits']} hits / {cache_stats['misses']} misses"
+    )
+    if st.button("Clear LLM cache"):
+        llm_cache.invalidate()
+
 # Initialize session state for updates
 if 'updates' not in st.session_state:
     st.session_state.updates = []
 
+# Sections of the analysis; only the selected one is computed and rendered on each rerun
+SECTIONS = ["Extracted Text", "Summary", "Key Clauses", "Hidden Obligations",
+            "Risk Analysis", "Regulatory Updates", "Chatbot"]
+
+set_trace(None)
 if uploaded_pdf:
     try:
-        extracted_text = extract_text_from_pdf(uploaded_pdf)
-        text_chunks = split_text_into_chunks(extracted_text)
-
-        tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(
-            ["Extracted Text", "Summary", "Key Clauses", "Hidden Obligations",
-             "Risk Analysis", "Regulatory Updates", "Chatbot"]
-        )
-
-        with tab1:
+        # Per-document analysis state, reused across reruns until a different file is uploaded
+        pdf_bytes = uploaded_pdf.getvalue()
+        analysis = st.session_state.get('analysis')
+        if analysis is None or analysis.document_id != hash_upload(pdf_bytes):
+            analysis = DocumentAnalysis(uploaded_pdf.name, pdf_bytes, cache=llm_cache,
+                                        model_getter=get_shared_model, fingerprints=get_fingerprint_store())
+            st.session_state.analysis = analysis
+        # Everything timed during this rerun (LLM calls, report build, ...) lands in the document's trace
+        set_trace(analysis.trace)
+
+        section = st.radio("Section", SECTIONS, horizontal=True, label_visibility="collapsed")
+
+        if section == "Extracted Text":
             st.subheader("📄 Extracted Text")
-            st.text_area("Extracted Text:", extracted_text, height=300)
+            # One page at a time, so a large document does not send megabytes of text to the browser
+            page_count = analysis.page_count
+            if page_count:
+                page_number = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+                st.caption(f"Page {page_number} of {page_count}")
+                st.text_area("Extracted Text:", analysis.page_text(int(page_number)), height=300)
+            else:
+                st.write("The document has no pages.")
 
-        # In Tab 2 for Summary
-        with tab2:
+        # Summary section
+        elif section == "Summary":
             st.subheader("📋 Summary")
-            summaries = []
-            with st.spinner("Generating summary..."):
-                for chunk in text_chunks:
-                    summary = generate_summary(chunk)
-                    if summary:
-                        summaries.append(summary)
-
-            final_summary = " ".join(summaries)
+            # A new version of an earlier upload only sends its changed chunks to the model
+            version_diff = analysis.version_diff
+            if version_diff:
+                st.info(
+                    f"{version_diff['similarity']:.0%} similar to **{version_diff['name']}**: "
+                    f"{version_diff['unchanged']} of {version_diff['chunks']} chunks unchanged, "
+                    f"their summaries are reused."
+                )
+            if "summary" in analysis.computed():
+                final_summary, summaries, summary_errors = analysis.summary_result
+            else:
+                # Show each section summary as it completes and the final summary as it is written
+                progress = st.empty()
+                progress.write("Generating summary...")
+                # A streamed document is chunked while it is summarized, so the number of sections is not known
+                # up front (and there may be thousands); only the progress is shown for it
+                section_slots = None
+                if not analysis.streaming:
+                    with st.expander("Section summaries", expanded=True):
+                        section_slots = [st.empty() for _ in analysis.chunks]
+                final_slot = st.empty()
+                finished = []
+                streamed = []
+
+                def show_section_summary(index, result):
+                    finished.append(index)
+                    if section_slots is None:
+                        progress.write(f"Summarized {len(finished)} sections...")
+                        return
+                    progress.write(f"Summarized {len(finished)} of {len(section_slots)} sections...")
+                    if isinstance(result, str):
+                        section_slots[index].markdown(f"**Section {index + 1}:** {result}")
+
+                def show_summary_token(piece):
+                    streamed.append(piece)
+                    final_slot.markdown("".join(streamed) + "▌")
+
+                final_summary, summaries, summary_errors = analysis.summarize(show_section_summary,
+                                                                              show_summary_token)
+                progress.empty()
+                final_slot.empty()
+
+            for error in summary_errors:
+                st.error(f"Error generating summary: {str(error)}")
             st.text_area("Generated Summary:", final_summary, height=300)
 
             # Save the summary to a PDF and get the bytes-like object
@@ -459,9 +391,9 @@ if uploaded_pdf:
                 mime="application/pdf"
             )
 
-        with tab3:
+        elif section == "Key Clauses":
             st.subheader("🔍 Detected Key Clauses")
-            detected_clauses = detect_key_clauses(extracted_text)
+            detected_clauses = analysis.key_clauses
 
             st.write(f"**Document Name:** {uploaded_pdf.name}")
 
@@ -472,15 +404,14 @@ if uploaded_pdf:
                     context = generate_clause_context(clause_name)
                     st.write(f"**Context:** {context}")
 
-                clause_chart_buf = plot_detected_key_clauses_chart(detected_clauses)
-                st.image(clause_chart_buf.getvalue(), caption="Detected Key Clauses Chart")
+                show_chart(analysis.chart_view("clause"), "Detected Key Clauses Chart")
 
             else:
                 st.write("No key clauses detected in the document.")
 
-        with tab4:
+        elif section == "Hidden Obligations":
             st.subheader("🔍 Hidden Obligations and Dependencies")
-            detected_obligations = detect_hidden_obligations(extracted_text)
+            detected_obligations = analysis.obligations
 
             st.write(f"**Document Name:** {uploaded_pdf.name}")
 
@@ -491,16 +422,16 @@ if uploaded_pdf:
                     context = generate_obligation_context(obligation_name)
                     st.write(f"**Context:** {context}")
 
-                obligation_chart_buf = plot_detected_hidden_obligations_chart(detected_obligations)
-                st.image(obligation_chart_buf.getvalue(), caption="Detected Hidden Obligations Chart")
+                show_chart(analysis.chart_view("obligation"), "Detected Hidden Obligations Chart")
 
             else:
                 st.write("No hidden obligations detected in the document.")
 
-        with tab5:
+        elif section == "Risk Analysis":
             st.subheader("Risk Analysis")
-            detected_risks = detect_risks(extracted_text, final_summary)
-            overall_risk_score = calculate_overall_risk_score(detected_risks)
+            with st.spinner("Analyzing risks..."):
+                detected_risks = analysis.risks
+            overall_risk_score = analysis.overall_risk_score
 
             st.write(f"*Overall Risk Score:* {overall_risk_score}")
 
@@ -513,73 +444,111 @@ if uploaded_pdf:
             else:
                 st.write("No risks detected.")
 
-            # Generate images for the risk analysis charts
-            risk_level_chart_buf = plot_risk_level_bar_chart(detected_risks)
-            st.image(risk_level_chart_buf.getvalue(), caption="Detected Risks by Level Chart")
+            # Risk analysis chart
+            show_chart(analysis.chart_view("risk"), "Detected Risks by Level Chart")
 
-        # GDPR Updates Tab
-        with tab6:
-            updates = fetch_latest_gdpr_updates()  # Fetch updates immediately
-            print(updates)
-            
-
-            # Fetch and display GDPR recitals
+        # GDPR Updates section
+        elif section == "Regulatory Updates":
+            # Fetch and display GDPR recitals (scraped at most once per interval, see regulatory_sources.py)
             st.subheader("Regulatory Updates")
-            recitals = fetch_gdpr_recitals()
             if st.button("Fetch Live Updates"):
+                regulatory_sources = get_regulatory_sources()
                 with st.spinner("Fetching updates..."):
-                    
-                    if recitals:
-                        for number, details in recitals.items():
-                            st.markdown(f"**Recital {number}: {details['title']}**")
-                            st.write(details['content'])
-                            st.write(f"**Release Date:** {details['release_date']}")
-                    else:
-                        st.write("No recitals found.")
-                        
-            if recitals:
-                st.session_state.updates = recitals  # Store updates in session state
-                store_updates_in_google_sheet(recitals)  # Store updates in Google Sheets
-                st.success("Updates stored successfully.")
-            else:
-                st.write("No updates found to store.")
-        
-            # Update session state with fetched updates
-            st.session_state.updates = recitals
-            
-            # Store updates into Google Sheets
-            store_updates_in_google_sheet(recitals)
+                    try:
+                        recitals = regulatory_sources.recitals()
+                    except RegulatoryFetchError:
+                        st.error("Failed to fetch data from the GDPR website.")
+                        recitals = {}
+                    try:
+                        st.session_state.gdpr_news = regulatory_sources.latest_updates()
+                    except RegulatoryFetchError:
+                        st.session_state.gdpr_news = []
+
+                if recitals:
+                    st.session_state.updates = recitals  # Store updates in session state
+                    get_update_sink().submit(recitals)  # Store updates in Google Sheets (in the background)
+                    st.success("Updates queued for storage.")
+                else:
+                    st.write("No recitals found.")
+
+            if st.session_state.updates:
+                for number, details in st.session_state.updates.items():
+                    st.markdown(f"**Recital {number}: {details['title']}**")
+                    st.write(details['content'])
+                    st.write(f"**Release Date:** {details['release_date']}")
+            for news in st.session_state.get('gdpr_news', []):
+                st.markdown(f"- [{news['update']}]({news['link']})")
 
             # Send Report Section
+            from mail_delivery import FAILED, SENT, build_report_message
+
             st.subheader("📧 Send Report via Email")
             email_address = st.text_input("Enter your email address:")
             
             if st.button("Send Report"):
                 report_pdf = generate_complete_report(
-                    final_summary, 
-                    detected_clauses, 
-                    detected_obligations, 
-                    {},  # Pass an empty dict for risks
-                    st.session_state.updates  # Pass the stored updates
+                    analysis.summary, 
+                    analysis.key_clauses, 
+                    analysis.obligations, 
+                    analysis.risks,
+                    st.session_state.updates,  # Pass the stored updates
+                    charts=[analysis.clause_chart, analysis.obligation_chart, analysis.risk_chart],  # Reuse rendered charts
                 )
-                success, error = send_email(report_pdf, email_address)
-                
-                if success:
-                    st.success("Report sent successfully!")
+                mail_queue = get_mail_queue()
+                msg = build_report_message(report_pdf, email_address, os.environ.get("SENDER_EMAIL"))
+                st.session_state.setdefault('email_jobs', []).append(mail_queue.submit(msg))
+                st.info("Report queued for delivery.")
+
+            # Delivery status of the reports sent from this session
+            for job_id in st.session_state.get('email_jobs', []):
+                status = get_mail_queue().status(job_id)
+                if status is None:
+                    continue
+                if status['status'] == SENT:
+                    st.success(f"Report sent successfully to {status['to']}!")
+                elif status['status'] == FAILED:
+                    st.error(f"Error sending report to {status['to']}: {status['error']}")
                 else:
-                    st.error(f"Error sending report: {error}")
+                    st.write(f"Sending report to {status['to']}... (attempt {status['attempts']})")
+            if st.session_state.get('email_jobs'):
+                st.button("Refresh delivery status")
 
-        # Chatbot Tab
-        with tab7:
+        # Chatbot section
+        elif section == "Chatbot":
             st.subheader("🤖 Chatbot")
             question = st.text_input("Ask a question about the document:")
             if question:
                 with st.spinner("Getting answer..."):
-                    answer = answer_question(question, extracted_text)
-                    if answer:
-                        st.write(f"**Answer:** {answer}")
-                    else:
-                        st.write("Sorry, I couldn't find an answer to that question.")
+                    excerpts = analysis.index.retrieve(question)
+                # The answer is shown token by token as the model writes it
+                answer_slot = st.empty()
+                streamed = []
+
+                def show_answer_token(piece):
+                    streamed.append(piece)
+                    answer_slot.markdown(f"**Answer:** {''.join(streamed)}▌")
+
+                answer = answer_question(question, "\n\n".join(excerpts), cache=llm_cache,
+                                         on_token=show_answer_token)
+                if answer:
+                    answer_slot.markdown(f"**Answer:** {answer}")
+                else:
+                    answer_slot.write("Sorry, I couldn't find an answer to that question.")
+
+        # Make this document's detections searchable across the corpus (after the section has been shown)
+        analysis.persist(get_analysis_store())
 
     except RuntimeError as e:
         st.error(f"❌ {e}")
+
+    # Debug panel: per-stage timings of this document and the process-wide metrics
+    with st.sidebar.expander("Debug: timings", expanded=False):
+        trace = st.session_state.analysis.trace if 'analysis' in st.session_state else None
+        if trace is not None:
+            st.table([{"stage": stage, "calls": totals["count"], "seconds": totals["seconds"]}
+                      for stage, totals in trace.totals().items()])
+            st.write("Spans:")
+            st.dataframe(trace.spans)
+            if trace.dropped_spans:
+                st.caption(f"{trace.dropped_spans} later spans not kept (totals include them)")
+        st.code(metrics.render(), language="text")
@@ -0,0 +1,386 @@
+import asyncio
+import contextvars
+import os
+import queue
+import random
+import threading
+
+from chunking import estimate_tokens
+from instrumentation import metrics, timed
+from llm_cache import cacheable_answer, model_name_of, track_answers
+
+# Prompt used for every chunk (map step)
+SUMMARY_PROMPT = "Please summarize the following content:\n\n{text}"
+
+# Prompt used to merge partial summaries (reduce step)
+MERGE_PROMPT = (
+    "The following are summaries of consecutive sections of the same legal document. "
+    "Combine them into a single coherent summary, keeping every party, obligation, "
+    "date and amount that is mentioned:\n\n{text}"
+)
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 30.0
+
+# Prompt used to combine the summaries of the documents of a contract bundle (root of the bundle's summary tree)
+BUNDLE_PROMPT = (
+    "The following are summaries of the documents of one contract bundle: a master agreement and the "
+    "schedules and amendments that belong to it, in order. Combine them into a single summary of the "
+    "agreement as it now stands, keeping every party, obligation, date and amount, and saying which "
+    "document each term comes from. Where a later document changes an earlier one, give the changed term:"
+    "\n\n{text}"
+)
+
+# Cache entry (not a prompt) holding the final summary of a whole document, a node of a bundle's summary tree.
+# It is keyed by the PDF itself, so a document summarized before is not even extracted or chunked again.
+DOCUMENT_SUMMARY_NODE = "document summary"
+
+# Maximum number of words of partial summaries sent in one merge request
+DEFAULT_MERGE_WORD_BUDGET = 1500
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+
+# Function to read the text out of a model response
+def response_text(response):
+    if hasattr(response, 'content'):
+        return response.content
+    return str(response)
+
+
+# Function to check whether an exception is a rate-limit (HTTP 429) error
+def is_rate_limit_error(exc):
+    status = getattr(exc, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    if status == 429:
+        return True
+    message = str(exc).lower()
+    return "429" in message or "rate limit" in message or "rate_limit" in message
+
+
+# Function to read a Retry-After hint (in seconds) from a rate-limit error
+def retry_after_seconds(exc):
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    value = headers.get('retry-after') if hasattr(headers, 'get') else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# Function to compute the backoff delay for a given attempt (exponential with jitter)
+def backoff_delay(attempt, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+    delay = min(max_delay, base_delay * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+# Function to read the token usage reported with a response, if any: (prompt tokens, completion tokens)
+def reported_usage(response):
+    usage = getattr(response, 'usage_metadata', None)
+    if isinstance(usage, dict) and usage.get('output_tokens') is not None:
+        return usage.get('input_tokens'), usage.get('output_tokens')
+    metadata = getattr(response, 'response_metadata', None)
+    token_usage = metadata.get('token_usage') if isinstance(metadata, dict) else None
+    if isinstance(token_usage, dict):
+        return token_usage.get('prompt_tokens'), token_usage.get('completion_tokens')
+    return None, None
+
+
+# Function to put the token counts of an LLM call on its span and in the token counters
+# (as reported by the provider, estimated when the response does not say)
+def record_llm_tokens(span, prompt, completion, response=None):
+    prompt_tokens, completion_tokens = reported_usage(response)
+    span["prompt_tokens"] = prompt_tokens if prompt_tokens is not None else estimate_tokens(prompt)
+    span["completion_tokens"] = completion_tokens if completion_tokens is not None else estimate_tokens(completion)
+    metrics.inc("llm_prompt_tokens_total", span["prompt_tokens"], "Prompt tokens sent to the model",
+                model=span["model"])
+    metrics.inc("llm_completion_tokens_total", span["completion_tokens"], "Completion tokens received",
+                model=span["model"])
+
+
+# Function to stream a completion synchronously, passing each piece of text to on_token; returns the full text
+def stream_invoke(model, prompt, on_token):
+    pieces = []
+    for chunk in model.stream(prompt):
+        text = response_text(chunk)
+        if text:
+            pieces.append(text)
+            on_token(text)
+    return "".join(pieces)
+
+
+# Function to stream a completion asynchronously, passing each piece of text to on_token; returns the full text
+async def astream_invoke(model, prompt, on_token):
+    pieces = []
+    async for chunk in model.astream(prompt):
+        text = response_text(chunk)
+        if text:
+            pieces.append(text)
+            on_token(text)
+    return "".join(pieces)
+
+
+# Function to invoke the model from synchronous code (streamed to on_token, if given); returns the text
+def invoke_model(model, prompt, on_token=None):
+    with timed("llm_call", model=model_name_of(model), stream=on_token is not None) as span:
+        if on_token is not None:
+            response = None
+            text = stream_invoke(model, prompt, on_token)
+        else:
+            response = model.invoke(prompt)
+            text = response_text(response)
+        record_llm_tokens(span, prompt, text, response)
+    return text
+
+
+# Function to invoke the model asynchronously, backing off on rate limits.
+# With on_token the completion is streamed; it is only retried if no token has been shown yet.
+async def invoke_with_backoff(model, prompt, semaphore, max_retries=DEFAULT_MAX_RETRIES,
+                              base_delay=DEFAULT_BASE_DELAY, on_token=None):
+    # A model behind the gateway already retries (and falls back); don't multiply its attempts
+    if getattr(model, 'handles_retries', False):
+        max_retries = 0
+    attempt = 0
+    while True:
+        streamed = []
+        async with semaphore:
+            try:
+                with timed("llm_call", model=model_name_of(model), stream=on_token is not None,
+                           attempt=attempt + 1) as span:
+                    if on_token is not None:
+                        def forward(text):
+                            streamed.append(text)
+                            on_token(text)
+                        response = None
+                        text = await astream_invoke(model, prompt, forward)
+                    else:
+                        response = await model.ainvoke(prompt)
+                        text = response_text(response)
+                    record_llm_tokens(span, prompt, text, response)
+                return text.strip()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= max_retries or streamed:
+                    raise
+                metrics.inc("llm_retries_total", 1, "LLM calls retried after a rate limit", model=model_name_of(model))
+                delay = retry_after_seconds(e) or backoff_delay(attempt, base_delay)
+        # Sleep outside the semaphore so other chunks can use the slot
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+# Function to fill a prompt template, answering from the cache when possible
+async def cached_invoke(model, prompt_template, text, semaphore, cache=None,
+                        max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY, on_token=None):
+    model_name = model_name_of(model)
+    if cache is not None:
+        cached = cache.get(model_name, prompt_template, text)
+        if cached is not None:
+            if on_token is not None:
+                on_token(cached)
+            return cached
+    with track_answers() as answers:
+        result = await invoke_with_backoff(model, prompt_template.format(text=text), semaphore,
+                                           max_retries, base_delay, on_token)
+    if cache is not None and result and cacheable_answer(answers, model_name):
+        cache.set(result, model_name, prompt_template, text)
+    return result
+
+
+# Function to summarize all chunks concurrently (map step)
+# on_chunk_summary(index, summary_or_exception) is called as each chunk finishes;
+# on_token streams the summary of a single-chunk document.
+# chunks may also be an iterator producing them lazily (see iter_text_chunks); then at most max_concurrency
+# chunks are held at a time.
+async def summarize_chunks_async(model, chunks, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                                 max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY,
+                                 cache=None, on_chunk_summary=None, on_token=None):
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    sized = isinstance(chunks, (list, tuple))
+    stream = on_token if sized and len(chunks) == 1 else None
+
+    async def summarize_one(index, chunk):
+        try:
+            result = await cached_invoke(model, SUMMARY_PROMPT, chunk, semaphore, cache, max_retries, base_delay,
+                                         stream)
+        except Exception as e:
+            result = e
+        if on_chunk_summary is not None:
+            on_chunk_summary(index, result)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    if sized:
+        results = await asyncio.gather(*(summarize_one(i, chunk) for i, chunk in enumerate(chunks)),
+                                       return_exceptions=True)
+        # Failed chunks are reported as exceptions so the caller can decide what to show
+        return list(results)
+
+    # The next chunk is only produced once a slot is free; producing it (page extraction, chunking) runs in a
+    # worker thread so the calls in flight keep going meanwhile
+    iterator = iter(chunks)
+    exhausted = object()
+    tasks = []
+    pending = set()
+    while True:
+        chunk = await asyncio.to_thread(next, iterator, exhausted)
+        if chunk is exhausted:
+            break
+        task = asyncio.ensure_future(summarize_one(len(tasks), chunk))
+        tasks.append(task)
+        pending.add(task)
+        if len(pending) >= max(1, max_concurrency):
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    if pending:
+        await asyncio.wait(pending)
+    return [task.exception() or task.result() for task in tasks]
+
+
+# Function to group partial summaries so each merge request stays within the word budget
+def group_for_merge(summaries, word_budget=DEFAULT_MERGE_WORD_BUDGET):
+    groups = []
+    current = []
+    current_words = 0
+    for summary in summaries:
+        words = len(summary.split())
+        if current and current_words + words > word_budget:
+            groups.append(current)
+            current = []
+            current_words = 0
+        current.append(summary)
+        current_words += words
+    if current:
+        groups.append(current)
+    return groups
+
+
+# Function to merge partial summaries into one (reduce step), recursing until one remains.
+# on_token streams the last (root) merge.
+async def merge_summaries_async(model, summaries, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                                word_budget=DEFAULT_MERGE_WORD_BUDGET,
+                                max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY,
+                                cache=None, on_token=None, prompt=MERGE_PROMPT):
+    summaries = [s for s in summaries if s]
+    if not summaries:
+        return ""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    while len(summaries) > 1:
+        groups = group_for_merge(summaries, word_budget)
+        if len(groups) == len(summaries) and len(groups) > 1:
+            # Every summary is over budget on its own; pair them up so the loop still converges
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+
+        stream = on_token if len(groups) == 1 else None
+
+        async def merge_one(group):
+            if len(group) == 1:
+                return group[0]
+            return await cached_invoke(model, prompt, "\n\n".join(group), semaphore, cache,
+                                       max_retries, base_delay, stream)
+
+        summaries = list(await asyncio.gather(*(merge_one(group) for group in groups)))
+
+    return summaries[0]
+
+
+# Function to summarize a whole document: concurrent map over chunks followed by a merge
+async def summarize_document_async(model, chunks, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                                   word_budget=DEFAULT_MERGE_WORD_BUDGET,
+                                   max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY,
+                                   cache=None, on_chunk_summary=None, on_token=None):
+    results = await summarize_chunks_async(model, chunks, max_concurrency, max_retries, base_delay, cache,
+                                           on_chunk_summary, on_token)
+    chunk_summaries = [r for r in results if isinstance(r, str) and r]
+    errors = [r for r in results if isinstance(r, Exception)]
+    final_summary = await merge_summaries_async(model, chunk_summaries, max_concurrency,
+                                                word_budget, max_retries, base_delay, cache,
+                                                on_token if len(results) > 1 else None)
+    return final_summary, chunk_summaries, errors
+
+
+# Function to get the event loop every summarization of the process runs on. Async model clients keep pooled
+# connections tied to the loop that opened them, so a new loop per call (asyncio.run) would find them dead.
+def engine_loop():
+    global _loop, _loop_pid
+    if _loop is None or _loop_pid != os.getpid():
+        with _loop_lock:
+            if _loop is None or _loop_pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="summary-engine", daemon=True).start()
+                _loop, _loop_pid = loop, os.getpid()
+    return _loop
+
+
+# Function to run a coroutine on the engine loop from synchronous code and return its result. It runs in the
+# caller's context (so the current trace applies), and the callbacks it is given are called back on the calling
+# thread, where the Streamlit script can update the page. A callback that raises cancels the coroutine.
+def run_on_engine_loop(make_coroutine, *callbacks):
+    calls = queue.Queue()
+    finished = object()
+
+    def forward(callback):
+        if callback is None:
+            return None
+        return lambda *args: calls.put((callback, args))
+
+    coroutine = make_coroutine(*(forward(callback) for callback in callbacks))
+    loop = engine_loop()
+    context = contextvars.copy_context()
+    started = queue.Queue()
+
+    def start():
+        task = context.run(loop.create_task, coroutine)
+        task.add_done_callback(lambda _: calls.put(finished))
+        started.put(task)
+
+    loop.call_soon_threadsafe(start)
+    task = started.get()
+    try:
+        while True:
+            item = calls.get()
+            if item is finished:
+                return task.result()
+            callback, args = item
+            callback(*args)
+    except BaseException:
+        # A failed callback, or the caller being interrupted, stops the summarization instead of leaving it running
+        loop.call_soon_threadsafe(task.cancel)
+        raise
+
+
+# Function to run the document summarization from synchronous code (e.g. the Streamlit script)
+def summarize_document(model, chunks, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                       word_budget=DEFAULT_MERGE_WORD_BUDGET,
+                       max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY,
+                       cache=None, on_chunk_summary=None, on_token=None):
+    return run_on_engine_loop(
+        lambda on_chunk_summary, on_token: summarize_document_async(model, chunks, max_concurrency, word_budget,
+                                                                    max_retries, base_delay, cache,
+                                                                    on_chunk_summary, on_token),
+        on_chunk_summary, on_token)
+
+
+# Function to merge the summaries of the documents of a bundle, given as (name, summary) pairs in bundle order,
+# into the bundle summary. The merges are cached like any other, and an unchanged prefix of the bundle groups
+# the same way, so adding a document at the end only redoes the merges on its path to the root.
+def summarize_bundle(model, document_summaries, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                     word_budget=DEFAULT_MERGE_WORD_BUDGET,
+                     max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY,
+                     cache=None, on_token=None):
+    named = [(name, summary) for name, summary in document_summaries if summary]
+    if len(named) == 1:
+        # A single document is its own bundle summary
+        if on_token is not None:
+            on_token(named[0][1])
+        return named[0][1]
+    sections = [f"Document {i + 1}, {name}:\n{summary}" for i, (name, summary) in enumerate(named)]
+    return run_on_engine_loop(
+        lambda on_token: merge_summaries_async(model, sections, max_concurrency, word_budget, max_retries,
+                                               base_delay, cache, on_token, prompt=BUNDLE_PROMPT),
+        on_token)
@@ -0,0 +1,48 @@
+from fingerprint import FingerprintStore
+
+CONTRACT = " ".join(f"The supplier shall deliver item {i} within {i % 30 + 1} days of the order." for i in range(200))
+REVISION = CONTRACT.replace("item 150 ", "item 150 and its spare parts ")
+OTHER = " ".join(f"The tenant shall pay rent {i} on the first day of each month." for i in range(200))
+
+
+def test_text_of_the_latest_uploads_is_kept(tmp_path):
+    store = FingerprintStore(str(tmp_path / "fingerprints.sqlite3"), max_documents=10, max_texts=1)
+    signature = store.record_document("v1", "contract.pdf", CONTRACT)
+    assert store.lookup("v1") == (CONTRACT, signature)
+
+    revised_signature = store.record_document("v2", "revised.pdf", REVISION)
+    # The older text is dropped, but its fingerprint still finds it as the earlier version
+    assert store.lookup("v1") is None
+    assert store.lookup("v2") == (REVISION, revised_signature)
+    assert store.nearest("v2", revised_signature)[:2] == ("v1", "contract.pdf")
+    assert store.stats() == {"documents": 2, "characters": len(CONTRACT) + len(REVISION), "texts": 1}
+
+    # Uploaded again, it is the latest one and its text is kept again
+    store.record_document("v1", "contract.pdf", CONTRACT)
+    assert store.lookup("v1") == (CONTRACT, signature)
+    assert store.lookup("v2") is None
+    store.close()
+
+
+def test_no_text_is_stored_with_a_limit_of_zero(tmp_path):
+    store = FingerprintStore(str(tmp_path / "fingerprints.sqlite3"), max_texts=0)
+    store.record_document("v1", "contract.pdf", CONTRACT)
+    signature = store.record_document("v2", "revised.pdf", REVISION)
+    assert store.lookup("v1") is None
+    assert store.nearest("v2", signature)[0] == "v1"
+    assert store.stats()["texts"] == 0
+    store.close()
+
+
+def test_lower_limits_apply_to_what_is_already_stored(tmp_path):
+    path = str(tmp_path / "fingerprints.sqlite3")
+    store = FingerprintStore(path, max_documents=10, max_texts=10)
+    for upload_sha, text in (("v1", CONTRACT), ("v2", REVISION), ("other", OTHER)):
+        store.record_document(upload_sha, upload_sha + ".pdf", text)
+    store.close()
+
+    store = FingerprintStore(path, max_documents=2, max_texts=0)
+    assert store.stats()["documents"] == 2
+    assert store.stats()["texts"] == 0
+    assert store.lookup("other") is None
+    store.close()
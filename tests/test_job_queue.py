@@ -0,0 +1,152 @@
+import time
+
+import pytest
+
+from job_queue import DONE, FAILED, QUEUED, RUNNING, JobQueue
+
+LEASE_SECONDS = 0.2
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues = []
+
+    def make(**settings):
+        settings.setdefault("lease_seconds", LEASE_SECONDS)
+        queue = JobQueue(str(tmp_path / "jobs.sqlite3"), **settings)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.close()
+
+
+def wait_for_lease_expiry():
+    time.sleep(LEASE_SECONDS * 1.5)
+
+
+def test_tenant_concurrency_limit(make_queue):
+    queue = make_queue(tenant_concurrency=2)
+    jobs = [queue.submit("bulk", f"bulk-{i}.pdf", b"%d" % i) for i in range(4)]
+
+    assert queue.claim("w1")[0] == jobs[0]
+    assert queue.claim("w2")[0] == jobs[1]
+    # The tenant is at its limit, although it still has queued jobs
+    assert queue.claim("w3") is None
+
+    queue.finish(jobs[0], "w1", result={})
+    assert queue.claim("w3")[0] == jobs[2]
+
+
+def test_other_tenant_is_not_blocked_by_the_limit(make_queue):
+    queue = make_queue(tenant_concurrency=1)
+    bulk = [queue.submit("bulk", f"bulk-{i}.pdf", b"%d" % i) for i in range(3)]
+    small = queue.submit("small", "small.pdf", b"small")
+
+    assert queue.claim("w1")[0] == bulk[0]
+    assert queue.claim("w2")[0] == small
+    assert queue.claim("w3") is None
+
+
+def test_tenant_with_fewest_running_jobs_goes_first(make_queue):
+    queue = make_queue(tenant_concurrency=0)
+    bulk = [queue.submit("bulk", f"bulk-{i}.pdf", b"%d" % i) for i in range(3)]
+    small = [queue.submit("small", f"small-{i}.pdf", b"s%d" % i) for i in range(2)]
+
+    claimed = [queue.claim(f"w{i}")[0] for i in range(5)]
+    # Oldest first while running counts are equal, then alternating between the tenants
+    assert claimed == [bulk[0], small[0], bulk[1], small[1], bulk[2]]
+
+
+def test_expired_lease_is_requeued_and_claimed_again(make_queue):
+    queue = make_queue(max_attempts=3)
+    job_id = queue.submit("t", "a.pdf", b"a")
+    queue.claim("w1")
+    assert queue.publish(job_id, "w1", "detections", {"pages": 1})
+
+    wait_for_lease_expiry()
+    claimed = queue.claim("w2")
+    assert claimed[0] == job_id
+    assert claimed[2] == b"a"
+    status = queue.status(job_id)
+    assert status["status"] == RUNNING
+    assert status["attempts"] == 2
+    # The second attempt starts from scratch
+    assert status["partials"] == []
+
+
+def test_job_fails_after_max_attempts(make_queue):
+    queue = make_queue(max_attempts=2)
+    job_id = queue.submit("t", "a.pdf", b"a")
+    for worker in ("w1", "w2"):
+        assert queue.claim(worker)[0] == job_id
+        wait_for_lease_expiry()
+
+    assert queue.claim("w3") is None
+    status = queue.status(job_id)
+    assert status["status"] == FAILED
+    assert status["error"] == "worker stopped responding"
+    assert queue.stats() == {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 1}
+
+
+def test_heartbeat_keeps_the_lease(make_queue):
+    queue = make_queue()
+    job_id = queue.submit("t", "a.pdf", b"a")
+    queue.claim("w1")
+    for _ in range(3):
+        time.sleep(LEASE_SECONDS / 2)
+        assert queue.heartbeat(job_id, "w1")
+    assert queue.claim("w2") is None
+    assert queue.status(job_id)["status"] == RUNNING
+
+
+def test_stale_worker_is_ignored(make_queue):
+    queue = make_queue()
+    job_id = queue.submit("t", "a.pdf", b"a")
+    queue.claim("w1")
+    wait_for_lease_expiry()
+    queue.claim("w2")
+
+    assert not queue.heartbeat(job_id, "w1")
+    assert not queue.publish(job_id, "w1", "summary", {"summary": "stale"})
+    assert queue.finish(job_id, "w1", result={"summary": "stale"}) is None
+    assert queue.status(job_id)["status"] == RUNNING
+
+    assert queue.publish(job_id, "w2", "summary", {"summary": "fresh"})
+    assert queue.finish(job_id, "w2", result={"summary": "fresh"}) == DONE
+    status = queue.status(job_id)
+    assert status["result"] == {"summary": "fresh"}
+    assert [partial["payload"] for partial in status["partials"]] == [{"summary": "fresh"}]
+
+
+def test_failure_is_retried_until_max_attempts(make_queue):
+    queue = make_queue(max_attempts=2)
+    job_id = queue.submit("t", "a.pdf", b"a")
+    queue.claim("w1")
+    assert queue.finish(job_id, "w1", error="boom", retry=True) == QUEUED
+    queue.claim("w1")
+    assert queue.finish(job_id, "w1", error="boom", retry=True) == FAILED
+    assert queue.status(job_id)["error"] == "boom"
+
+
+def test_upload_is_kept_while_a_job_needs_it(make_queue):
+    queue = make_queue()
+    first = queue.submit("t1", "a.pdf", b"same bytes")
+    second = queue.submit("t2", "a-copy.pdf", b"same bytes")
+    queue.claim("w1")
+    queue.finish(first, "w1", result={})
+    # The second job still needs the PDF
+    assert queue.claim("w2")[:3] == (second, "a-copy.pdf", b"same bytes")
+    queue.finish(second, "w2", result={})
+    assert queue._conn.execute("SELECT COUNT(*) FROM uploads").fetchone() == (0,)
+
+
+def test_jobs_of_other_tenants_are_not_visible(make_queue):
+    queue = make_queue()
+    mine = queue.submit("session-a", "mine.pdf", b"mine")
+    theirs = queue.submit("session-b", "theirs.pdf", b"theirs")
+
+    assert [job["id"] for job in queue.jobs("session-a")] == [mine]
+    assert queue.status(mine, tenant="session-a")["name"] == "mine.pdf"
+    assert queue.status(theirs, tenant="session-a") is None
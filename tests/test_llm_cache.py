@@ -0,0 +1,61 @@
+import asyncio
+
+from llm_cache import LLMCache, cacheable_answer, record_answer, track_answers
+from llm_gateway import LLMGateway
+from summary_engine import SUMMARY_PROMPT, summarize_document
+
+
+class Response:
+    def __init__(self, content):
+        self.content = content
+
+
+class DownModel:
+    def __init__(self, name):
+        self.model_name = name
+        self.down = True
+
+    async def ainvoke(self, prompt):
+        if self.down:
+            raise ConnectionError("primary is down")
+        return Response(f"{self.model_name} summary of {prompt[-12:]}")
+
+
+def test_answers_are_collected_across_tasks_and_nested_blocks():
+    async def call(name):
+        with track_answers() as answers:
+            record_answer(name)
+        return answers
+
+    async def run():
+        with track_answers() as answers:
+            inner = await asyncio.gather(call("primary"), call("fallback"))
+        return answers, inner
+
+    answers, inner = asyncio.run(run())
+    assert inner == [["primary"], ["fallback"]]
+    assert sorted(answers) == ["fallback", "primary"]
+    assert not cacheable_answer(answers, "primary")
+    assert cacheable_answer(["primary", "primary"], "primary")
+    # Outside a block nothing is collected
+    record_answer("primary")
+
+
+def test_fallback_answers_are_not_cached_under_the_primary(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm.sqlite3"))
+    primary, fallback = DownModel("primary"), DownModel("fallback")
+    fallback.down = False
+    gateway = LLMGateway([primary, fallback], rate_limit_path="", requests_per_minute=0, max_retries=0)
+    chunks = ["first part of the contract", "second part of the contract"]
+
+    summary, _, errors = summarize_document(gateway, chunks, cache=cache)
+    assert errors == [] and summary.startswith("fallback")
+    assert cache.stats()["entries"] == 0
+
+    # Once the primary is back, its answers replace the fallback's and are cached
+    primary.down = False
+    summary, _, _ = summarize_document(gateway, chunks, cache=cache)
+    assert summary.startswith("primary")
+    assert cache.get("primary", SUMMARY_PROMPT, chunks[0]).startswith("primary")
+    assert cache.stats()["entries"] == 3
+    cache.close()
@@ -0,0 +1,297 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from llm_gateway import LLMGateway, LLMTimeoutError, SharedTokenBucket, TokenBucket
+
+
+class EchoModel:
+    model_name = "echo"
+
+    def invoke(self, prompt):
+        return prompt
+
+
+def reserve_many(path, count, waits):
+    bucket = SharedTokenBucket(path, "echo:requests", per_minute=60, capacity=5)
+    for _ in range(count):
+        waits.put(bucket.reserve())
+
+
+def test_processes_share_one_budget(tmp_path):
+    path = str(tmp_path / "rate_limit.sqlite3")
+    waits = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=reserve_many, args=(path, 5, waits)) for _ in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    reserved = sorted(waits.get() for _ in range(10))
+
+    # A bucket of 5 refilling at 1 per second: the first 5 go at once, the last waits about 5 seconds
+    assert reserved[:5] == [0.0] * 5
+    assert reserved[-1] == pytest.approx(5.0, abs=0.5)
+
+
+def test_buckets_with_the_same_name_share_capacity(tmp_path):
+    path = str(tmp_path / "rate_limit.sqlite3")
+    first = SharedTokenBucket(path, "echo:requests", per_minute=60, capacity=2)
+    second = SharedTokenBucket(path, "echo:requests", per_minute=60, capacity=2)
+    other = SharedTokenBucket(path, "other:requests", per_minute=60, capacity=2)
+
+    assert first.reserve() == 0.0
+    assert second.reserve() == 0.0
+    assert first.reserve() == pytest.approx(1.0, abs=0.1)
+    assert other.reserve() == 0.0
+
+
+def test_no_limit_does_not_open_the_file(tmp_path):
+    path = tmp_path / "rate_limit.sqlite3"
+    assert SharedTokenBucket(str(path), "echo:requests", per_minute=0).reserve(100) == 0.0
+    assert not path.exists()
+
+
+def test_gateway_rate_limit_path(tmp_path):
+    shared = LLMGateway([EchoModel()], rate_limit_path=str(tmp_path / "rate_limit.sqlite3"))
+    assert isinstance(shared.request_bucket, SharedTokenBucket)
+    assert shared.request_bucket.name == "echo:requests"
+    assert shared.invoke("hello") == "hello"
+    assert isinstance(LLMGateway([EchoModel()], rate_limit_path="").request_bucket, TokenBucket)
+
+
+# Model whose first call stalls; records the calls that were cancelled and the streams that were closed
+class StallingModel:
+    model_name = "stalling"
+
+    def __init__(self, stall_seconds=5.0):
+        self.stall_seconds = stall_seconds
+        self.calls = 0
+        self.cancelled = 0
+        self.streams_closed = 0
+        self.pieces_read = 0
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.stall_seconds if self.calls == 1 else 0.01)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"answer {self.calls}"
+
+    async def astream(self, prompt):
+        try:
+            for i in range(100):
+                await asyncio.sleep(0)
+                yield f"piece {i}"
+        finally:
+            self.streams_closed += 1
+
+    def stream(self, prompt):
+        try:
+            for i in range(100):
+                self.pieces_read += 1
+                time.sleep(0.01)
+                yield f"piece {i}"
+        finally:
+            self.streams_closed += 1
+
+
+def gateway(model, **settings):
+    return LLMGateway([model], rate_limit_path="", requests_per_minute=0, max_retries=0, **settings)
+
+
+def test_losing_hedge_is_cancelled():
+    model = StallingModel()
+
+    async def run():
+        answer = await gateway(model, hedge_after=0.05, timeout=2).ainvoke("prompt")
+        await asyncio.sleep(0)
+        return answer
+
+    assert asyncio.run(run()) == "answer 2"
+    assert model.cancelled == 1
+
+
+def test_model_stream_is_closed_when_the_caller_stops_reading():
+    model = StallingModel()
+
+    async def run():
+        stream = gateway(model).astream("prompt")
+        pieces = [await stream.__anext__() for _ in range(3)]
+        await stream.aclose()
+        # Checked before asyncio.run finalizes leftover generators itself
+        return pieces, model.streams_closed
+
+    assert asyncio.run(run()) == (["piece 0", "piece 1", "piece 2"], 1)
+
+
+def test_sync_stream_stops_reading_when_the_caller_stops():
+    model = StallingModel()
+    stream = gateway(model).stream("prompt")
+    assert [next(stream) for _ in range(2)] == ["piece 0", "piece 1"]
+    stream.close()
+    time.sleep(0.1)
+    assert model.streams_closed == 1
+    assert model.pieces_read < 10
+
+
+def test_sync_call_threads_follow_the_concurrency():
+    assert gateway(EchoModel(), max_concurrency=3)._executor._max_workers == 6
+    assert gateway(EchoModel(), max_concurrency=3, hedge_after=1.0)._executor._max_workers == 12
+
+
+def test_cancelled_caller_cancels_the_hedged_request():
+    model = StallingModel()
+
+    async def run():
+        call = asyncio.ensure_future(gateway(model, hedge_after=1.0, timeout=2).ainvoke("prompt"))
+        await asyncio.sleep(0.05)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0)
+        return model.cancelled
+
+    # Cancelled while still waiting to decide on a hedge: the first request must not be left running
+    assert asyncio.run(run()) == 1
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": {"retry-after": retry_after} if retry_after else {}})()
+
+
+# Model that answers with a script: an exception is raised, a number stalls that many seconds, text is returned.
+# The last entry repeats once the script runs out.
+class ScriptedModel:
+    def __init__(self, name, *script):
+        self.model_name = name
+        self.script = list(script)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        return self.script[min(self.calls, len(self.script)) - 1]
+
+    def invoke(self, prompt):
+        outcome = self._next()
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, float):
+            threading.Event().wait(outcome)
+            return "late"
+        return outcome
+
+    async def ainvoke(self, prompt):
+        outcome = self._next()
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, float):
+            await real_asyncio_sleep(outcome)
+            return "late"
+        return outcome
+
+
+real_asyncio_sleep = asyncio.sleep
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+
+    def sleep(seconds):
+        if seconds:
+            slept.append(seconds)
+
+    async def asleep(seconds):
+        if seconds:
+            slept.append(seconds)
+        await real_asyncio_sleep(0)
+
+    monkeypatch.setattr("llm_gateway.time.sleep", sleep)
+    monkeypatch.setattr("llm_gateway.asyncio.sleep", asleep)
+    return slept
+
+
+def retrying_gateway(*models, **settings):
+    settings = dict(dict(max_retries=3, base_delay=1.0, timeout=5), **settings)
+    return LLMGateway(list(models), rate_limit_path="", requests_per_minute=0, **settings)
+
+
+def test_rate_limits_and_server_errors_are_retried_with_backoff(sleeps):
+    model = ScriptedModel("primary", ProviderError(429), ProviderError(503), "answer")
+    assert retrying_gateway(model).invoke("prompt") == "answer"
+    assert model.calls == 3
+    # Exponential backoff with jitter: half to all of base_delay * 2 ** attempt
+    assert len(sleeps) == 2
+    assert 0.5 <= sleeps[0] <= 1.0
+    assert 1.0 <= sleeps[1] <= 2.0
+
+
+def test_async_calls_are_retried_with_backoff(sleeps):
+    model = ScriptedModel("primary", ProviderError(503), ProviderError(502), ProviderError(429), "answer")
+    assert asyncio.run(retrying_gateway(model).ainvoke("prompt")) == "answer"
+    assert model.calls == 4
+    assert [low <= delay <= 2 * low for low, delay in zip((0.5, 1.0, 2.0), sleeps)] == [True] * 3
+
+
+def test_retry_after_hint_is_used(sleeps):
+    model = ScriptedModel("primary", ProviderError(429, retry_after="7"), "answer")
+    assert retrying_gateway(model).invoke("prompt") == "answer"
+    assert sleeps == [7.0]
+
+
+def test_gives_up_after_max_retries(sleeps):
+    model = ScriptedModel("primary", ProviderError(503))
+    with pytest.raises(ProviderError):
+        retrying_gateway(model, max_retries=2).invoke("prompt")
+    assert model.calls == 3
+    assert len(sleeps) == 2
+
+
+def test_client_errors_are_not_retried(sleeps):
+    model = ScriptedModel("primary", ProviderError(400), "answer")
+    with pytest.raises(ProviderError):
+        retrying_gateway(model).invoke("prompt")
+    assert model.calls == 1
+    assert sleeps == []
+
+
+def test_slow_call_times_out_and_is_retried(sleeps):
+    model = ScriptedModel("primary", 1.0, "answer")
+    start = time.perf_counter()
+    assert retrying_gateway(model, timeout=0.1).invoke("prompt") == "answer"
+    assert time.perf_counter() - start < 0.9
+    assert model.calls == 2
+
+
+def test_slow_async_call_times_out(sleeps):
+    model = ScriptedModel("primary", 1.0)
+    with pytest.raises(LLMTimeoutError):
+        asyncio.run(retrying_gateway(model, timeout=0.05, max_retries=1).ainvoke("prompt"))
+    assert model.calls == 2
+
+
+def test_fallback_model_answers_when_the_primary_is_down(sleeps):
+    primary = ScriptedModel("primary", ProviderError(503))
+    fallback = ScriptedModel("fallback", "fallback answer")
+    model = retrying_gateway(primary, fallback, max_retries=2)
+    assert model.invoke("prompt") == "fallback answer"
+    assert asyncio.run(model.ainvoke("prompt")) == "fallback answer"
+    # Every retry of the primary first, then the fallback
+    assert primary.calls == 6
+    assert fallback.calls == 2
+
+
+def test_fallback_is_tried_at_once_after_a_client_error(sleeps):
+    primary = ScriptedModel("primary", ProviderError(400))
+    fallback = ScriptedModel("fallback", "fallback answer")
+    assert retrying_gateway(primary, fallback).invoke("prompt") == "fallback answer"
+    assert primary.calls == 1
+    assert sleeps == []
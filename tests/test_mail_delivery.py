@@ -0,0 +1,96 @@
+import smtplib
+import socket
+from email.mime.text import MIMEText
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from mail_delivery import FAILED, SENT, MailQueue, SMTPConnection
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.peers = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.peers.add(session.peer)
+        return "250 OK"
+
+
+def message(i):
+    msg = MIMEText(f"report {i}")
+    msg["From"] = "reports@example.com"
+    msg["To"] = f"user{i}@example.com"
+    msg["Subject"] = f"Report {i}"
+    return msg
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+def test_messages_share_one_connection(smtp_server):
+    controller, handler = smtp_server
+    connection = SMTPConnection(controller.hostname, controller.port, username="", password="", starttls=False,
+                                timeout=5)
+    mail = MailQueue(connection, retry_base_delay=0.01)
+    job_ids = [mail.submit(message(i)) for i in range(5)]
+    mail.join()
+    connection.close()
+
+    assert [mail.status(job_id)["status"] for job_id in job_ids] == [SENT] * 5
+    assert sorted(envelope.rcpt_tos[0] for envelope in handler.messages) == [f"user{i}@example.com"
+                                                                           for i in range(5)]
+    assert connection.connections_opened == 1
+    assert len(handler.peers) == 1
+
+
+def test_message_fails_after_max_retries_when_server_is_down():
+    connection = SMTPConnection("127.0.0.1", free_port(), username="", password="", starttls=False, timeout=1)
+    mail = MailQueue(connection, max_retries=2, retry_base_delay=0.01)
+    job_id = mail.submit(message(0))
+    mail.join()
+
+    status = mail.status(job_id)
+    assert status["status"] == FAILED
+    assert status["attempts"] == 3
+    assert status["error"]
+    assert connection.connections_opened == 0
+
+
+def test_login_is_refused_without_starttls(smtp_server, monkeypatch):
+    controller, handler = smtp_server
+    closed = []
+    close = smtplib.SMTP.close
+    monkeypatch.setattr(smtplib.SMTP, "close", lambda server: closed.append(server) or close(server))
+    logins = []
+    monkeypatch.setattr(smtplib.SMTP, "login", lambda server, *args: logins.append(args))
+
+    # The local server does not offer STARTTLS, as when an attacker strips it from the EHLO reply
+    connection = SMTPConnection(controller.hostname, controller.port, username="reports@example.com",
+                                password="secret", starttls=True, timeout=5)
+    mail = MailQueue(connection, max_retries=2, retry_base_delay=0.01)
+    job_id = mail.submit(message(0))
+    mail.join()
+
+    status = mail.status(job_id)
+    assert status["status"] == FAILED
+    assert "STARTTLS" in status["error"]
+    # Not worth retrying, and the password was never sent
+    assert status["attempts"] == 1
+    assert logins == []
+    assert closed
+    assert handler.messages == []
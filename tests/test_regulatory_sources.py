@@ -0,0 +1,179 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from regulatory_sources import CachedHTTPClient, RegulatoryFetchError, RegulatorySources
+
+LAST_MODIFIED = "Wed, 01 May 2024 10:00:00 GMT"
+
+RECITALS_PAGE = """<html><body>
+<div class="artikel"><a href="/recitals/no-1/"><span class="nummer">(1)</span>
+<span class="titel"> Data Protection as a Fundamental Right </span></a></div>
+<div class="artikel"><a href="/recitals/no-2/"><span class="nummer">(2)</span>
+<span class="titel">Respect of the Fundamental Rights and Freedoms</span></a></div>
+<div class="artikel"><a href="/recitals/no-3/"><span class="nummer">(3)</span>
+<span class="titel">Directive 95/46/EC Harmonisation</span></a></div>
+<div class="artikel"><a href="/recitals/no-4/"><span class="nummer">(4)</span>
+<span class="titel">Not requested</span></a></div>
+</body></html>"""
+
+
+# Serves the pages in `pages` (path -> (body, etag, last_modified)), answering conditional GETs with 304
+class StubServer:
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append((self.path, self.headers.get("If-None-Match"),
+                                      self.headers.get("If-Modified-Since")))
+                if self.path not in stub.pages:
+                    self.send_error(404)
+                    return
+                body, etag, last_modified = stub.pages[self.path]
+                if (etag and self.headers.get("If-None-Match") == etag) or \
+                        (not etag and last_modified and self.headers.get("If-Modified-Since") == last_modified):
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                if etag:
+                    self.send_header("ETag", etag)
+                if last_modified:
+                    self.send_header("Last-Modified", last_modified)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    def count(self, path):
+        return sum(request[0] == path for request in self.requests)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubServer({})
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def make_client(tmp_path):
+    clients = []
+
+    def make(ttl_seconds):
+        client = CachedHTTPClient(str(tmp_path / "regulatory.sqlite3"), ttl_seconds=ttl_seconds, timeout=5)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+def test_fresh_response_is_served_from_cache(stub, make_client):
+    stub.pages["/feed/"] = (b"<rss/>", '"v1"', LAST_MODIFIED)
+    client = make_client(ttl_seconds=3600)
+
+    assert client.get(stub.url + "feed/") == b"<rss/>"
+    assert client.get(stub.url + "feed/") == b"<rss/>"
+    assert stub.count("/feed/") == 1
+    assert client.network_requests == 1
+
+
+def test_cache_survives_a_new_client(stub, make_client):
+    stub.pages["/feed/"] = (b"<rss/>", '"v1"', LAST_MODIFIED)
+    make_client(ttl_seconds=3600).get(stub.url + "feed/")
+
+    assert make_client(ttl_seconds=3600).get(stub.url + "feed/") == b"<rss/>"
+    assert stub.count("/feed/") == 1
+
+
+def test_expired_entry_is_revalidated_with_etag(stub, make_client):
+    stub.pages["/feed/"] = (b"<rss>v1</rss>", '"v1"', LAST_MODIFIED)
+    client = make_client(ttl_seconds=0)
+
+    assert client.get(stub.url + "feed/") == b"<rss>v1</rss>"
+    assert client.get(stub.url + "feed/") == b"<rss>v1</rss>"
+    assert stub.requests[1] == ("/feed/", '"v1"', LAST_MODIFIED)
+    assert client.not_modified == 1
+
+    # A changed page is downloaded again and replaces the cached copy
+    stub.pages["/feed/"] = (b"<rss>v2</rss>", '"v2"', LAST_MODIFIED)
+    assert client.get(stub.url + "feed/") == b"<rss>v2</rss>"
+    assert client.get(stub.url + "feed/") == b"<rss>v2</rss>"
+    assert stub.requests[-1][1] == '"v2"'
+    assert client.not_modified == 2
+    assert client.network_requests == 4
+
+
+def test_expired_entry_is_revalidated_with_last_modified(stub, make_client):
+    stub.pages["/feed/"] = (b"<rss/>", None, LAST_MODIFIED)
+    client = make_client(ttl_seconds=0)
+
+    client.get(stub.url + "feed/")
+    assert client.get(stub.url + "feed/") == b"<rss/>"
+    assert stub.requests[1] == ("/feed/", None, LAST_MODIFIED)
+    assert client.not_modified == 1
+
+
+def test_revalidation_renews_the_ttl(stub, make_client, monkeypatch):
+    stub.pages["/feed/"] = (b"<rss/>", '"v1"', None)
+    client = make_client(ttl_seconds=60)
+    now = [1000.0]
+    monkeypatch.setattr("regulatory_sources.time.time", lambda: now[0])
+
+    client.get(stub.url + "feed/")
+    now[0] += 61
+    client.get(stub.url + "feed/")
+    now[0] += 30
+    client.get(stub.url + "feed/")
+    assert stub.count("/feed/") == 2
+    assert client.not_modified == 1
+
+
+def test_stale_copy_is_served_when_the_source_fails(stub, make_client):
+    stub.pages["/feed/"] = (b"<rss/>", '"v1"', None)
+    client = make_client(ttl_seconds=0)
+    client.get(stub.url + "feed/")
+
+    del stub.pages["/feed/"]
+    assert client.get(stub.url + "feed/") == b"<rss/>"
+    with pytest.raises(RegulatoryFetchError):
+        client.get(stub.url + "missing/")
+
+
+def test_recitals_are_parsed_and_memoized(stub, make_client):
+    stub.pages["/recitals/"] = (RECITALS_PAGE.encode(), '"list"', None)
+    stub.pages["/recitals/no-1/"] = (b'<div class="entry-content"><p>Natural persons</p> <p>are protected.</p></div>'
+                                     b'<time datetime="2016-05-04">4 May 2016</time>', '"r1"', None)
+    stub.pages["/recitals/no-2/"] = (b'<div class="entry-content">Freedoms.</div>', '"r2"', None)
+    sources = RegulatorySources(client=make_client(ttl_seconds=3600), base_url=stub.url.rstrip("/"))
+
+    recitals = sources.recitals()
+    # Recital 3 cannot be fetched and is left out; recital 4 is past the limit
+    assert recitals == {
+        "1": {"title": "Data Protection as a Fundamental Right", "content": "Natural personsare protected.",
+              "release_date": "2016-05-04"},
+        "2": {"title": "Respect of the Fundamental Rights and Freedoms", "content": "Freedoms.",
+              "release_date": "Date not available"},
+    }
+    assert stub.count("/recitals/no-4/") == 0
+
+    requests = len(stub.requests)
+    assert sources.recitals() == recitals
+    assert len(stub.requests) == requests
@@ -0,0 +1,99 @@
+import threading
+
+from sheets_sink import SQLiteBackend, UpdateSink
+
+
+# SQLite backend that records each append_rows call, and can hold the next call until released
+class RecordingBackend(SQLiteBackend):
+    def __init__(self, path):
+        super().__init__(path)
+        self.calls = []
+        self.fail_next = False
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def append_rows(self, rows):
+        self.entered.set()
+        self.release.wait(5)
+        if self.fail_next:
+            self.fail_next = False
+            raise RuntimeError("quota exceeded")
+        self.calls.append(list(rows))
+        super().append_rows(rows)
+
+    def rows(self):
+        return sorted(self._conn.execute("SELECT title, release_date FROM updates"))
+
+
+def updates(*rows):
+    return {str(i): {"title": title, "release_date": date, "content": ""} for i, (title, date) in enumerate(rows)}
+
+
+def test_duplicates_within_a_batch_are_written_once(tmp_path):
+    backend = RecordingBackend(str(tmp_path / "updates.sqlite3"))
+    sink = UpdateSink(backend)
+    sink.submit(updates(("Recital 1", "2016-05-04"), ("Recital 2", "2016-05-04"), ("Recital 1", "2016-05-04")))
+    sink.submit(updates(("Recital 2", "2016-05-04")))
+    assert sink.flush(5)
+
+    assert backend.rows() == [("Recital 1", "2016-05-04"), ("Recital 2", "2016-05-04")]
+    assert sink.rows_written == 2
+
+
+def test_rows_written_before_a_restart_are_not_written_again(tmp_path):
+    path = str(tmp_path / "updates.sqlite3")
+    sink = UpdateSink(RecordingBackend(path))
+    sink.submit(updates(("Recital 1", "2016-05-04"), ("Recital 2", "2016-05-04")))
+    assert sink.flush(5)
+
+    backend = RecordingBackend(path)
+    sink = UpdateSink(backend)
+    sink.submit(updates(("Recital 1", "2016-05-04"), ("Recital 2", "2016-05-04"), ("Recital 3", "2016-05-04")))
+    assert sink.flush(5)
+
+    assert backend.calls == [[["Recital 3", "2016-05-04"]]]
+    assert backend.rows() == [("Recital 1", "2016-05-04"), ("Recital 2", "2016-05-04"), ("Recital 3", "2016-05-04")]
+
+
+def test_queued_submits_go_out_in_one_append_call(tmp_path):
+    backend = RecordingBackend(str(tmp_path / "updates.sqlite3"))
+    sink = UpdateSink(backend)
+    backend.release.clear()
+    sink.submit(updates(("Recital 1", "2016-05-04")))
+    assert backend.entered.wait(5)
+    # These queue up while the first batch is being written
+    for i in range(2, 6):
+        sink.submit(updates((f"Recital {i}", "2016-05-04")))
+    backend.release.set()
+    assert sink.flush(5)
+
+    assert backend.calls == [[["Recital 1", "2016-05-04"]], [[f"Recital {i}", "2016-05-04"] for i in range(2, 6)]]
+    assert sink.batches_written == 2
+    assert sink.rows_written == 5
+
+
+def test_nothing_new_means_no_append_call(tmp_path):
+    backend = RecordingBackend(str(tmp_path / "updates.sqlite3"))
+    sink = UpdateSink(backend)
+    sink.submit(updates(("Recital 1", "2016-05-04")))
+    sink.flush(5)
+    sink.submit(updates(("Recital 1", "2016-05-04")))
+    sink.flush(5)
+
+    assert len(backend.calls) == 1
+    assert sink.batches_written == 1
+
+
+def test_failed_batch_is_retried_by_a_later_submit(tmp_path):
+    backend = RecordingBackend(str(tmp_path / "updates.sqlite3"))
+    sink = UpdateSink(backend)
+    backend.fail_next = True
+    sink.submit(updates(("Recital 1", "2016-05-04")))
+    assert sink.flush(5)
+    assert sink.last_error == "quota exceeded"
+    assert backend.rows() == []
+
+    sink.submit(updates(("Recital 1", "2016-05-04")))
+    assert sink.flush(5)
+    assert backend.rows() == [("Recital 1", "2016-05-04")]
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+
+import pytest
+
+from instrumentation import Trace, use_trace
+from summary_engine import summarize_bundle, summarize_document
+
+
+class Response:
+    def __init__(self, content):
+        self.content = content
+
+
+# Model that, like an async HTTP client with pooled connections, only works on the event loop it first ran on
+class LoopBoundModel:
+    model_name = "loop-bound"
+
+    def __init__(self):
+        self.loop = None
+        self.calls = 0
+
+    async def ainvoke(self, prompt):
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        elif self.loop is not loop:
+            raise ConnectionError("Connection error.")
+        self.calls += 1
+        await asyncio.sleep(0)
+        return Response(f"summary {self.calls}")
+
+    async def astream(self, prompt):
+        response = await self.ainvoke(prompt)
+        for word in response.content.split():
+            yield Response(word + " ")
+
+
+def test_repeated_summaries_reuse_the_model():
+    model = LoopBoundModel()
+    for _ in range(3):
+        summary, chunk_summaries, errors = summarize_document(model, ["first part", "second part"])
+        assert errors == []
+        assert len(chunk_summaries) == 2
+        assert summary
+    assert summarize_bundle(model, [("a.pdf", "summary a"), ("b.pdf", "summary b")])
+    assert model.calls == 10
+
+
+def test_callbacks_run_on_the_calling_thread():
+    model = LoopBoundModel()
+    threads = set()
+    sections = []
+    tokens = []
+
+    def on_chunk_summary(index, result):
+        threads.add(threading.current_thread())
+        sections.append(index)
+
+    def on_token(text):
+        threads.add(threading.current_thread())
+        tokens.append(text)
+
+    summary, _, _ = summarize_document(model, ["first part", "second part"], on_chunk_summary=on_chunk_summary,
+                                       on_token=on_token)
+    assert threads == {threading.current_thread()}
+    assert sorted(sections) == [0, 1]
+    assert "".join(tokens).strip() == summary
+
+
+def test_summary_is_timed_into_the_callers_trace():
+    trace = Trace()
+    with use_trace(trace):
+        summarize_document(LoopBoundModel(), ["first part", "second part"])
+    assert trace.totals()["llm_call"]["count"] == 3
+
+
+def test_failing_callback_stops_the_summary():
+    model = LoopBoundModel()
+
+    def on_chunk_summary(index, result):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        summarize_document(model, [f"part {i}" for i in range(20)], max_concurrency=1,
+                           on_chunk_summary=on_chunk_summary)
+    # The engine loop is still usable afterwards
+    assert summarize_document(model, ["again"])[2] == []